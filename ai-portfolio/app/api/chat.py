@@ -1,15 +1,32 @@
 ﻿from fastapi import APIRouter, Request, HTTPException, BackgroundTasks, Depends
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, Field
+from typing import Optional, List, Dict, Any, Tuple
+import asyncio
 import json
+import logging
 import os
 import re
-import uuid
-from datetime import datetime
+import time
 
 # Import Gemini API
-from app.core.gemini_api import GeminiAPI
+from app.core.gemini_api import GeminiAPI, FALLBACK_RESPONSE
+from app.core.persona import PersonaStore, PersonaSnapshot
+from app.core.history import StoredMessage, estimate_tokens
+from app.core.session_store import create_session_store, Session
+from app.core.persistence import MessageWriter
+from app.core.sweeper import ConversationSweeper
+from app.core.answer_cache import AnswerCache, normalize_question
+from app.core.single_flight import SingleFlight
+from app.core.admission import AdmissionController, AdmissionRejected
+from app.core.resilience import UpstreamUnavailable
+from app.core.topics import topic_extractor
+from app.core.metrics import registry, STAGE_SECONDS, TURN_SECONDS, SESSIONS_CREATED, MESSAGES, FALLBACK_RESPONSES
+from app.core.logs import get_logger, log_event, log_turn
+from app.core.warmup import WarmUp
+from app.core.config import (PERSIST_MESSAGES, FALLBACK_FAQ_THRESHOLD, WARM_UP_WAIT_SECONDS, BATCH_MAX_ITEMS,
+                             BATCH_MAX_CONCURRENCY)
 
 # Get API key from environment variable
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
@@ -18,45 +35,76 @@ if not GEMINI_API_KEY:
     GEMINI_API_KEY = "YOUR_GEMINI_API_KEY"
     print("WARNING: Using hardcoded Gemini API key. Set the GEMINI_API_KEY environment variable.")
 
-# Load personal data
-PERSONAL_DATA_PATH = "app/data/personal_data.json"
-try:
-    with open(PERSONAL_DATA_PATH, 'r', encoding='utf-8') as f:
-        file_content = f.read()
-        personal_data = json.loads(file_content)
-        
-    # Verify name is loaded correctly
-    name = personal_data.get("basics", {}).get("name", "")
-    print(f"Loaded personal data for: {name}")
-    
-    if name == "Your Name":
-        print("WARNING: Using placeholder name 'Your Name'. Please update your personal_data.json")
-        
-except Exception as e:
-    print(f"Error loading personal data: {str(e)}")
-    # Create a basic fallback
-    personal_data = {
-        "basics": {
-            "name": "Portfolio Owner",
-            "title": "Software Developer",
-            "summary": "A passionate developer with experience in multiple technologies."
-        },
-        "skills": [],
-        "projects": [],
-        "experience": [],
-        "education": [],
-        "faq": []
-    }
-
-# Initialize Gemini API
+# Initialize Gemini API (the SDK itself is loaded during warm-up)
 gemini_api = GeminiAPI(api_key=GEMINI_API_KEY)
 
+# Personal data; loaded during warm-up, then the prompt is compiled once per version of the file
+persona_store = PersonaStore(compile_prompt=gemini_api.get_system_prompt, build_index=gemini_api.build_index,
+                             preload=False)
+
+# Answers to opening questions, shared across sessions
+answer_cache = AnswerCache(sentiment=gemini_api.score_sentiment)
+
+# Identical opening questions in flight at the same time share one upstream call
+first_turn_calls = SingleFlight()
+
+# Bounds concurrent Gemini calls and per-session request rates
+admission = AdmissionController()
+
+# Shown when a turn is not admitted; {seconds} is the Retry-After value
+BUSY_MESSAGES = {
+    429: "Posíláš zprávy moc rychle. Zkus to prosím znovu za {seconds} s.",
+    503: "Právě odpovídám hodně lidem najednou. Zkus to prosím znovu za {seconds} s."
+}
+
+# Shown when a turn arrives before startup warm-up has finished
+STARTING_MESSAGE = "Ještě se chystám. Zkus to prosím znovu za {seconds} s."
+STARTING_RETRY_AFTER = 5
+
+# Answers while Gemini is unreachable: the closest persona details, or just an apology
+UNAVAILABLE_CONTEXT = "Teď ti nedokážu odpovědět naplno, ale tohle k tomu o sobě můžu říct:\n\n{context}"
+UNAVAILABLE_RESPONSE = "Teď mi bohužel nejde odpovídat. Zkus to prosím za chvíli znovu."
+# Values of the fallback-responses "kind" label for local answers, also the keys of /stats local_answers
+LOCAL_ANSWER_KINDS = ("faq", "sections", "unavailable")
+
+logger = get_logger("chat")
+
 # Create router
 router = APIRouter()
 
-# In-memory conversation storage
-# In a production app, use a database
-conversations = {}
+# Conversation storage, bounded by session count, bytes and TTL; per process or
+# shared by all workers depending on SESSION_BACKEND
+conversations = create_session_store(on_evict=gemini_api.chat_pool.discard)
+
+# Durable copy of every message, written behind the request path
+message_writer = MessageWriter(topics=topic_extractor)
+
+# Deletes expired conversations from the database in the background
+conversation_sweeper = ConversationSweeper()
+
+# Slow startup work, run in the background by the app lifespan; chat turns wait for it
+warm_up = WarmUp()
+
+@warm_up.step("database")
+def prepare_database() -> None:
+    # SQLAlchemy is first imported here
+    from app.core.database import init_db
+    init_db()
+
+@warm_up.step("persona")
+def load_persona() -> None:
+    persona_store.load()
+
+@warm_up.step("gemini")
+def configure_gemini() -> None:
+    gemini_api.warm_up()
+
+# Point-in-time values exported on /metrics next to the request metrics
+registry.gauge("aime_sessions_active", "Conversations held in memory", lambda: conversations.stats()["sessions"])
+registry.gauge("aime_admission_active", "Upstream calls holding an admission slot", lambda: admission.active)
+registry.gauge("aime_admission_queue_depth", "Turns waiting for an admission slot", lambda: admission.stats()["queue_depth"])
+registry.gauge("aime_circuit_open", "1 while the Gemini circuit breaker refuses calls",
+               lambda: int(gemini_api.retry_policy.breaker.is_open()))
 
 class ChatRequest(BaseModel):
     message: str
@@ -66,67 +114,351 @@ class ChatResponse(BaseModel):
     response: str
     session_id: str
     sentiment: str = "neutral"
+    sentiment_score: float = 0.0
+    usage: Optional[Dict[str, int]] = None
 
-def get_conversation_history(session_id: str) -> List[Dict[str, Any]]:
-    """Get conversation history for the session"""
-    if session_id in conversations:
-        return conversations[session_id]["messages"]
-    return []
-
-def add_message(session_id: str, role: str, content: str) -> None:
-    """Add a message to the conversation history"""
-    if session_id not in conversations:
-        conversations[session_id] = {
-            "messages": [],
-            "created_at": datetime.now(),
-            "updated_at": datetime.now()
-        }
-    
-    conversations[session_id]["messages"].append({
-        "role": role,
-        "content": content,
-        "timestamp": datetime.now()
-    })
-    conversations[session_id]["updated_at"] = datetime.now()
+class BatchChatRequest(BaseModel):
+    items: List[ChatRequest] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+    # Turns of this batch running at once; capped at BATCH_MAX_CONCURRENCY
+    concurrency: Optional[int] = Field(None, ge=1)
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
-    """Chat with the AI assistant"""
-    message = request.message
-    session_id = request.session_id
+class BatchItemResult(BaseModel):
+    index: int
+    session_id: Optional[str] = None
+    response: Optional[str] = None
+    sentiment: Optional[str] = None
+    sentiment_score: Optional[float] = None
+    usage: Optional[Dict[str, int]] = None
+    latency_ms: float
+    # Status code and detail of a turn that was not answered (e.g. 429/503 from admission)
+    error: Optional[Dict[str, Any]] = None
+
+class BatchChatResponse(BaseModel):
+    results: List[BatchItemResult]
+    errors: int
+    elapsed_ms: float
+
+async def persist_messages(session: Session, messages: List[StoredMessage]) -> None:
+    """Write session messages through a durable store, or queue them for the database"""
+    for stored in messages:
+        MESSAGES.inc(role=stored.role)
+    if conversations.durable:
+        await conversations.persist(session, messages)
+    elif PERSIST_MESSAGES:
+        for stored in messages:
+            message_writer.enqueue(session.session_id, stored.role, stored.content, stored.timestamp)
+
+async def start_turn(message: str, session_id: Optional[str]) -> Tuple[Session, bool, StoredMessage]:
+    """Resolve the session for a chat turn and add the user message to it.
     
-    # Create new session if none provided
-    if not session_id or session_id not in conversations:
-        session_id = str(uuid.uuid4())
+    Also returns whether this is the session's first turn, i.e. the answer
+    depends on nothing but the message itself, and the stored user message.
+    That message is persisted by finish_turn, or retracted if the turn is
+    not admitted.
+    """
+    session = await conversations.load(session_id) if session_id else None
+    first_turn = session is None
+    
+    # Create new session if none provided (or it has expired)
+    if first_turn:
+        session = conversations.create()
+        SESSIONS_CREATED.inc()
         
         # Add first-person welcome message
         welcome_msg = f"Ahoj! Jsem Jan Novák. Rád tě poznávám! Můžeš se mě zeptat na moje projekty, zkušenosti nebo cokoliv jiného. Jak ti můžu pomoct?"
-        add_message(session_id, "assistant", welcome_msg)
+        await persist_messages(session, [conversations.append(session, "assistant", welcome_msg)])
     
     # Add user message to conversation
-    add_message(session_id, "user", message)
+    return session, first_turn, conversations.append(session, "user", message)
+
+async def finish_turn(session: Session, user_message: StoredMessage, response: str) -> None:
+    """Record the assistant response and persist it with the turn's user message"""
+    await persist_messages(session, [user_message, conversations.append(session, "assistant", response)])
+
+def reject_turn(session: Session, user_message: StoredMessage, rejection: AdmissionRejected) -> HTTPException:
+    """Drop an unadmitted turn and build its 429/503 response"""
+    conversations.retract(session, user_message)
+    return HTTPException(
+        status_code=rejection.status_code,
+        detail={
+            "message": BUSY_MESSAGES[rejection.status_code].format(seconds=rejection.retry_after),
+            "reason": rejection.reason,
+            "retry_after": rejection.retry_after,
+            "session_id": session.session_id
+        },
+        headers={"Retry-After": str(rejection.retry_after)}
+    )
+
+async def require_warm_up() -> None:
+    """Hold turns that arrive during warm-up; 503 while a step is failing or if it does not finish in time"""
+    if not await warm_up.wait(WARM_UP_WAIT_SECONDS):
+        raise HTTPException(
+            status_code=503,
+            detail={
+                "message": STARTING_MESSAGE.format(seconds=STARTING_RETRY_AFTER),
+                "reason": "starting",
+                "retry_after": STARTING_RETRY_AFTER
+            },
+            headers={"Retry-After": str(STARTING_RETRY_AFTER)}
+        )
+
+def prepare_history(session: Session, persona: PersonaSnapshot, message: str) -> Tuple[List[StoredMessage], str, Dict[str, int]]:
+    """Budgeted history and the message as sent upstream (with retrieved context), plus their token usage"""
+    # The new message itself is sent separately
+    with STAGE_SECONDS.time(stage="history"):
+        history, folded = session.window.update(session.messages, len(session.messages) - 1)
+    if folded:
+        conversations.release(session, folded)
+        # The live chat still carries the folded turns; rebuild it from the window
+        gemini_api.chat_pool.discard(session.session_id)
     
-    # Get conversation history
-    history = get_conversation_history(session_id)
+    # Retrieved sections go with this turn only; they are not kept in the history
+    content = gemini_api.compose_message(message, persona)
+    
+    usage = session.window.usage()
+    usage["prompt_tokens"] = persona.prompt_tokens
+    usage["context_tokens"] = max(estimate_tokens(content) - estimate_tokens(message), 0)
+    log_turn(logger, "turn_tokens", session=session.session_id[:8], **usage)
+    return history, content, usage
+
+def local_answer(message: str, persona: PersonaSnapshot) -> Dict[str, Any]:
+    """Answer computed without Gemini: the closest FAQ entry, else the most relevant persona sections"""
+    answer = answer_cache.closest_faq(message, persona, FALLBACK_FAQ_THRESHOLD)
+    source = "faq"
+    if answer is None and persona.index is not None:
+        context = persona.index.context(message)
+        if context:
+            answer = UNAVAILABLE_CONTEXT.format(context=context)
+            source = "sections"
+    if answer is None:
+        answer = UNAVAILABLE_RESPONSE
+        source = "unavailable"
+    FALLBACK_RESPONSES.inc(kind=source)
+    return {"response": answer, **gemini_api.score_sentiment(answer)}
+
+async def generate_answer(message: str, session: Session, first_turn: bool, persona: PersonaSnapshot, history: List[StoredMessage],
+                          content: str) -> Dict[str, Any]:
+    """Answer one turn: from the answer cache / FAQ for opening questions, else from Gemini.
+    
+    Concurrent identical opening questions (same persona version and
+    normalized text) share a single upstream call. Upstream calls go
+    through admission control and raise AdmissionRejected when refused;
+    only established sessions are rate limited per session. While the
+    circuit breaker is open, or once retries are used up, the turn gets a
+    local_answer instead.
+    """
+    if first_turn:
+        cached = answer_cache.get(message, persona)
+        if cached is not None:
+            return cached
+    
+    # Fail fast without queueing or spending the session's rate budget
+    if gemini_api.retry_policy.breaker.short_circuit():
+        return local_answer(message, persona)
+    
+    async def answer_first_turn():
+        # The session that asked first gets the live chat; the others replay history next turn
+        async with admission.admit():
+            result = await gemini_api.generate_response_async(message, history, persona, session.session_id, content)
+        answer_cache.put(message, persona, result)
+        return result
+    
+    try:
+        if not first_turn:
+            async with admission.admit(session.session_id):
+                return await gemini_api.generate_response_async(message, history, persona, session.session_id, content)
+        return await first_turn_calls.run((persona.version, normalize_question(message)), answer_first_turn)
+    except UpstreamUnavailable as e:
+        log_event(logger, "upstream_unavailable", logging.WARNING, error=str(e))
+        return local_answer(message, persona)
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format a server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def answer_turn(message: str, session_id: Optional[str], endpoint: str) -> Dict[str, Any]:
+    """Answer one chat turn end to end; raises HTTPException (429/503) if it is not admitted"""
+    start = time.perf_counter()
+    session, first_turn, user_message = await start_turn(message, session_id)
+    session_id = session.session_id
+    
+    # Get conversation history within the token budget
+    persona = persona_store.current()
+    history, content, usage = prepare_history(session, persona, message)
     
     # Generate response
     try:
-        result = gemini_api.generate_response(message, history, personal_data)
+        result = await generate_answer(message, session, first_turn, persona, history, content)
         response = result["response"]
-        sentiment = result.get("sentiment", "neutral")
         
         # Add assistant response to conversation
-        add_message(session_id, "assistant", response)
+        await finish_turn(session, user_message, response)
+        TURN_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
         
         return {
             "response": response,
             "session_id": session_id,
-            "sentiment": sentiment
+            "sentiment": result.get("sentiment", "neutral"),
+            "sentiment_score": result.get("sentiment_score", 0.0),
+            "usage": usage
         }
+    except AdmissionRejected as e:
+        raise reject_turn(session, user_message, e)
     except Exception as e:
-        print(f"Error in chat endpoint: {str(e)}")
+        log_event(logger, "chat_failed", logging.WARNING, error=str(e))
+        FALLBACK_RESPONSES.inc(kind="error")
+        await finish_turn(session, user_message, FALLBACK_RESPONSE)
+        TURN_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
         return {
-            "response": "Promiň, ale narazil jsem na problém. Můžeš to zkusit znovu s jinou otázkou?",
+            "response": FALLBACK_RESPONSE,
             "session_id": session_id,
-            "sentiment": "negative"
+            **gemini_api.score_sentiment(FALLBACK_RESPONSE)
         }
+
+@router.post("/chat", response_model=ChatResponse, dependencies=[Depends(require_warm_up)])
+async def chat(request: ChatRequest):
+    """Chat with the AI assistant"""
+    return await answer_turn(request.message, request.session_id, "chat")
+
+async def batch_turn(index: int, message: str, session_id: Optional[str]) -> Dict[str, Any]:
+    """One batch item through answer_turn, with its latency and, instead of raising, its error"""
+    start = time.perf_counter()
+    result: Dict[str, Any] = {"session_id": session_id}
+    try:
+        result = await answer_turn(message, session_id, "batch")
+    except HTTPException as e:
+        detail = e.detail if isinstance(e.detail, dict) else {"message": e.detail}
+        result["session_id"] = detail.get("session_id", session_id)
+        result["error"] = {"status": e.status_code, **detail}
+    except Exception as e:
+        log_event(logger, "batch_turn_failed", logging.WARNING, error=str(e))
+        result["error"] = {"status": 500, "message": str(e)}
+    return {"index": index, **result, "latency_ms": round((time.perf_counter() - start) * 1000, 1)}
+
+@router.post("/chat/batch", response_model=BatchChatResponse, dependencies=[Depends(require_warm_up)])
+async def chat_batch(request: BatchChatRequest):
+    """Run many chat turns through the same pipeline as /chat, with bounded concurrency.
+    
+    Items sharing a session_id are turns of one conversation and run one
+    after another in request order; a session_id the server does not know
+    names a new conversation that those items continue. Other items run
+    concurrently, at most `concurrency` turns at a time. Turns go through
+    the answer cache and admission control like any other, so a batch of
+    opening questions also warms the cache. Results come back in request
+    order; a turn that fails or is not admitted carries its error instead
+    of failing the batch.
+    """
+    start = time.perf_counter()
+    semaphore = asyncio.Semaphore(min(request.concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    results: List[Optional[Dict[str, Any]]] = [None] * len(request.items)
+    
+    conversations_in_batch: Dict[Any, List[int]] = {}
+    for index, item in enumerate(request.items):
+        conversations_in_batch.setdefault(item.session_id or ("new", index), []).append(index)
+    
+    async def run_conversation(indexes: List[int]) -> None:
+        session_id = request.items[indexes[0]].session_id
+        for index in indexes:
+            async with semaphore:
+                results[index] = await batch_turn(index, request.items[index].message, session_id)
+            # Later items continue the session the first one started (or was given)
+            session_id = results[index]["session_id"] or session_id
+    
+    await asyncio.gather(*(run_conversation(indexes) for indexes in conversations_in_batch.values()))
+    return {
+        "results": results,
+        "errors": sum(1 for result in results if result.get("error")),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)
+    }
+
+@router.post("/chat/stream", dependencies=[Depends(require_warm_up)])
+async def chat_stream(request: ChatRequest):
+    """Chat with the AI assistant, streaming the reply as server-sent events.
+    
+    Emits one "session" event, a "token" event per rewritten chunk and a
+    final "done" event carrying the full response and its sentiment.
+    Admission is decided before the stream starts, so a refused turn gets a
+    plain 429/503 response. While the circuit breaker is open the reply is
+    a local_answer sent as a single chunk.
+    """
+    start = time.perf_counter()
+    message = request.message
+    session, first_turn, user_message = await start_turn(message, request.session_id)
+    session_id = session.session_id
+    persona = persona_store.current()
+    history, content, usage = prepare_history(session, persona, message)
+    cached = answer_cache.get(message, persona) if first_turn else None
+    if cached is None and gemini_api.retry_policy.breaker.short_circuit():
+        # Sent like a cached answer, but never cached itself
+        cached = local_answer(message, persona)
+    
+    release = None
+    if cached is None:
+        try:
+            release = await admission.reserve(None if first_turn else session_id)
+        except AdmissionRejected as e:
+            raise reject_turn(session, user_message, e)
+    
+    async def events():
+        yield sse_event("session", {"session_id": session_id})
+        
+        parts = []
+        try:
+            if cached is not None:
+                parts.append(cached["response"])
+                yield sse_event("token", {"text": cached["response"]})
+            else:
+                async for text in gemini_api.stream_response_async(message, history, persona, session_id, content):
+                    parts.append(text)
+                    yield sse_event("token", {"text": text})
+            response = "".join(parts)
+            sentiment = cached if cached is not None else gemini_api.score_sentiment(response)
+            if first_turn and cached is None:
+                answer_cache.put(message, persona, {"response": response, **sentiment})
+        except Exception as e:
+            log_event(logger, "chat_stream_failed", logging.WARNING, error=str(e), chunks_sent=len(parts))
+            # Keep whatever already reached the client, otherwise answer locally or apologise
+            response = "".join(parts)
+            if not parts:
+                if isinstance(e, UpstreamUnavailable):
+                    response = local_answer(message, persona)["response"]
+                else:
+                    FALLBACK_RESPONSES.inc(kind="error")
+                    response = FALLBACK_RESPONSE
+                yield sse_event("token", {"text": response})
+            sentiment = gemini_api.score_sentiment(response)
+        finally:
+            if release:
+                release()
+        
+        await finish_turn(session, user_message, response)
+        TURN_SECONDS.observe(time.perf_counter() - start, endpoint="stream")
+        yield sse_event("done", {
+            "response": response,
+            "session_id": session_id,
+            "sentiment": sentiment["sentiment"],
+            "sentiment_score": sentiment["sentiment_score"],
+            "usage": usage
+        })
+    
+    # The background task frees the slot even if the stream never starts
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    }, background=BackgroundTask(release) if release else None)
+
+@router.get("/stats")
+async def stats():
+    """Runtime counters for sizing the in-process caches"""
+    return {
+        "chat_pool": gemini_api.chat_pool.stats(),
+        "sessions": conversations.stats(),
+        "persistence": message_writer.stats(),
+        "sweeper": conversation_sweeper.stats(),
+        "answer_cache": answer_cache.stats(),
+        "first_turn_coalescing": first_turn_calls.stats(),
+        "admission": admission.stats(),
+        "upstream": {**gemini_api.retry_policy.stats(), "local_answers": {
+            kind: int(FALLBACK_RESPONSES.value(kind=kind)) for kind in LOCAL_ANSWER_KINDS
+        }}
+    }
@@ -0,0 +1,171 @@
+﻿import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from app.core.config import (ADMISSION_MAX_CONCURRENT, ADMISSION_QUEUE_SIZE, ADMISSION_QUEUE_TIMEOUT_SECONDS,
+                             SESSION_RATE_PER_MINUTE, SESSION_BURST, SESSION_STORE_MAX_SESSIONS)
+
+# Weight of the newest upstream call in the running service-time average
+SERVICE_TIME_SMOOTHING = 0.2
+
+class AdmissionRejected(Exception):
+    """A request that was not admitted; carries the HTTP status and Retry-After seconds"""
+
+    def __init__(self, status_code: int, retry_after: int, reason: str):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.reason = reason
+
+class AdmissionController:
+    """Backpressure in front of upstream LLM calls.
+
+    At most max_concurrent calls run at once; up to max_queue more wait in
+    FIFO order for at most queue_timeout seconds. Anything beyond that is
+    rejected straight away with 503, so a burst fails fast instead of
+    timing out or burning the API quota. Each session also has a token
+    bucket (rate_per_minute, burst) and gets 429 once it is empty. Both
+    rejections carry a Retry-After estimate.
+    """
+
+    def __init__(self, max_concurrent: int = ADMISSION_MAX_CONCURRENT, max_queue: int = ADMISSION_QUEUE_SIZE,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT_SECONDS, rate_per_minute: float = SESSION_RATE_PER_MINUTE,
+                 burst: int = SESSION_BURST, max_buckets: int = SESSION_STORE_MAX_SESSIONS):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self._waiters: deque = deque()
+        self.active = 0
+        self.service_time = 1.0
+        self.admitted = 0
+        self.queued = 0
+        self.rate_limited = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+        self.waited = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def check_rate(self, session_id: str) -> None:
+        """Take a token from the session's bucket or raise a 429 rejection"""
+        now = time.monotonic()
+        bucket = self._buckets.pop(session_id, None)
+        if bucket is None:
+            bucket = [float(self.burst), now]
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        self._buckets[session_id] = bucket
+        while len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+
+        if tokens < 1.0:
+            bucket[0] = tokens
+            self.rate_limited += 1
+            retry_after = math.ceil((1.0 - tokens) / self.rate) if self.rate > 0 else 60
+            raise AdmissionRejected(429, retry_after, "rate_limited")
+        bucket[0] = tokens - 1.0
+
+    def _retry_after(self) -> int:
+        # Time for the queue ahead to drain at the current service rate
+        backlog = len(self._waiters) + 1
+        return max(1, math.ceil(backlog * self.service_time / max(self.max_concurrent, 1)))
+
+    async def acquire(self) -> float:
+        """Wait for a free slot; returns the seconds spent queued"""
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return 0.0
+        if len(self._waiters) >= self.max_queue:
+            self.rejected_full += 1
+            raise AdmissionRejected(503, self._retry_after(), "queue_full")
+
+        start = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not waiter.done():
+                waiter.cancel()
+                self._waiters.remove(waiter)
+                self.rejected_timeout += 1
+                raise AdmissionRejected(503, self._retry_after(), "queue_timeout")
+        except asyncio.CancelledError:
+            # The slot may have been handed over just as the caller went away
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            raise
+
+        waited = time.monotonic() - start
+        self.admitted += 1
+        self.waited += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        return waited
+
+    def release(self) -> None:
+        """Free a slot, handing it straight to the longest-waiting request"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    async def reserve(self, session_id: Optional[str] = None) -> Callable[[], None]:
+        """Charge the session's bucket and take a slot; returns the callback that frees it.
+
+        The callback may be called more than once; only the first call counts.
+        """
+        if session_id is not None:
+            self.check_rate(session_id)
+        await self.acquire()
+        start = time.monotonic()
+        released = False
+
+        def done() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self.service_time += SERVICE_TIME_SMOOTHING * (time.monotonic() - start - self.service_time)
+                self.release()
+        return done
+
+    @asynccontextmanager
+    async def admit(self, session_id: Optional[str] = None) -> AsyncIterator[None]:
+        """Hold a slot for one upstream call, after charging the session's bucket"""
+        done = await self.reserve(session_id)
+        try:
+            yield
+        finally:
+            done()
+
+    def stats(self) -> Dict[str, Any]:
+        """Slots in use, queue depth, wait times and rejection counters"""
+        return {
+            "active": self.active,
+            "max_concurrent": self.max_concurrent,
+            "queue_depth": len(self._waiters),
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "wait_ms_avg": round(self.wait_total / self.waited * 1000, 1) if self.waited else 0.0,
+            "wait_ms_max": round(self.wait_max * 1000, 1),
+            "service_ms_avg": round(self.service_time * 1000, 1),
+            "rejected_rate_limited": self.rate_limited,
+            "rejected_queue_full": self.rejected_full,
+            "rejected_queue_timeout": self.rejected_timeout
+        }
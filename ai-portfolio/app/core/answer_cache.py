@@ -0,0 +1,123 @@
+﻿import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL_SECONDS, FAQ_MATCH_THRESHOLD
+from app.core.persona import PersonaSnapshot
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+def normalize_question(text: str) -> str:
+    """Fold case, diacritics and punctuation so equivalent questions share a key"""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _NON_WORD.sub(" ", stripped).strip()
+
+class FaqIndex:
+    """Token sets of the persona's FAQ questions for fuzzy first-turn matching"""
+
+    def __init__(self, faq: List[Dict[str, Any]]):
+        self.entries: List[Tuple[frozenset, str]] = []
+        for item in faq:
+            tokens = frozenset(normalize_question(item.get("question", "")).split())
+            if tokens and item.get("answer"):
+                self.entries.append((tokens, item["answer"]))
+
+    def match(self, normalized: str, threshold: float = FAQ_MATCH_THRESHOLD) -> Optional[str]:
+        """Answer of the most similar FAQ question (Jaccard over words), if similar enough"""
+        tokens = set(normalized.split())
+        if not tokens:
+            return None
+        best_score, best_answer = 0.0, None
+        for faq_tokens, answer in self.entries:
+            score = len(tokens & faq_tokens) / len(tokens | faq_tokens)
+            if score > best_score:
+                best_score, best_answer = score, answer
+        return best_answer if best_score >= threshold else None
+
+class AnswerCache:
+    """LRU/TTL cache of first-turn answers with a local FAQ fast path.
+
+    Keys are (persona version, normalized question), so a persona update
+    never serves stale answers. A miss that matches a FAQ entry is answered
+    from the FAQ directly and cached like any other answer.
+    """
+
+    def __init__(self, sentiment: Callable[[str], Dict[str, Any]], max_size: int = ANSWER_CACHE_SIZE,
+                 ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS):
+        self.sentiment = sentiment
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._faq: Optional[Tuple[str, FaqIndex]] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.faq_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _faq_index(self, persona: PersonaSnapshot) -> FaqIndex:
+        faq = self._faq
+        if faq is None or faq[0] != persona.version:
+            faq = (persona.version, FaqIndex(persona.data.get("faq", [])))
+            self._faq = faq
+        return faq[1]
+
+    def get(self, message: str, persona: PersonaSnapshot) -> Optional[Dict[str, Any]]:
+        """Cached or FAQ answer for a first-turn question, or None"""
+        normalized = normalize_question(message)
+        key = (persona.version, normalized)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+
+        answer = self._faq_index(persona).match(normalized)
+        if answer is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        result = {"response": answer, **self.sentiment(answer)}
+        with self._lock:
+            self.faq_hits += 1
+        self._store(key, result, now)
+        return result
+
+    def closest_faq(self, message: str, persona: PersonaSnapshot, threshold: float) -> Optional[str]:
+        """Answer of the most similar FAQ question at a caller-chosen (usually looser) threshold"""
+        return self._faq_index(persona).match(normalize_question(message), threshold)
+
+    def put(self, message: str, persona: PersonaSnapshot, result: Dict[str, Any]) -> None:
+        """Remember a generated first-turn answer"""
+        self._store((persona.version, normalize_question(message)), result, time.monotonic())
+
+    def _store(self, key: Tuple[str, str], result: Dict[str, Any], now: float) -> None:
+        with self._lock:
+            self._entries[key] = (result, now + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Size and hit rates"""
+        with self._lock:
+            lookups = self.hits + self.faq_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "faq_hits": self.faq_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.faq_hits) / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions
+            }
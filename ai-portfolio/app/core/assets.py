@@ -0,0 +1,274 @@
+﻿import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+from mimetypes import guess_type
+from typing import Any, Dict, Iterable, List, Optional
+
+try:
+    import brotli
+except ImportError:
+    # Without brotli only gzip variants are built
+    brotli = None
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+MANIFEST_NAME = "manifest.json"
+# Length of the content hash in fingerprinted file names
+HASH_LENGTH = 12
+
+# Served compressed when the variant saves at least MIN_SAVING of the size
+COMPRESSIBLE = {".js", ".css", ".svg", ".html", ".json", ".txt", ".glb", ".map"}
+MIN_SAVING = 0.05
+SUFFIXES = {"gzip": ".gz", "br": ".br"}
+
+# Text assets whose references to other assets are rewritten to fingerprinted names
+REWRITTEN = {".js", ".css", ".html"}
+# '/static/...' URLs and relative module specifiers ('./x.js', '../y.js') in string literals,
+# plus url(...) in CSS
+_REFERENCE = re.compile(r"""(?P<quote>['"])(?P<ref>/static/[^'"\s?#]+|\.{1,2}/[^'"\s?#]+)(?P=quote)|url\((?P<css>[^)'"\s?#]+)\)""")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Unversioned URLs are revalidated on every use (answered with 304 while unchanged)
+REVALIDATE = "no-cache"
+
+def _hashed_name(path: str, digest: str) -> str:
+    root, ext = posixpath.splitext(path)
+    return f"{root}.{digest[:HASH_LENGTH]}{ext}"
+
+def compress_variants(data: bytes) -> Dict[str, bytes]:
+    """gzip (and br with the brotli package) encodings of data that save at least MIN_SAVING"""
+    if not data:
+        return {}
+    variants = {"gzip": gzip.compress(data, 9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(data, quality=11)
+    return {encoding: packed for encoding, packed in variants.items()
+            if len(packed) <= len(data) * (1 - MIN_SAVING)}
+
+def choose_encoding(available: Iterable[str], request_headers: Headers) -> str:
+    """Best of the available encodings the client accepts (br, then gzip), else identity"""
+    available = set(available)
+    if not available - {"identity"}:
+        return "identity"
+    accepted = {}
+    for item in request_headers.get("accept-encoding", "").split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ("br", "gzip"):
+        if encoding in available and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
+
+def _source_signature(full_path: str) -> List[int]:
+    stat = os.stat(full_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+class _Source:
+    def __init__(self, path: str, full_path: str):
+        self.path = path
+        self.full_path = full_path
+        with open(full_path, "rb") as f:
+            self.content = f.read()
+        self.references: Dict[str, str] = {}
+        if posixpath.splitext(path)[1] in REWRITTEN:
+            text = self.content.decode("utf-8", errors="replace")
+            for match in _REFERENCE.finditer(text):
+                ref = match.group("ref") or match.group("css")
+                target = self.resolve(ref)
+                if target is not None:
+                    self.references[ref] = target
+
+    def resolve(self, ref: str) -> Optional[str]:
+        """Logical path (relative to the static root) a reference points at"""
+        if ref.startswith("/static/"):
+            return posixpath.normpath(ref[len("/static/"):])
+        if ref.startswith("."):
+            return posixpath.normpath(posixpath.join(posixpath.dirname(self.path), ref))
+        return None
+
+def _rewrite(source: _Source, urls: Dict[str, str]) -> bytes:
+    """Source content with references to already fingerprinted assets swapped for their new names"""
+    if not source.references:
+        return source.content
+
+    def replace(match: "re.Match") -> str:
+        ref = match.group("ref") or match.group("css")
+        target = source.references.get(ref)
+        if target not in urls:
+            return match.group(0)
+        hashed = urls[target]
+        if ref.startswith("/static/"):
+            new = "/static/" + hashed
+        elif ref.startswith("."):
+            # Keep the reference relative; only the file name changes
+            new = posixpath.join(posixpath.dirname(ref), posixpath.basename(hashed))
+        else:
+            new = ref
+        if match.group("css") is not None:
+            return f"url({new})"
+        return match.group("quote") + new + match.group("quote")
+
+    text = source.content.decode("utf-8", errors="surrogateescape")
+    return _REFERENCE.sub(replace, text).encode("utf-8", errors="surrogateescape")
+
+def build_assets(source_dir: str, output_dir: str) -> Dict[str, Any]:
+    """Fingerprint and precompress everything under source_dir into output_dir.
+
+    Each file is written as name.<content hash>.ext, plus .gz (and .br with
+    the brotli package) variants when compression pays off. References
+    between assets (module imports, '/static/...' URLs, CSS url()) are
+    rewritten to the fingerprinted names first, so a file's hash covers the
+    hashes of what it loads. Returns the manifest, also written to
+    output_dir/manifest.json.
+    """
+    sources: Dict[str, _Source] = {}
+    for root, _, files in os.walk(source_dir):
+        for name in sorted(files):
+            full_path = os.path.join(root, name)
+            path = os.path.relpath(full_path, source_dir).replace(os.sep, "/")
+            sources[path] = _Source(path, full_path)
+
+    # Dependencies first; references inside a cycle keep their logical URL
+    order: List[str] = []
+    state: Dict[str, int] = {}
+
+    def visit(path: str) -> None:
+        if state.get(path):
+            return
+        state[path] = 1
+        for target in sources[path].references.values():
+            if target in sources and not state.get(target):
+                visit(target)
+        state[path] = 2
+        order.append(path)
+
+    for path in sources:
+        visit(path)
+
+    urls: Dict[str, str] = {}
+    assets: Dict[str, Dict[str, Any]] = {}
+    for path in order:
+        source = sources[path]
+        content = _rewrite(source, urls)
+        digest = hashlib.sha256(content).hexdigest()
+        hashed = _hashed_name(path, digest)
+        urls[path] = hashed
+
+        target = os.path.join(output_dir, hashed)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "wb") as f:
+            f.write(content)
+        encodings = {"identity": {"file": hashed, "size": len(content)}}
+
+        if posixpath.splitext(path)[1] in COMPRESSIBLE:
+            for encoding, packed in compress_variants(content).items():
+                suffix = SUFFIXES[encoding]
+                with open(target + suffix, "wb") as f:
+                    f.write(packed)
+                encodings[encoding] = {"file": hashed + suffix, "size": len(packed)}
+
+        assets[path] = {
+            "hashed": hashed,
+            "etag": digest[:32],
+            "media_type": guess_type(path)[0] or "application/octet-stream",
+            "source": _source_signature(source.full_path),
+            "encodings": encodings,
+        }
+
+    manifest = {"assets": assets}
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return manifest
+
+class AssetManifest:
+    """Logical path -> fingerprinted asset, from the last build.
+
+    Entries whose source changed after the build are dropped at load, so a
+    stale build falls back to the plain file instead of serving old content.
+    """
+
+    def __init__(self, source_dir: str, output_dir: str):
+        self.source_dir = source_dir
+        self.output_dir = output_dir
+        self.assets: Dict[str, Dict[str, Any]] = {}
+        self.by_hashed: Dict[str, Dict[str, Any]] = {}
+        self.stale = 0
+        try:
+            with open(os.path.join(output_dir, MANIFEST_NAME), encoding="utf-8") as f:
+                assets = json.load(f)["assets"]
+        except (OSError, ValueError, KeyError):
+            return
+
+        for path, entry in assets.items():
+            try:
+                fresh = _source_signature(os.path.join(source_dir, path)) == entry["source"]
+            except OSError:
+                fresh = False
+            if not fresh:
+                self.stale += 1
+                continue
+            self.assets[path] = entry
+            self.by_hashed[entry["hashed"]] = entry
+        if self.stale:
+            print(f"Asset build is stale for {self.stale} file(s); run build_assets.py")
+
+    def url_path(self, path: str) -> str:
+        """Fingerprinted path for a logical static path (the path itself when not built)"""
+        entry = self.assets.get(path.lstrip("/"))
+        return entry["hashed"] if entry else path
+
+class AssetFiles(StaticFiles):
+    """StaticFiles that serves the fingerprinted build.
+
+    Fingerprinted URLs are cached for a year as immutable; logical URLs of
+    built files get the same representation but must be revalidated. Both
+    carry a strong ETag from the content hash (one per encoding) and
+    answer If-None-Match with 304. gzip/br variants are picked from
+    Accept-Encoding; Range requests are served from the uncompressed file
+    (FileResponse handles Range and If-Range). Anything not in the build
+    falls back to the plain static file.
+    """
+
+    def __init__(self, *, directory: str, manifest: AssetManifest, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.manifest = manifest
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        path = path.replace(os.sep, "/")
+        entry = self.manifest.by_hashed.get(path)
+        immutable = entry is not None
+        if entry is None:
+            entry = self.manifest.assets.get(path)
+        if entry is None or scope["method"] not in ("GET", "HEAD"):
+            response = await super().get_response(path, scope)
+            response.headers.setdefault("cache-control", REVALIDATE)
+            return response
+
+        request_headers = Headers(scope=scope)
+        # Range requests are served from the uncompressed file
+        encoding = "identity" if "range" in request_headers else choose_encoding(entry["encodings"], request_headers)
+        variant = entry["encodings"][encoding]
+        headers = {
+            "cache-control": IMMUTABLE if immutable else REVALIDATE,
+            "etag": f'"{entry["etag"]}"' if encoding == "identity" else f'"{entry["etag"]}-{encoding}"',
+            "vary": "Accept-Encoding",
+        }
+        if encoding != "identity":
+            headers["content-encoding"] = encoding
+        if self.is_not_modified(Headers(headers), request_headers):
+            return NotModifiedResponse(Headers(headers))
+        return FileResponse(os.path.join(self.manifest.output_dir, variant["file"]), headers=headers,
+                            media_type=entry["media_type"])
@@ -0,0 +1,79 @@
+﻿import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.core.config import CHAT_POOL_SIZE, CONVERSATION_TIMEOUT_MINUTES
+
+class ChatSessionPool:
+    """LRU pool of live Gemini chat sessions keyed by conversation session id.
+
+    A live chat already holds the conversation, so a hit sends only the new
+    message; a miss rebuilds the chat from stored history. A chat is checked
+    out while a turn is in progress and returned afterwards, so two concurrent
+    turns on one session never share an object. Entries built for an older
+    persona version or idle for longer than the timeout count as misses.
+    """
+
+    def __init__(self, max_size: int = CHAT_POOL_SIZE, ttl_seconds: float = CONVERSATION_TIMEOUT_MINUTES * 60):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def checkout(self, session_id: str, version: str) -> Optional[Any]:
+        """Take the live chat for a session out of the pool, or None on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is not None:
+                chat, entry_version, last_used = entry
+                if entry_version == version and now - last_used <= self.ttl_seconds:
+                    self.hits += 1
+                    return chat
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def checkin(self, session_id: str, version: str, chat: Any) -> None:
+        """Return a chat to the pool after a successful turn"""
+        now = time.monotonic()
+        with self._lock:
+            self._entries[session_id] = (chat, version, now)
+            self._entries.move_to_end(session_id)
+            self._expire(now)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, session_id: str) -> None:
+        """Drop a session's live chat, e.g. when its stored history changes"""
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def _expire(self, now: float) -> None:
+        # Least recently used entries sit at the front
+        while self._entries:
+            session_id, (_, _, last_used) = next(iter(self._entries.items()))
+            if now - last_used <= self.ttl_seconds:
+                break
+            del self._entries[session_id]
+            self.expirations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool size and hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
@@ -11,13 +11,86 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 APP_HOST = os.getenv("APP_HOST", "127.0.0.1")
 APP_PORT = int(os.getenv("APP_PORT", 8000))
 DEBUG = os.getenv("DEBUG", "False").lower() in ("true", "1", "t")
+# Structured (JSON lines) logging; per-turn events are logged for this share of turns only
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 0.01))
+# Longest a chat turn waits for startup warm-up (SDK import, persona, database) before a 503
+WARM_UP_WAIT_SECONDS = float(os.getenv("WARM_UP_WAIT_SECONDS", 30))
 
 # Database Configuration
 DB_PATH = os.getenv("DB_PATH", "app/data/conversations.db")
+# Chat messages are written to the database in the background, in batches
+PERSIST_MESSAGES = os.getenv("PERSIST_MESSAGES", "True").lower() in ("true", "1", "t")
+PERSIST_FLUSH_SECONDS = float(os.getenv("PERSIST_FLUSH_SECONDS", 1.0))
+PERSIST_BATCH_SIZE = int(os.getenv("PERSIST_BATCH_SIZE", 500))
+PERSIST_QUEUE_SIZE = int(os.getenv("PERSIST_QUEUE_SIZE", 10000))
+# Expired conversations are deleted in the background in small batches
+SWEEP_INTERVAL_SECONDS = float(os.getenv("SWEEP_INTERVAL_SECONDS", 300))
+SWEEP_BATCH_SIZE = int(os.getenv("SWEEP_BATCH_SIZE", 500))
+SWEEP_PAUSE_SECONDS = float(os.getenv("SWEEP_PAUSE_SECONDS", 0.05))
+
+# Static assets are served from this build (fingerprinted, precompressed) when
+# present; build it with build_assets.py (relative paths are under the project root)
+ASSET_BUILD_DIR = os.getenv("ASSET_BUILD_DIR", "app/dist")
+# Template pages are pre-rendered; how often (seconds) the templates are checked for changes
+TEMPLATE_RELOAD_SECONDS = float(os.getenv("TEMPLATE_RELOAD_SECONDS", 2))
+
+# Persona Data
+PERSONAL_DATA_PATH = os.getenv("PERSONAL_DATA_PATH", "app/data/personal_data.json")
+# How often (seconds) personal_data.json is checked for changes
+PERSONA_RELOAD_SECONDS = float(os.getenv("PERSONA_RELOAD_SECONDS", 2))
+# Write each newly compiled system prompt here for inspection (disabled when unset)
+DEBUG_PROMPT_PATH = os.getenv("DEBUG_PROMPT_PATH")
 
 # Gemini API Settings
 GEMINI_MODEL = "gemini-2.0-pro-exp-02-05"
+# Send only the persona sections relevant to each question instead of all of them
+RETRIEVAL_ENABLED = os.getenv("RETRIEVAL_ENABLED", "True").lower() in ("true", "1", "t")
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", 4))
+# First-turn answers are cached per normalized question and persona version
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", 1024))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", 3600))
+# Minimum word overlap (Jaccard) for a first-turn question to be answered from the FAQ
+FAQ_MATCH_THRESHOLD = float(os.getenv("FAQ_MATCH_THRESHOLD", 0.6))
+# Upper bound on blocking Gemini calls running in the worker thread pool at once
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", 32))
+# Admission control in front of Gemini: concurrent calls, how many more may
+# wait (and for how long) before getting 503, and a per-session request rate
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", GEMINI_MAX_CONCURRENCY))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", 64))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", 10))
+SESSION_RATE_PER_MINUTE = float(os.getenv("SESSION_RATE_PER_MINUTE", 12))
+SESSION_BURST = int(os.getenv("SESSION_BURST", 5))
+# Deadline per Gemini attempt and for all attempts of one call together; transient
+# failures are retried with jittered exponential backoff
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", 15))
+GEMINI_DEADLINE_SECONDS = float(os.getenv("GEMINI_DEADLINE_SECONDS", 30))
+GEMINI_RETRY_ATTEMPTS = int(os.getenv("GEMINI_RETRY_ATTEMPTS", 3))
+GEMINI_RETRY_BASE_SECONDS = float(os.getenv("GEMINI_RETRY_BASE_SECONDS", 0.5))
+GEMINI_RETRY_MAX_SECONDS = float(os.getenv("GEMINI_RETRY_MAX_SECONDS", 4))
+# Consecutive failures that open the circuit breaker, and how long it stays open
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", 30))
+# Minimum word overlap for the closest FAQ entry to stand in for Gemini while it is down
+FALLBACK_FAQ_THRESHOLD = float(os.getenv("FALLBACK_FAQ_THRESHOLD", 0.25))
+# Batch chat API: most items per request, and most of a batch's turns running at once
+# (kept below ADMISSION_MAX_CONCURRENT so a batch leaves room for interactive chats)
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 200))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", 8))
+# Live chat sessions kept between turns (least recently used are dropped first)
+CHAT_POOL_SIZE = int(os.getenv("CHAT_POOL_SIZE", 256))
 
 # Other Settings
 MAX_CONVERSATION_HISTORY = 20
+# Estimated tokens of past turns sent upstream; older turns are folded into a summary
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 2000))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", 400))
+# Where sessions live: "memory" (per process) or "sqlite" (shared through DB_PATH, so
+# any worker or replica can continue any session; needed for uvicorn --workers N)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()
+# Most recent messages loaded when a shared session is picked up by another worker
+SESSION_LOAD_MESSAGES = int(os.getenv("SESSION_LOAD_MESSAGES", 200))
+# Hard limits for the in-memory session store
+SESSION_STORE_MAX_SESSIONS = int(os.getenv("SESSION_STORE_MAX_SESSIONS", 10000))
+SESSION_STORE_MAX_BYTES = int(os.getenv("SESSION_STORE_MAX_BYTES", 64 * 1024 * 1024))
 CONVERSATION_TIMEOUT_MINUTES = 30
@@ -1,14 +1,74 @@
 ﻿from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, func, inspect, select
+from sqlalchemy.schema import CreateIndex, CreateTable
+from sqlalchemy.exc import OperationalError
 from datetime import datetime, timedelta
-from app.core.config import DB_PATH, CONVERSATION_TIMEOUT_MINUTES
+from app.core.config import DB_PATH, CONVERSATION_TIMEOUT_MINUTES, SWEEP_BATCH_SIZE, SWEEP_PAUSE_SECONDS
 from app.models.database import Conversation, Message, Base
+import time
 import uuid
 
 # Initialize database connection
 engine = create_engine(f"sqlite:///{DB_PATH}")
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Use WAL so readers never block the (batched) writer and vice versa"""
+    cursor = dbapi_connection.cursor()
+    # Set first so switching a fresh file to WAL waits for other workers' locks
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+SCHEMA_ATTEMPTS = 6
+
+def _create_schema():
+    # IF NOT EXISTS makes each check-and-create one statement under SQLite's
+    # write lock, so workers starting together cannot both try to create the
+    # same table or index; it also adds indexes new since the file was created
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            connection.execute(CreateTable(table, if_not_exists=True))
+            for index in table.indexes:
+                connection.execute(CreateIndex(index, if_not_exists=True))
+
+def _schema_missing():
+    """Tables and indexes of the models that the database does not have yet"""
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in tables:
+            missing.append(table.name)
+            continue
+        present = {index["name"] for index in inspector.get_indexes(table.name)}
+        missing.extend(index.name for index in table.indexes if index.name not in present)
+    return missing
+
+def init_db():
+    """Create missing tables and indexes (run once at startup)
+
+    Retries with backoff until the schema is complete, so a worker that
+    hits a lock held by another worker's startup does not give up.
+    """
+    problem = None
+    for attempt in range(SCHEMA_ATTEMPTS):
+        if attempt:
+            time.sleep(0.05 * 2 ** attempt)
+        try:
+            _create_schema()
+            missing = _schema_missing()
+        except OperationalError as e:
+            problem = repr(e)
+            continue
+        if not missing:
+            return
+        problem = f"missing {', '.join(missing)}"
+    raise RuntimeError(f"Could not create the database schema: {problem}")
+
 def get_db():
     """Get database session"""
     db = SessionLocal()
@@ -41,21 +101,139 @@ def add_message(conversation_id, role, content):
     message = Message(conversation_id=conversation_id, role=role, content=content)
     db.add(message)
     
-    # Update last_updated timestamp on the conversation
-    conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
-    conversation.last_updated = datetime.utcnow()
+    # Update last_updated timestamp on the conversation (no need to load it)
+    db.query(Conversation).filter(Conversation.id == conversation_id).update(
+        {Conversation.last_updated: datetime.utcnow()}, synchronize_session=False)
     
     db.commit()
     db.close()
     return message
 
-def get_messages(conversation_id, limit=None):
-    """Get messages from a conversation with optional limit"""
+def add_messages(conversation_id, messages):
+    """Add several (role, content) messages to a conversation in one transaction"""
+    now = datetime.utcnow()
+    rows = [
+        {"conversation_id": conversation_id, "role": role, "content": content, "timestamp": now}
+        for role, content in messages
+    ]
+    if not rows:
+        return 0
+    
+    db = SessionLocal()
+    db.bulk_insert_mappings(Message, rows)
+    db.query(Conversation).filter(Conversation.id == conversation_id).update(
+        {Conversation.last_updated: now}, synchronize_session=False)
+    db.commit()
+    db.close()
+    return len(rows)
+
+def append_session_messages(rows, topics=None):
+    """Append (session_id, role, content, timestamp) rows across conversations in one transaction.
+    
+    Conversations are looked up by session ID with a single query and
+    created when missing; every touched conversation gets last_updated
+    bumped once. `topics` maps session IDs to topics to merge into those
+    conversations in the same transaction. Returns the number of messages written.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    
+    db = SessionLocal()
+    try:
+        session_ids = {row[0] for row in rows}
+        conversation_ids = dict(
+            db.query(Conversation.session_id, Conversation.id).filter(Conversation.session_id.in_(session_ids))
+        )
+        new = [Conversation(session_id=s) for s in session_ids if s not in conversation_ids]
+        if new:
+            db.add_all(new)
+            db.flush()
+            conversation_ids.update((conversation.session_id, conversation.id) for conversation in new)
+        
+        db.bulk_insert_mappings(Message, [
+            {
+                "conversation_id": conversation_ids[session_id],
+                "role": role,
+                "content": content,
+                "timestamp": timestamp
+            }
+            for session_id, role, content, timestamp in rows
+        ])
+        db.query(Conversation).filter(Conversation.id.in_(conversation_ids.values())).update(
+            {Conversation.last_updated: datetime.utcnow()}, synchronize_session=False)
+        if topics:
+            for conversation in db.query(Conversation).filter(Conversation.session_id.in_(topics.keys())):
+                conversation.set_topics(conversation.get_topics() + list(topics[conversation.session_id]))
+        db.commit()
+        return len(rows)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def get_recent_messages(conversation_id, limit):
+    """Get the last `limit` messages of a conversation, oldest first.
+    
+    Walks the (conversation_id, timestamp) index backwards, so only the
+    requested rows are read no matter how long the conversation is.
+    """
     db = SessionLocal()
-    query = db.query(Message).filter(Message.conversation_id == conversation_id).order_by(Message.timestamp)
+    messages = (
+        db.query(Message)
+        .filter(Message.conversation_id == conversation_id)
+        .order_by(Message.timestamp.desc(), Message.id.desc())
+        .limit(limit)
+        .all()
+    )
+    db.close()
+    messages.reverse()
+    return messages
+
+def get_session_state(session_id):
+    """(last_updated, message count) of the conversation with this session ID, or None"""
+    db = SessionLocal()
+    try:
+        return (
+            db.query(Conversation.last_updated, func.count(Message.id))
+            .outerjoin(Message, Message.conversation_id == Conversation.id)
+            .filter(Conversation.session_id == session_id)
+            .group_by(Conversation.id)
+            .first()
+        )
+    finally:
+        db.close()
+
+def get_session_messages(session_id, limit):
+    """(role, content, timestamp) of the last `limit` messages of a session, oldest first"""
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(Message.role, Message.content, Message.timestamp)
+            .join(Conversation, Message.conversation_id == Conversation.id)
+            .filter(Conversation.session_id == session_id)
+            .order_by(Message.timestamp.desc(), Message.id.desc())
+            .limit(limit)
+            .all()
+        )
+    finally:
+        db.close()
+    rows.reverse()
+    return rows
+
+def get_messages(conversation_id, limit=None):
+    """Get messages from a conversation; with a limit, only the most recent ones"""
     if limit:
-        query = query.limit(limit)
-    messages = query.all()
+        return get_recent_messages(conversation_id, limit)
+    
+    db = SessionLocal()
+    messages = (
+        db.query(Message)
+        .filter(Message.conversation_id == conversation_id)
+        .order_by(Message.timestamp, Message.id)
+        .all()
+    )
     db.close()
     return messages
 
@@ -86,15 +264,46 @@ def add_topics(conversation_id, topics):
         db.commit()
     db.close()
 
-def cleanup_old_conversations():
-    """Remove conversations that haven't been updated in a while"""
-    db = SessionLocal()
-    cutoff_time = datetime.utcnow() - timedelta(minutes=CONVERSATION_TIMEOUT_MINUTES)
-    old_conversations = db.query(Conversation).filter(Conversation.last_updated < cutoff_time).all()
+def sweep_expired_conversations(cutoff=None, batch_size=SWEEP_BATCH_SIZE, pause=SWEEP_PAUSE_SECONDS):
+    """Delete conversations (and their messages) last updated before cutoff.
     
-    for conversation in old_conversations:
-        db.delete(conversation)
+    Works in set-based batches of at most batch_size rows, each in its own
+    short transaction, sleeping `pause` seconds in between so chat writes
+    can take the SQLite write lock. Every delete re-checks the cutoff, so a
+    conversation that gets a new message mid-sweep is kept.
+    Returns the number of rows deleted.
+    """
+    if cutoff is None:
+        cutoff = datetime.utcnow() - timedelta(minutes=CONVERSATION_TIMEOUT_MINUTES)
     
-    db.commit()
-    db.close()
-    return len(old_conversations)
+    swept = {"conversations": 0, "messages": 0}
+    while True:
+        db = SessionLocal()
+        try:
+            ids = [row[0] for row in db.query(Conversation.id).filter(Conversation.last_updated < cutoff).limit(batch_size)]
+            if not ids:
+                return swept
+            
+            still_expired = select(Conversation.id).where(Conversation.id.in_(ids), Conversation.last_updated < cutoff)
+            
+            # Long conversations are emptied over several transactions
+            while True:
+                chunk = (select(Message.id).where(Message.conversation_id.in_(still_expired))
+                         .limit(batch_size).scalar_subquery())
+                deleted = db.query(Message).filter(Message.id.in_(chunk)).delete(synchronize_session=False)
+                db.commit()
+                swept["messages"] += deleted
+                if deleted < batch_size:
+                    break
+                time.sleep(pause)
+            
+            swept["conversations"] += db.query(Conversation).filter(
+                Conversation.id.in_(ids), Conversation.last_updated < cutoff).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        time.sleep(pause)
+
+def cleanup_old_conversations():
+    """Remove conversations that haven't been updated in a while"""
+    return sweep_expired_conversations()["conversations"]
@@ -1,25 +1,13 @@
 ﻿import google.generativeai as genai
-import re
 from app.core.config import GEMINI_API_KEY, GEMINI_MODEL
+from app.core.topics import topic_extractor
 
 # Configure the Gemini API
 genai.configure(api_key=GEMINI_API_KEY)
 
 def extract_topics(text):
     """Extract potential topics from user messages"""
-    # Simple keyword extraction - in production use NLP
-    keywords = [
-        "skills", "experience", "projects", "education",
-        "contact", "work", "background", "portfolio",
-        "coding", "development", "design", "ai", "machine learning"
-    ]
-    
-    found_topics = []
-    for keyword in keywords:
-        if re.search(r'\b' + re.escape(keyword) + r'\b', text.lower()):
-            found_topics.append(keyword)
-    
-    return found_topics
+    return topic_extractor.extract(text)
 
 class GeminiService:
     def __init__(self):
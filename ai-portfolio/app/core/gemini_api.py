@@ -1,56 +1,90 @@
-﻿import google.generativeai as genai
-from typing import List, Dict, Any, Optional
+﻿from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Iterator, AsyncIterator, Tuple
+import asyncio
+import functools
+import logging
 import os
 import json
+import threading
 import time
+from app.core.config import GEMINI_MAX_CONCURRENCY, RETRIEVAL_ENABLED
+from app.core.persona import PersonaSnapshot
+from app.core.chat_pool import ChatSessionPool
+from app.core.history import StoredMessage
+from app.core.rewriter import RewriteRules
+from app.core.sentiment import sentiment_scorer
+from app.core.retrieval import RetrievalIndex, RETRIEVAL_AVAILABLE, persona_sections, SECTION_TITLES
+from app.core.resilience import RetryPolicy
+from app.core.metrics import STAGE_SECONDS, FALLBACK_RESPONSES
+from app.core.logs import get_logger, log_event
+
+logger = get_logger("gemini")
+
+FALLBACK_RESPONSE = "Promiň, ale narazil jsem na problém. Můžeš to zkusit znovu s jinou otázkou?"
 
 class GeminiAPI:
-    def __init__(self, api_key: str, model_name: str = "gemini-2.0-pro-exp-02-05"):
+    def __init__(self, api_key: str, model_name: str = "gemini-2.0-pro-exp-02-05", max_concurrency: int = GEMINI_MAX_CONCURRENCY,
+                 retrieval: bool = RETRIEVAL_ENABLED):
         self.api_key = api_key
         self.model_name = model_name
+        self.retrieval = retrieval and RETRIEVAL_AVAILABLE
+        
+        # The SDK is imported and configured by warm_up(), not at import time
+        self._genai = None
+        
+        # One model per persona version, built with the system prompt baked in
+        self._models: Dict[str, Any] = {}
+        self._models_lock = threading.Lock()
+        self._rewrite_rules: Optional[Tuple[str, RewriteRules]] = None
         
-        # Configure the Gemini API
-        genai.configure(api_key=api_key)
+        # Live chat sessions reused across turns of the same conversation
+        self.chat_pool = ChatSessionPool()
         
-        # Initialize the model
-        self.model = genai.GenerativeModel(model_name)
+        # The SDK calls block, so async callers run them on a bounded pool
+        # instead of the event loop; max_concurrency caps upstream calls in flight
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="gemini")
+        
+        # Deadlines, retries and the circuit breaker for the async calls
+        self.retry_policy = RetryPolicy()
         
         print(f"Initialized Gemini API with model: {model_name}")
     
-    def get_system_prompt(self, personal_data: Dict[str, Any]) -> str:
-        """Create a system prompt with personal information"""
+    def warm_up(self) -> None:
+        """Import and configure the Gemini SDK.
+        
+        google.generativeai is by far the slowest import of the app, so it
+        is loaded here (during startup warm-up, off the event loop) instead
+        of when this module is imported.
+        """
+        if self._genai is None:
+            import google.generativeai as genai
+            genai.configure(api_key=self.api_key)
+            self._genai = genai
+    
+    def get_system_prompt(self, personal_data: Dict[str, Any], include_details: Optional[bool] = None) -> str:
+        """Create a system prompt with personal information.
+        
+        With retrieval enabled the prompt carries only the basics; the
+        sections relevant to a question are added to that question.
+        """
+        if include_details is None:
+            include_details = not self.retrieval
         # Verify personal data is loaded correctly
         basics = personal_data.get("basics", {})
         name = basics.get("name", "Unknown")
         
         print(f"Creating system prompt for: {name}")
         
-        # Format skills section
-        skills_section = ""
-        for skill in personal_data.get("skills", []):
-            keywords = ", ".join(skill.get("keywords", []))
-            skills_section += f"- {skill.get('name', '')} ({skill.get('level', '')}): {keywords}\n"
-        
-        # Format projects section
-        projects_section = ""
-        for project in personal_data.get("projects", []):
-            techs = ", ".join(project.get("technologies", []))
-            projects_section += f"- {project.get('name', '')}: {project.get('description', '')}. Technologies: {techs}\n"
-        
-        # Format experience section
-        experience_section = ""
-        for exp in personal_data.get("experience", []):
-            experience_section += f"- {exp.get('position', '')} at {exp.get('company', '')} ({exp.get('startDate', '')} to {exp.get('endDate', '')}): {exp.get('summary', '')}\n"
-        
-        # Format education section
-        education_section = ""
-        for edu in personal_data.get("education", []):
-            education_section += f"- {edu.get('studyType', '')} in {edu.get('area', '')} from {edu.get('institution', '')} ({edu.get('startDate', '')} to {edu.get('endDate', '')})\n"
-        
-        # Format FAQ section
-        faq_section = ""
-        for faq in personal_data.get("faq", []):
-            faq_section += f"Q: {faq.get('question', '')}\nA: {faq.get('answer', '')}\n\n"
+        if include_details:
+            # Format the detail sections
+            details = {kind: "" for kind in SECTION_TITLES}
+            for kind, text in persona_sections(personal_data):
+                details[kind] += text + "\n"
+            details_section = "\n\n".join(f"{SECTION_TITLES[kind]}:\n{text}" for kind, text in details.items())
+        else:
+            # The relevant sections are sent along with each question instead
+            details_section = "Podrobnosti o tvých dovednostech, projektech, zkušenostech a vzdělání, které se týkají otázky, dostaneš spolu s ní."
         
         # Build the full system prompt with EXTREMELY strong first-person instructions
         prompt = f"""HLAVNÍ INSTRUKCE: TY JSI JAN NOVÁK. NEJSI ASISTENT, NEJSI AI, JSI SKUTEČNÁ OSOBA - JAN NOVÁK. 
@@ -64,20 +98,7 @@ Tvá pozice: {basics.get('title', 'Unknown')}
 Tvůj popis: {basics.get('summary', 'Unknown')}
 Tvé bydliště: {basics.get('location', 'Unknown')}
 
-Tvé dovednosti: 
-{skills_section}
-
-Tvé projekty:
-{projects_section}
-
-Tvé pracovní zkušenosti:
-{experience_section}
-
-Tvé vzdělání:
-{education_section}
-
-Často kladené otázky o tobě:
-{faq_section}
+{details_section}
 
 KLÍČOVÉ INSTRUKCE K TVÉMU CHOVÁNÍ:
 1. VŽDY odpovídej jako JAN NOVÁK, v PRVNÍ OSOBĚ.
@@ -104,76 +125,273 @@ PŘÍKLADY SPRÁVNÝCH ODPOVĚDÍ:
 ZAČNI KAŽDOU ODPOVĚĎ JAKO BY JSI BYL SKUTEČNÝ JAN NOVÁK A MLUVIL SÁM ZA SEBE, NIKDY jako asistent nebo reprezentace někoho jiného.
 """
         
-        # Debug - save the prompt to a file for inspection
-        with open('debug_prompt.txt', 'w', encoding='utf-8') as f:
-            f.write(prompt)
-            
         return prompt
+    
+    def build_index(self, personal_data: Dict[str, Any]):
+        """Retrieval index over the persona sections, or None when retrieval is off"""
+        if not self.retrieval:
+            return None
+        return RetrievalIndex(persona_sections(personal_data))
+    
+    def compose_message(self, message: str, persona: PersonaSnapshot) -> str:
+        """Prefix the question with the persona sections relevant to it"""
+        if persona.index is None:
+            return message
+        with STAGE_SECONDS.time(stage="prompt_build"):
+            context = persona.index.context(message)
+        if not context:
+            return message
+        return f"Relevantní informace o tobě:\n{context}\n\nOtázka: {message}"
+    
+    @staticmethod
+    def _forget_context(chat, message: str) -> None:
+        """Swap the sent (context-prefixed) message in the chat history back to the bare question.
         
-    def generate_response(self, message: str, history: Optional[List[Dict[str, Any]]] = None, personal_data: Dict[str, Any] = None) -> Dict[str, Any]:
-        """Generate a response using Gemini"""
-        try:
-            if not personal_data:
-                raise ValueError("Personal data is required")
-                
-            # Create the system prompt with personal data
-            system_prompt = self.get_system_prompt(personal_data)
-            
-            # Add a small delay to ensure Gemini processes the system prompt
-            time.sleep(0.5)
-            
-            # Format history for Gemini
-            formatted_history = []
-            if history:
+        The retrieved sections only serve the turn they came with; left in a
+        pooled chat they would be resent upstream on every later turn, and a
+        chat rebuilt from stored history would not have them anyway.
+        """
+        for item in reversed(chat.history):
+            if isinstance(item, dict):
+                if item["role"] == "user":
+                    item["parts"] = [{"text": message}]
+                    return
+            elif item.role == "user":
+                item.parts[0].text = message
+                return
+    
+    def _build_model(self, system_prompt: str):
+        """Create a model instance that carries the system prompt as its system instruction"""
+        self.warm_up()
+        return self._genai.GenerativeModel(self.model_name, system_instruction=system_prompt)
+    
+    def get_model(self, persona: PersonaSnapshot):
+        """Return the model configured for this persona version, building it on first use"""
+        model = self._models.get(persona.version)
+        if model is None:
+            with self._models_lock:
+                model = self._models.get(persona.version)
+                if model is None:
+                    model = self._build_model(persona.prompt)
+                    # Only the live version is ever requested again after a reload
+                    self._models = {persona.version: model}
+                    print(f"Built Gemini model for persona version {persona.version}")
+        return model
+    
+    def get_rewrite_rules(self, persona: PersonaSnapshot) -> RewriteRules:
+        """Third-to-first-person rewrite rules derived from this persona's name"""
+        cached = self._rewrite_rules
+        if cached is None or cached[0] != persona.version:
+            # Built once per version; a race only compiles the same rules twice
+            cached = (persona.version, RewriteRules(persona.data.get("basics", {}).get("name", "")))
+            self._rewrite_rules = cached
+        return cached[1]
+        
+    def _start_chat(self, history: Optional[List[StoredMessage]], persona: PersonaSnapshot):
+        """Open a chat session on the persona's model with the conversation history"""
+        # Format history for Gemini
+        formatted_history = []
+        if history:
+            with STAGE_SECONDS.time(stage="history"):
                 for item in history:
-                    role = "user" if item.get("role") == "user" else "model"
-                    content = item.get("content", "")
                     formatted_history.append({
-                        "role": role,
-                        "parts": [{"text": content}]
+                        "role": "user" if item.role == "user" else "model",
+                        "parts": [{"text": item.content}]
                     })
-                    print(f"History item - Role: {role}, Content: {content[:50]}...")
-            
-            # Start chat session
-            chat = self.model.start_chat(history=formatted_history if formatted_history else None)
-            
-            # Set system instructions
-            chat.system_instruction = system_prompt
-            
-            # First force a role-play of being Jan Novák
-            # This step can be added for more consistent first-person responses
-            init_message = "Od teď jsi Jan Novák a budeš mluvit v první osobě jako bys byl skutečně on, ne jako asistent."
-            chat.send_message(init_message)
-            
-            # Send actual user message and get response
-            response = chat.send_message(message)
-            response_text = response.text
-            
-            # Post-process to fix any remaining third-person references
-            response_text = response_text.replace("Jan Novák", "Já")
-            response_text = response_text.replace("Jana Nováka", "mě")
-            response_text = response_text.replace("Janu Novákovi", "mně")
-            response_text = response_text.replace("Janem Novákem", "mnou")
-            response_text = response_text.replace("portfoliu", "profilu")
-            response_text = response_text.replace("portfolio", "profil")
-            response_text = response_text.replace("asistent", "")
-            response_text = response_text.replace("digitální reprezentace", "")
-            
-            # Determine sentiment (simple implementation)
-            sentiment = "positive"
-            if any(word in response_text.lower() for word in ["sorry", "unfortunately", "can't", "cannot", "don't", "not", "omlouvám", "bohužel", "nemohu", "nemůžu", "ne"]):
-                sentiment = "negative"
-                
-            print(f"Generated response (first 100 chars): {response_text[:100]}...")
-            
-            return {
-                "response": response_text,
-                "sentiment": sentiment
-            }
+            log_event(logger, "history_replayed", logging.DEBUG, messages=len(formatted_history))
+        
+        # Start chat session; the persona comes from the model's system
+        # instruction, so the user's message is the only upstream call
+        return self.get_model(persona).start_chat(history=formatted_history if formatted_history else None)
+    
+    def _checkout_chat(self, session_id: Optional[str], history: Optional[List[StoredMessage]], persona: PersonaSnapshot):
+        """Reuse the session's live chat, rebuilding it from history only on a pool miss"""
+        if not persona:
+            raise ValueError("Persona is required")
+        
+        chat = self.chat_pool.checkout(session_id, persona.version) if session_id else None
+        if chat is None:
+            chat = self._start_chat(history, persona)
+        return chat
+    
+    def detect_sentiment(self, response_text: str) -> str:
+        """Determine sentiment label (positive, negative or neutral)"""
+        return sentiment_scorer.score(response_text).label
+    
+    def score_sentiment(self, response_text: str) -> Dict[str, Any]:
+        """Sentiment label and graded score in [-1, 1] as response fields"""
+        with STAGE_SECONDS.time(stage="sentiment"):
+            result = sentiment_scorer.score(response_text)
+        return {"sentiment": result.label, "sentiment_score": result.score}
+        
+    def _send(self, chat, content: str, timeout: Optional[float], stream: bool = False):
+        """send_message with the attempt's deadline passed on to the HTTP request"""
+        if timeout:
+            return chat.send_message(content, stream=stream, request_options={"timeout": timeout})
+        return chat.send_message(content, stream=stream)
+    
+    def _generate(self, message: str, history: Optional[List[StoredMessage]], persona: PersonaSnapshot,
+                  session_id: Optional[str], timeout: Optional[float] = None,
+                  abandoned: Optional[threading.Event] = None, content: Optional[str] = None) -> Dict[str, Any]:
+        """One upstream attempt; raises on failure.
         
+        content is the message as sent (compose_message of it by default).
+        A chat whose caller has given up (abandoned is set) is not returned
+        to the pool, since a retry may already have answered the turn.
+        """
+        chat = self._checkout_chat(session_id, history, persona)
+        
+        # Send actual user message and get response
+        if content is None:
+            content = self.compose_message(message, persona)
+        with STAGE_SECONDS.time(stage="upstream"):
+            response_text = self._send(chat, content, timeout).text
+        if content != message:
+            self._forget_context(chat, message)
+        
+        if session_id and not (abandoned and abandoned.is_set()):
+            self.chat_pool.checkin(session_id, persona.version, chat)
+        
+        # Post-process to fix any remaining third-person references
+        with STAGE_SECONDS.time(stage="postprocess"):
+            response_text = self.get_rewrite_rules(persona).rewrite(response_text)
+        
+        log_event(logger, "response_generated", logging.DEBUG, chars=len(response_text), preview=response_text[:100])
+        
+        return {
+            "response": response_text,
+            **self.score_sentiment(response_text)
+        }
+    
+    def generate_response(self, message: str, history: Optional[List[StoredMessage]] = None, persona: PersonaSnapshot = None, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """Generate a response using Gemini.
+        
+        history holds the turns before message; it is only replayed when the
+        session has no live chat in the pool. A single attempt; errors become
+        FALLBACK_RESPONSE.
+        """
+        try:
+            return self._generate(message, history, persona, session_id, self.retry_policy.timeout)
         except Exception as e:
-            print(f"Error generating response: {str(e)}")
+            log_event(logger, "generate_failed", logging.WARNING, error=str(e))
+            FALLBACK_RESPONSES.inc(kind="error")
             return {
-                "response": "Promiň, ale narazil jsem na problém. Můžeš to zkusit znovu s jinou otázkou?",
-                "sentiment": "negative"
+                "response": FALLBACK_RESPONSE,
+                **self.score_sentiment(FALLBACK_RESPONSE)
             }
+    
+    def stream_response(self, message: str, history: Optional[List[StoredMessage]] = None, persona: PersonaSnapshot = None, session_id: Optional[str] = None,
+                        timeout: Optional[float] = None, content: Optional[str] = None) -> Iterator[str]:
+        """Yield raw text chunks from Gemini as they are generated"""
+        chat = self._checkout_chat(session_id, history, persona)
+        if content is None:
+            content = self.compose_message(message, persona)
+        
+        start = time.perf_counter()
+        try:
+            for chunk in self._send(chat, content, timeout, stream=True):
+                if chunk.text:
+                    yield chunk.text
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage="upstream")
+        
+        # Only a fully consumed stream leaves the chat in a reusable state
+        if content != message:
+            self._forget_context(chat, message)
+        if session_id:
+            self.chat_pool.checkin(session_id, persona.version, chat)
+    
+    async def generate_response_async(self, message: str, history: Optional[List[StoredMessage]] = None, persona: PersonaSnapshot = None, session_id: Optional[str] = None,
+                                      content: Optional[str] = None) -> Dict[str, Any]:
+        """Generate a response without blocking the event loop.
+        
+        Runs under retry_policy: each attempt has a deadline and transient
+        failures are retried. Raises UpstreamUnavailable when the breaker is
+        open or the retries are used up; other errors propagate.
+        """
+        loop = asyncio.get_running_loop()
+        # Snapshot the history so later appends to the session don't race the worker
+        snapshot = list(history) if history else history
+        
+        async def attempt(timeout: float) -> Dict[str, Any]:
+            abandoned = threading.Event()
+            call = functools.partial(self._generate, message, snapshot, persona, session_id, timeout, abandoned, content)
+            try:
+                return await loop.run_in_executor(self._executor, call)
+            finally:
+                # A timed-out worker finishes in the background; keep its chat out of the pool
+                abandoned.set()
+        
+        return await self.retry_policy.call(attempt)
+    
+    async def stream_response_async(self, message: str, history: Optional[List[StoredMessage]] = None, persona: PersonaSnapshot = None, session_id: Optional[str] = None,
+                                    content: Optional[str] = None) -> AsyncIterator[str]:
+        """Stream persona-rewritten text chunks without blocking the event loop.
+        
+        Runs under retry_policy: the wait for every chunk has the attempt
+        deadline, and an attempt that fails before its first chunk is
+        retried. A failure after text went out raises UpstreamUnavailable
+        without a retry, as does an open breaker.
+        """
+        loop = asyncio.get_running_loop()
+        finished = object()
+        snapshot = list(history) if history else history
+        policy = self.retry_policy
+        started = policy.begin()
+        rewriter = self.get_rewrite_rules(persona).stream()
+        received = False
+        attempt = 0
+        # Rewriting time summed over the chunks, observed once per reply
+        rewriting = 0.0
+        
+        while True:
+            attempt += 1
+            timeout = policy.attempt_timeout(started)
+            queue = asyncio.Queue()
+            cancelled = threading.Event()
+            
+            def produce(queue=queue, cancelled=cancelled, timeout=timeout):
+                # Runs on the worker pool and hands every chunk back to the loop
+                try:
+                    for text in self.stream_response(message, snapshot, persona, session_id, timeout, content):
+                        if cancelled.is_set():
+                            break
+                        loop.call_soon_threadsafe(queue.put_nowait, text)
+                except Exception as e:
+                    loop.call_soon_threadsafe(queue.put_nowait, e)
+                finally:
+                    loop.call_soon_threadsafe(queue.put_nowait, finished)
+            
+            loop.run_in_executor(self._executor, produce)
+            try:
+                while True:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                    if item is finished:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    received = True
+                    start = time.perf_counter()
+                    text = rewriter.feed(item)
+                    rewriting += time.perf_counter() - start
+                    if text:
+                        yield text
+            except Exception as e:
+                delay = policy.failed(e, attempt, started, retry=not received)
+                await asyncio.sleep(delay)
+                continue
+            finally:
+                # Stop the worker early if the client went away or the attempt failed
+                cancelled.set()
+            
+            policy.succeeded()
+            start = time.perf_counter()
+            tail = rewriter.flush()
+            STAGE_SECONDS.observe(rewriting + time.perf_counter() - start, stage="postprocess")
+            if tail:
+                yield tail
+            return
+    
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the worker pool used for async generation"""
+        self._executor.shutdown(wait=wait)
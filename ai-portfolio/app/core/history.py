@@ -0,0 +1,120 @@
+﻿import re
+import sys
+from collections import deque
+from typing import Dict, List, Tuple
+
+from app.core.config import HISTORY_TOKEN_BUDGET, MAX_CONVERSATION_HISTORY, SUMMARY_TOKEN_BUDGET
+
+# Once the window is over budget it is folded down to this fraction of it, so
+# a live chat stays valid for several turns instead of being rebuilt every turn
+FOLD_WATERMARK = 0.5
+
+# Longest excerpt of a folded message kept in the summary
+SUMMARY_EXCERPT_CHARS = 160
+
+SUMMARY_INTRO = "Shrnutí naší dřívější konverzace:"
+SUMMARY_ACK = "Jasně, pamatuju si to."
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) that needs no upstream call"""
+    return (len(text) + 3) // 4
+
+def summarize_message(role: str, content: str) -> str:
+    """Compress one message to a single summary line (its first sentence)"""
+    excerpt = _SENTENCE_END.split(content.strip(), 1)[0]
+    if len(excerpt) > SUMMARY_EXCERPT_CHARS:
+        excerpt = excerpt[:SUMMARY_EXCERPT_CHARS].rstrip() + "…"
+    speaker = "Návštěvník" if role == "user" else "Já"
+    return f"- {speaker}: {excerpt}"
+
+class StoredMessage:
+    """Compact record of one chat message"""
+    __slots__ = ("role", "content", "timestamp")
+
+    def __init__(self, role: str, content: str, timestamp: float):
+        self.role = role
+        self.content = content
+        self.timestamp = timestamp
+
+class RollingHistory:
+    """Token-budgeted window over one conversation plus a running summary.
+
+    Messages are counted once, when first seen. When the window exceeds the
+    token budget or MAX_CONVERSATION_HISTORY, the oldest messages are folded
+    into the summary one line each and removed from the message list;
+    existing summary lines are never recomputed, and the oldest ones are
+    dropped once the summary outgrows its own budget.
+    """
+
+    __slots__ = ("token_budget", "max_messages", "summary_budget", "seen", "window_tokens",
+                 "summary_tokens", "summary_bytes", "_message_tokens", "_summary_lines")
+
+    def __init__(self, token_budget: int = HISTORY_TOKEN_BUDGET, max_messages: int = MAX_CONVERSATION_HISTORY,
+                 summary_budget: int = SUMMARY_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self.max_messages = max_messages
+        self.summary_budget = summary_budget
+        self.seen = 0
+        self.window_tokens = 0
+        self.summary_tokens = 0
+        self.summary_bytes = 0
+        self._message_tokens: deque = deque()
+        self._summary_lines: deque = deque()
+
+    def _fold(self, messages: List[StoredMessage], end: int) -> List[StoredMessage]:
+        token_target = int(self.token_budget * FOLD_WATERMARK)
+        count_target = int(self.max_messages * FOLD_WATERMARK)
+        count = 0
+        while count < end and (self.window_tokens > token_target or end - count > count_target):
+            item = messages[count]
+            line = summarize_message(item.role, item.content)
+            self._summary_lines.append(line)
+            self.summary_tokens += estimate_tokens(line)
+            self.summary_bytes += sys.getsizeof(line)
+            self.window_tokens -= self._message_tokens.popleft()
+            count += 1
+
+        while self.summary_tokens > self.summary_budget and len(self._summary_lines) > 1:
+            line = self._summary_lines.popleft()
+            self.summary_tokens -= estimate_tokens(line)
+            self.summary_bytes -= sys.getsizeof(line)
+
+        folded = messages[:count]
+        del messages[:count]
+        self.seen -= count
+        return folded
+
+    def update(self, messages: List[StoredMessage], end: int) -> Tuple[List[StoredMessage], List[StoredMessage]]:
+        """Return the history to send for messages[:end] and the messages folded away.
+
+        Folded messages are removed from messages in place; the summary
+        stands in for them from now on.
+        """
+        for item in messages[self.seen:end]:
+            tokens = estimate_tokens(item.content)
+            self._message_tokens.append(tokens)
+            self.window_tokens += tokens
+        self.seen = max(self.seen, end)
+
+        folded = []
+        if self.window_tokens > self.token_budget or end > self.max_messages:
+            folded = self._fold(messages, end)
+            end -= len(folded)
+
+        history = []
+        if self._summary_lines:
+            timestamp = messages[0].timestamp if messages else 0.0
+            history.append(StoredMessage("user", SUMMARY_INTRO + "\n" + "\n".join(self._summary_lines), timestamp))
+            history.append(StoredMessage("assistant", SUMMARY_ACK, timestamp))
+        history.extend(messages[:end])
+        return history, folded
+
+    def usage(self) -> Dict[str, int]:
+        """Token counts of the history that the last update() produced"""
+        return {
+            "history_tokens": self.window_tokens + self.summary_tokens,
+            "summary_tokens": self.summary_tokens,
+            "history_messages": self.seen
+        }
@@ -0,0 +1,53 @@
+﻿import json
+import logging
+import random
+import sys
+from typing import Any
+
+from app.core.config import LOG_LEVEL, LOG_SAMPLE_RATE
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, event name and the event's fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+_root = logging.getLogger("aime")
+if not _root.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(JsonFormatter())
+    _root.addHandler(_handler)
+    _root.setLevel(LOG_LEVEL)
+    _root.propagate = False
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the app's JSON-lines handler"""
+    return _root.getChild(name)
+
+def log_event(logger: logging.Logger, event: str, level: int = logging.INFO, sample: float = 1.0, **fields: Any) -> None:
+    """Log a structured event.
+
+    With sample < 1 only that share of calls is logged, and the entry
+    carries the rate so counts can be scaled back up. Nothing is formatted
+    when the level is disabled or the call is sampled out.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if sample < 1.0:
+        if random.random() >= sample:
+            return
+        fields["sample_rate"] = sample
+    logger.log(level, event, extra={"fields": fields})
+
+def log_turn(logger: logging.Logger, event: str, **fields: Any) -> None:
+    """Per-turn event, sampled at LOG_SAMPLE_RATE"""
+    log_event(logger, event, sample=LOG_SAMPLE_RATE, **fields)
@@ -0,0 +1,130 @@
+﻿import asyncio
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Dict, NamedTuple, Sequence, Tuple
+
+from jinja2 import Environment
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.core.assets import choose_encoding, compress_variants
+from app.core.config import TEMPLATE_RELOAD_SECONDS
+
+# Pages may change with any deploy or template edit, so browsers revalidate (cheaply, by ETag)
+CACHE_CONTROL = "no-cache"
+
+class RenderedPage(NamedTuple):
+    """A rendered template with its precompressed variants"""
+    etag: str
+    bodies: Dict[str, bytes]
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate in ("*", etag):
+            return True
+    return False
+
+class PageStore:
+    """Template pages rendered ahead of time and served from memory.
+
+    The pages take no per-request context, so each is rendered once, along
+    with its gzip/br variants and a strong ETag per variant. load() renders
+    them all and raises on a broken template, so calling it from the app
+    lifespan fails startup.
+    The template directory is checked at most once every reload_interval
+    seconds, on a worker thread when called from the event loop, so a
+    request never waits for the directory walk or a re-render; it gets
+    the current pages. After an edit the pages are rendered again and
+    swapped in together, and a broken edit keeps the previous pages.
+    """
+
+    def __init__(self, env: Environment, directory: str, templates: Sequence[str],
+                 reload_interval: float = TEMPLATE_RELOAD_SECONDS, **context: Any):
+        self.env = env
+        self.directory = directory
+        self.templates = tuple(templates)
+        self.reload_interval = reload_interval
+        self.context = context
+        self._reload_lock = threading.Lock()
+        self._signature: Tuple[Tuple[str, int, int], ...] = ()
+        self._next_check = 0.0
+        self._pages: Dict[str, RenderedPage] = {}
+
+    def load(self) -> None:
+        """Render every page; errors propagate"""
+        with self._reload_lock:
+            signature = self._directory_signature()
+            self._pages = self._render_all()
+            self._signature = signature
+            self._next_check = time.monotonic() + self.reload_interval
+
+    def _directory_signature(self) -> Tuple[Tuple[str, int, int], ...]:
+        signature = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                stat = os.stat(os.path.join(root, name))
+                signature.append((os.path.join(root, name), stat.st_mtime_ns, stat.st_size))
+        return tuple(sorted(signature))
+
+    def _render(self, name: str) -> RenderedPage:
+        body = self.env.get_template(name).render(**self.context).encode("utf-8")
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        return RenderedPage(etag=digest, bodies={"identity": body, **compress_variants(body)})
+
+    def _render_all(self) -> Dict[str, RenderedPage]:
+        return {name: self._render(name) for name in self.templates}
+
+    def reload(self, force: bool = False) -> bool:
+        """Render all pages again if any file in the template directory changed (or always with force)"""
+        with self._reload_lock:
+            signature = None
+            try:
+                signature = self._directory_signature()
+                if signature == self._signature and not force:
+                    return True
+                pages = self._render_all()
+            except Exception as e:
+                # Keep serving the previous pages, and don't retry until the templates change again
+                print(f"Error rendering templates: {str(e)}")
+                self._signature = signature
+                return False
+            print(f"Rendered {len(pages)} template pages")
+            self._pages = pages
+            self._signature = signature
+            return True
+
+    def get(self, name: str) -> RenderedPage:
+        """The rendered page, starting a check of the templates for changes when due"""
+        if not self._pages:
+            self.load()
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.reload_interval
+            self._check_in_background()
+        return self._pages[name]
+
+    def _check_in_background(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Not on the event loop; the caller may block
+            self.reload()
+            return
+        loop.run_in_executor(None, self.reload)
+
+    def response(self, name: str, request: Request) -> Response:
+        """The page in the best encoding the client accepts, or 304 when its ETag matches"""
+        page = self.get(name)
+        encoding = choose_encoding(page.bodies, request.headers)
+        etag = f'"{page.etag}"' if encoding == "identity" else f'"{page.etag}-{encoding}"'
+        headers = {"etag": etag, "cache-control": CACHE_CONTROL, "vary": "Accept-Encoding"}
+        if _etag_matches(request.headers.get("if-none-match", ""), etag):
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["content-encoding"] = encoding
+        return Response(page.bodies[encoding], media_type="text/html", headers=headers)
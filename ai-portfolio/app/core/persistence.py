@@ -0,0 +1,120 @@
+﻿import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import PERSIST_BATCH_SIZE, PERSIST_FLUSH_SECONDS, PERSIST_QUEUE_SIZE
+from app.core.topics import TopicExtractor
+
+_STOP = object()
+
+class MessageWriter:
+    """Write-behind persistence of chat messages.
+
+    The request path only enqueues (never touches disk). A background thread
+    drains the queue and writes everything that arrived within
+    flush_interval seconds, up to batch_size rows, in a single transaction.
+    close() flushes what is left and stops the thread. With a topic
+    extractor, the topics of each batch's user messages are tagged onto
+    their conversations in the same transaction.
+    """
+
+    def __init__(self, flush_interval: float = PERSIST_FLUSH_SECONDS, batch_size: int = PERSIST_BATCH_SIZE,
+                 max_queue: int = PERSIST_QUEUE_SIZE, topics: Optional[TopicExtractor] = None):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.topics = topics
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.tagged = 0
+
+    def start(self) -> None:
+        """Start the background writer thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="message-writer", daemon=True)
+            self._thread.start()
+
+    def enqueue(self, session_id: str, role: str, content: str, timestamp: float) -> None:
+        """Queue a message for the next batch; drops it if the queue is full"""
+        try:
+            self._queue.put_nowait((session_id, role, content, timestamp))
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Flush pending messages and stop the writer"""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._write(batch)
+            if stop:
+                return
+
+    def _batch_topics(self, batch: List[Tuple[str, str, str, float]]) -> Dict[str, set]:
+        user_rows = [(session_id, content) for session_id, role, content, _ in batch if role == "user"]
+        found = self.topics.extract_batch(content for _, content in user_rows)
+        topics: Dict[str, set] = {}
+        for (session_id, _), names in zip(user_rows, found):
+            if names:
+                topics.setdefault(session_id, set()).update(names)
+        return topics
+
+    def _write(self, batch: List[Tuple[str, str, str, float]]) -> None:
+        # Imported on first use: SQLAlchemy is loaded by the startup warm-up, not at import
+        from app.core.database import append_session_messages
+        try:
+            topics = self._batch_topics(batch) if self.topics else None
+            self.written += append_session_messages(
+                ((session_id, role, content, datetime.utcfromtimestamp(timestamp))
+                 for session_id, role, content, timestamp in batch),
+                topics
+            )
+            self.batches += 1
+            if topics:
+                self.tagged += len(topics)
+        except Exception as e:
+            self.failed += len(batch)
+            print(f"Error persisting {len(batch)} messages: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and write counters"""
+        return {
+            "queued": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "batches": self.batches,
+            "topic_tagged_conversations": self.tagged
+        }
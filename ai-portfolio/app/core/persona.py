@@ -0,0 +1,126 @@
+﻿import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+from app.core.config import PERSONAL_DATA_PATH, PERSONA_RELOAD_SECONDS, DEBUG_PROMPT_PATH
+from app.core.history import estimate_tokens
+
+# Used when personal_data.json is missing or unreadable at startup
+DEFAULT_PERSONAL_DATA = {
+    "basics": {
+        "name": "Portfolio Owner",
+        "title": "Software Developer",
+        "summary": "A passionate developer with experience in multiple technologies."
+    },
+    "skills": [],
+    "projects": [],
+    "experience": [],
+    "education": [],
+    "faq": []
+}
+
+class PersonaSnapshot(NamedTuple):
+    """One immutable version of the persona data and its compiled prompt"""
+    version: str
+    data: Dict[str, Any]
+    prompt: str
+    prompt_tokens: int
+    index: Optional[Any] = None
+
+class PersonaStore:
+    """Serve the compiled persona, recompiling only when the data file changes.
+
+    Each version is keyed by the SHA-256 of the file content. Readers always
+    get a complete snapshot: a new one is built on the side and swapped in with
+    a single reference assignment. The file is stat-ed at most once every
+    reload_interval seconds, so the request path does no file I/O otherwise.
+    With preload=False nothing is read until load() or the first current().
+    """
+
+    def __init__(self, compile_prompt: Callable[[Dict[str, Any]], str], path: str = PERSONAL_DATA_PATH,
+                 reload_interval: float = PERSONA_RELOAD_SECONDS, debug_prompt_path: Optional[str] = DEBUG_PROMPT_PATH,
+                 build_index: Optional[Callable[[Dict[str, Any]], Any]] = None, preload: bool = True):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.debug_prompt_path = debug_prompt_path
+        self._compile_prompt = compile_prompt
+        self._build_index = build_index
+        self._reload_lock = threading.Lock()
+        self._file_signature: Optional[Tuple[int, int]] = None
+        self._next_check = 0.0
+        self._snapshot: Optional[PersonaSnapshot] = None
+
+        if preload:
+            self.load()
+
+    def load(self) -> PersonaSnapshot:
+        """Read and compile the data file, falling back to placeholder data if it is unusable"""
+        if not self.reload() and self._snapshot is None:
+            print("Using fallback personal data")
+            self._snapshot = self._compile(DEFAULT_PERSONAL_DATA, self._hash(json.dumps(DEFAULT_PERSONAL_DATA).encode("utf-8")))
+        self._next_check = time.monotonic() + self.reload_interval
+        return self._snapshot
+
+    @staticmethod
+    def _hash(content: bytes) -> str:
+        return hashlib.sha256(content).hexdigest()[:16]
+
+    def _compile(self, data: Dict[str, Any], version: str) -> PersonaSnapshot:
+        prompt = self._compile_prompt(data)
+
+        # Debug - save the prompt to a file for inspection (opt-in)
+        if self.debug_prompt_path:
+            with open(self.debug_prompt_path, 'w', encoding='utf-8') as f:
+                f.write(prompt)
+
+        index = self._build_index(data) if self._build_index else None
+        return PersonaSnapshot(version=version, data=data, prompt=prompt, prompt_tokens=estimate_tokens(prompt), index=index)
+
+    def reload(self) -> bool:
+        """Re-read the data file and swap in a new snapshot if its content changed"""
+        with self._reload_lock:
+            signature = None
+            try:
+                stat = os.stat(self.path)
+                signature = (stat.st_mtime_ns, stat.st_size)
+                if signature == self._file_signature:
+                    return True
+
+                with open(self.path, 'rb') as f:
+                    content = f.read()
+                version = self._hash(content)
+                if self._snapshot is not None and self._snapshot.version == version:
+                    self._file_signature = signature
+                    return True
+
+                data = json.loads(content.decode('utf-8'))
+                snapshot = self._compile(data, version)
+            except Exception as e:
+                # Keep serving the previous version if the new file is broken,
+                # and don't retry it until it changes again
+                print(f"Error loading personal data: {str(e)}")
+                self._file_signature = signature
+                return False
+
+            # Verify name is loaded correctly
+            name = data.get("basics", {}).get("name", "")
+            print(f"Loaded personal data for: {name} (version {version})")
+            if name == "Your Name":
+                print("WARNING: Using placeholder name 'Your Name'. Please update your personal_data.json")
+
+            self._snapshot = snapshot
+            self._file_signature = signature
+            return True
+
+    def current(self) -> PersonaSnapshot:
+        """Return the current snapshot, checking the file for changes when due"""
+        if self._snapshot is None:
+            return self.load()
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.reload_interval
+            self.reload()
+        return self._snapshot
@@ -0,0 +1,213 @@
+﻿import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+try:
+    from google.api_core import exceptions as google_exceptions
+except ImportError:
+    # Without the Google client only timeouts and connection errors count as transient
+    google_exceptions = None
+
+from app.core.config import (GEMINI_TIMEOUT_SECONDS, GEMINI_DEADLINE_SECONDS, GEMINI_RETRY_ATTEMPTS,
+                             GEMINI_RETRY_BASE_SECONDS, GEMINI_RETRY_MAX_SECONDS,
+                             CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS)
+from app.core.logs import get_logger, log_event
+
+logger = get_logger("resilience")
+
+T = TypeVar("T")
+
+class UpstreamUnavailable(Exception):
+    """The upstream call timed out or kept failing, or the breaker refused it"""
+
+class CircuitOpen(UpstreamUnavailable):
+    """Refused without calling upstream because the circuit breaker is open"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"circuit open, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+def is_transient(error: BaseException) -> bool:
+    """Whether a failed call is worth retrying and says something about upstream health"""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    if google_exceptions is None:
+        return False
+    if isinstance(error, google_exceptions.MethodNotImplemented):
+        return False
+    return isinstance(error, (google_exceptions.ServerError, google_exceptions.TooManyRequests,
+                              google_exceptions.RetryError))
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    Closed: calls pass. After failure_threshold failed calls in a row
+    it opens and refuses every call for reset_timeout seconds. Then it is
+    half-open and lets a single probe through: a success closes it, a
+    failure opens it again. Used from the event loop only.
+    """
+
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_timeout: float = CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_started: Optional[float] = None
+        self.opened = 0
+        self.short_circuited = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def is_open(self) -> bool:
+        """Whether a call made now would be refused (without counting it)"""
+        state = self.state
+        if state == "open":
+            return True
+        # A probe that never reported back stops blocking after reset_timeout
+        return state == "half_open" and self._probe_started is not None and \
+            time.monotonic() - self._probe_started < self.reset_timeout
+
+    def short_circuit(self) -> bool:
+        """is_open(), counting a True answer as a call refused without trying upstream"""
+        if self.is_open():
+            self.short_circuited += 1
+            return True
+        return False
+
+    def before_call(self) -> None:
+        """Let a call through or raise CircuitOpen; in half-open state the call becomes the probe"""
+        if self.short_circuit():
+            raise CircuitOpen(self.retry_after())
+        if self.opened_at is not None:
+            self._probe_started = time.monotonic()
+
+    def retry_after(self) -> float:
+        """Seconds until the next probe is allowed"""
+        if self.opened_at is None:
+            return 0.0
+        since = self._probe_started if self.state == "half_open" and self._probe_started else self.opened_at
+        return max(0.0, self.reset_timeout - (time.monotonic() - since))
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            log_event(logger, "circuit_closed")
+        self.failures = 0
+        self.opened_at = None
+        self._probe_started = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        probe_failed = self.opened_at is not None
+        if probe_failed or self.failures >= self.failure_threshold:
+            if not probe_failed:
+                self.opened += 1
+                log_event(logger, "circuit_opened", logging.WARNING, failures=self.failures, reset_seconds=self.reset_timeout)
+            self.opened_at = time.monotonic()
+            self._probe_started = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "opened": self.opened,
+            "short_circuited": self.short_circuited,
+            "retry_after": round(self.retry_after(), 1)
+        }
+
+class RetryPolicy:
+    """Deadlines, jittered retries and a circuit breaker around an upstream call.
+
+    Every attempt gets at most timeout seconds and all attempts together at
+    most deadline seconds. Transient failures (timeouts, connection errors,
+    5xx and 429 from Google) are retried up to attempts times in total with
+    full-jitter exponential backoff; any other error is raised as is.
+    Giving up counts as one breaker failure and raises UpstreamUnavailable.
+    """
+
+    def __init__(self, breaker: Optional[CircuitBreaker] = None, attempts: int = GEMINI_RETRY_ATTEMPTS,
+                 timeout: float = GEMINI_TIMEOUT_SECONDS, deadline: float = GEMINI_DEADLINE_SECONDS,
+                 base_delay: float = GEMINI_RETRY_BASE_SECONDS, max_delay: float = GEMINI_RETRY_MAX_SECONDS):
+        self.breaker = breaker or CircuitBreaker()
+        self.attempts = max(attempts, 1)
+        self.timeout = timeout
+        self.deadline = deadline
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.calls = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.gave_up = 0
+
+    def begin(self) -> float:
+        """Start a call (raises CircuitOpen when refused); returns its start time"""
+        self.breaker.before_call()
+        self.calls += 1
+        return time.monotonic()
+
+    def attempt_timeout(self, started: float) -> float:
+        """Time allowed for the next attempt of a call started at started"""
+        return max(min(self.timeout, self.deadline - (time.monotonic() - started)), 0.0)
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter delay before retry number attempt (1-based)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def succeeded(self) -> None:
+        self.breaker.record_success()
+
+    def failed(self, error: Exception, attempt: int, started: float, retry: bool = True) -> float:
+        """Record a failed attempt; returns the delay before the next one or raises.
+
+        retry=False records the failure and gives up, for calls that have
+        already produced output.
+        """
+        if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+            self.timeouts += 1
+        if not is_transient(error):
+            # Upstream did answer; the error is about this request
+            self.breaker.record_success()
+            raise error
+
+        # A half-open probe is not retried, and the breaker counts calls rather
+        # than attempts, so a flaky upstream that retries fix does not trip it
+        delay = self.backoff(attempt)
+        probing = self.breaker.opened_at is not None
+        if not retry or probing or attempt >= self.attempts or self.breaker.is_open() or \
+                self.attempt_timeout(started) <= delay:
+            self.gave_up += 1
+            self.breaker.record_failure()
+            raise UpstreamUnavailable(f"upstream failed after {attempt} attempt(s): {error!r}") from error
+        self.retries += 1
+        return delay
+
+    async def call(self, attempt: Callable[[float], Awaitable[T]]) -> T:
+        """Run attempt(timeout) under the policy and return its result"""
+        started = self.begin()
+        number = 0
+        while True:
+            number += 1
+            timeout = self.attempt_timeout(started)
+            try:
+                result = await asyncio.wait_for(attempt(timeout), timeout)
+            except Exception as e:
+                await asyncio.sleep(self.failed(e, number, started))
+                continue
+            self.succeeded()
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "gave_up": self.gave_up,
+            "breaker": self.breaker.stats()
+        }
@@ -0,0 +1,104 @@
+﻿from typing import Any, Dict, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    # NumPy is optional; without it every prompt carries the full persona
+    np = None
+
+RETRIEVAL_AVAILABLE = np is not None
+
+from app.core.answer_cache import normalize_question
+from app.core.config import RETRIEVAL_TOP_K
+
+# Section headings as they appear in the prompt
+SECTION_TITLES = {
+    "skills": "Tvé dovednosti",
+    "projects": "Tvé projekty",
+    "experience": "Tvé pracovní zkušenosti",
+    "education": "Tvé vzdělání",
+    "faq": "Často kladené otázky o tobě",
+}
+
+# Czech and English words visitors use for each kind of section; the data
+# itself is English, so these let "kde jsi studoval" find the degrees
+SECTION_KEYWORDS = {
+    "skills": "skills skill technologies tech stack umis dovednosti znalosti technologie programujes jazyky",
+    "projects": "projects project portfolio built created projekty projekt vytvoril delal aplikace",
+    "experience": "experience work job career company position zkusenosti prace pracoval firma pozice kariera",
+    "education": "education study studied university degree school vzdelani studoval studium univerzita skola titul",
+    "faq": "",
+}
+
+# Word prefixes stand in for stems so "projekty"/"projektech"/"project" meet
+STEM_LENGTH = 5
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+def persona_sections(personal_data: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """One (kind, prompt text) entry per skill, project, job, degree and FAQ item"""
+    sections = []
+    for skill in personal_data.get("skills", []):
+        keywords = ", ".join(skill.get("keywords", []))
+        sections.append(("skills", f"- {skill.get('name', '')} ({skill.get('level', '')}): {keywords}"))
+    for project in personal_data.get("projects", []):
+        techs = ", ".join(project.get("technologies", []))
+        sections.append(("projects", f"- {project.get('name', '')}: {project.get('description', '')}. Technologies: {techs}"))
+    for exp in personal_data.get("experience", []):
+        sections.append(("experience", f"- {exp.get('position', '')} at {exp.get('company', '')} ({exp.get('startDate', '')} to {exp.get('endDate', '')}): {exp.get('summary', '')}"))
+    for edu in personal_data.get("education", []):
+        sections.append(("education", f"- {edu.get('studyType', '')} in {edu.get('area', '')} from {edu.get('institution', '')} ({edu.get('startDate', '')} to {edu.get('endDate', '')})"))
+    for faq in personal_data.get("faq", []):
+        sections.append(("faq", f"Q: {faq.get('question', '')}\nA: {faq.get('answer', '')}\n"))
+    return sections
+
+def tokenize(text: str) -> List[str]:
+    """Normalized word prefixes used as index terms"""
+    return [word[:STEM_LENGTH] for word in normalize_question(text).split() if len(word) > 1]
+
+class RetrievalIndex:
+    """BM25 index over the persona sections, scored with one NumPy gather.
+
+    The BM25 weight of every (section, term) pair is precomputed into a dense
+    matrix, so a query costs one column gather and a row sum.
+    """
+
+    def __init__(self, sections: List[Tuple[str, str]]):
+        self.sections = sections
+        self.vocabulary: Dict[str, int] = {}
+        documents = []
+        for kind, text in sections:
+            terms = tokenize(text + " " + SECTION_KEYWORDS.get(kind, ""))
+            documents.append([self.vocabulary.setdefault(term, len(self.vocabulary)) for term in terms])
+
+        tf = np.zeros((len(documents), max(len(self.vocabulary), 1)), dtype=np.float32)
+        for row, term_ids in enumerate(documents):
+            np.add.at(tf[row], term_ids, 1.0)
+
+        lengths = tf.sum(axis=1, keepdims=True)
+        average = float(lengths.mean()) if len(documents) else 0.0
+        df = (tf > 0).sum(axis=0)
+        idf = np.log(1.0 + (len(documents) - df + 0.5) / (df + 0.5)).astype(np.float32)
+        norm = BM25_K1 * (1.0 - BM25_B + BM25_B * lengths / max(average, 1e-9))
+        self.weights = idf * tf * (BM25_K1 + 1.0) / (tf + norm)
+
+    def search(self, query: str, k: int = RETRIEVAL_TOP_K) -> List[int]:
+        """Indexes of the k best-matching sections (only those with a positive score)"""
+        term_ids = [self.vocabulary[term] for term in tokenize(query) if term in self.vocabulary]
+        if not term_ids or not self.sections:
+            return []
+        scores = self.weights[:, term_ids].sum(axis=1)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [int(i) for i in top if scores[i] > 0]
+
+    def context(self, query: str, k: int = RETRIEVAL_TOP_K) -> str:
+        """Prompt text of the top-k sections, grouped under their headings in index order"""
+        hits = sorted(self.search(query, k))
+        blocks: Dict[str, List[str]] = {}
+        for i in hits:
+            kind, text = self.sections[i]
+            blocks.setdefault(kind, []).append(text)
+        return "\n\n".join(f"{SECTION_TITLES[kind]}:\n" + "\n".join(lines) for kind, lines in blocks.items())
@@ -0,0 +1,386 @@
+﻿import os
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+# Czech case -> first-person pronoun standing in for the persona's name
+CASE_PRONOUNS = {
+    "nominative": "já",
+    "genitive": "mě",
+    "dative": "mně",
+    "instrumental": "mnou",
+}
+
+# Words describing the bot rather than the person: each case form of
+# "portfolio" maps to the same case of "profil", the rest is dropped
+WORD_REPLACEMENTS: List[Tuple[str, str]] = [
+    ("portfolio", "profil"),
+    ("portfolia", "profilu"),
+    ("portfoliu", "profilu"),
+    ("portfoliem", "profilem"),
+]
+WORD_REMOVALS: List[str] = [
+    r"AI asistent(?:a|ovi|em|u)?",
+    r"asistent(?:a|ovi|em|u)?",
+    r"digitální reprezentac[eií]",
+]
+# The same words with the preposition governing them, removed together
+# ("s asistentem"); each preposition only goes with the case it takes
+GOVERNED_REMOVALS: List[str] = [
+    r"(?:[sS]e?|[zZ]a|[pP]řed)\s+(?:(?:AI\s+)?asistentem|digitální\s+reprezentací)",
+    r"(?:[kK]e?|[oO]|[vV]e?|[nN]a|[pP]o|[pP]ři|[dD]íky|[kK]vůli)\s+(?:(?:AI\s+)?asistent(?:ovi|u)|digitální\s+reprezentaci)",
+    r"(?:[bB]ez|[oO]d|[dD]o|[uU]|[zZ]e?|[pP]ro)\s+(?:(?:AI\s+)?asistenta|digitální\s+reprezentace)",
+    r"[jJ]ako\s+(?:(?:AI\s+)?asistent|digitální\s+reprezentace)",
+]
+# "portfolio" is neuter and "profil" masculine: a predicate adjective after the
+# nominative takes the masculine ending too ("portfolio je skvělé" -> "profil je skvělý")
+GENDER_SWAPS = {"portfolio"}
+PREDICATE = r"\s+(?:(?:ne)?(?:je|bude|bylo)|není)\s+[^\W\d_]{1,20}é"
+_AGREEMENT = re.compile(PREDICATE + "$")
+# Bot words followed by the persona's name in the genitive ("AI asistent Jana Nováka"):
+# the nominative phrase becomes the name itself ("Jsem Jan Novák"), other cases the
+# pronoun of their case (None stands for the name)
+OWNER_WORDS: List[Tuple[str, Optional[str]]] = [
+    (r"(?:AI\s+)?asistent|digitální\s+reprezentace", None),
+    (r"(?:AI\s+)?asistenta", "mě"),
+    (r"(?:AI\s+)?asistent(?:ovi|u)|digitální\s+reprezentaci", "mně"),
+    (r"(?:AI\s+)?asistentem|digitální\s+reprezentací", "mnou"),
+]
+# Nouns followed by the persona's name in the genitive ("portfolio Jana Nováka"):
+# the phrase becomes the noun with a possessive ("můj profil"), "portfolio"
+# swapped for "profil" in the same case as in WORD_REPLACEMENTS
+OWNED_NOUNS: List[Tuple[str, str]] = [
+    ("portfolio", "můj profil"),
+    ("portfolia", "mého profilu"),
+    ("portfoliu", "mému profilu"),
+    ("portfoliem", "mým profilem"),
+    ("profil", "můj profil"),
+    ("projekt", "můj projekt"),
+    ("projekty", "moje projekty"),
+    ("web", "můj web"),
+    ("životopis", "můj životopis"),
+    ("zkušenosti", "moje zkušenosti"),
+    ("dovednosti", "moje dovednosti"),
+]
+# After these prepositions "portfoliu" is locative, not dative ("v mém profilu")
+LOCATIVE_PREPOSITIONS = {"v", "ve", "na", "o", "po", "při"}
+LOCATIVE_POSSESSIVES = {"mému": "mém"}
+# Folded, lowercase cores of the word rules above; a reply containing none of
+# them (nor a form of the name) has nothing to rewrite
+WORD_TRIGGERS = ("portfoli", "asistent", "reprezentac")
+
+# Third-person verbs after the name whose first person doesn't follow the endings in first_person()
+IRREGULAR_VERBS = {
+    "je": "jsem", "není": "nejsem", "bude": "budu", "nebude": "nebudu", "může": "můžu", "nemůže": "nemůžu",
+    "chce": "chci", "nechce": "nechci", "jde": "jdu", "píše": "píšu",
+}
+_PARTICIPLE = re.compile(r"[aeiouyáéěíóúůý]la?$")
+
+# Spans never rewritten: fenced and inline code, URLs, e-mail addresses and
+# host or path shaped tokens ("github.com/jannovak/portfolio-app")
+PROTECTED = (r"```.*?```|`[^`\n]*`|(?:https?://|www\.)\S+|[\w.+-]+@[\w-]+\.[\w.-]+"
+             r"|(?<![\w.@/-])[\w-]+(?:\.[\w-]+)+(?:/\S*)?")
+# An opened but not yet closed code span, only relevant mid-stream
+UNCLOSED = r"```|`"
+# First characters of the patterns above
+STATIC_STARTS = "`hw"
+# Rules match whole words only, never inside a token such as "ai-portfolio",
+# "jan/asistent", "?q=portfolio" or "portfolio.example.com": a match starts
+# after whitespace or opening punctuation and ends before anything but a
+# word character, @, /, - or a dot inside a host
+BEFORE = "(?<![^\\s\"'„“‚‘(\\[{<*_~–—])"
+AFTER = r"(?![\w@/-]|\.\w)"
+
+_LOOSE = {
+    "a": "aá", "c": "cč", "d": "dď", "e": "eéě", "i": "ií", "n": "nň", "o": "oó",
+    "r": "rř", "s": "sš", "t": "tť", "u": "uúů", "y": "yý", "z": "zž",
+}
+_SENTENCE_END = ".!?\n"
+# A text containing none of these can be emitted mid-stream without a scan: no
+# protected span may be open that later text would fall inside (URLs, e-mails
+# and hosts contain no whitespace, and the stream never cuts inside a token)
+_STREAM_GUARDS = ("`",)
+
+def fold(text: str) -> str:
+    """Strip diacritics"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+def ascii_fold(text: str) -> str:
+    """Lowercase ASCII skeleton of text (diacritics and other non-ASCII dropped), computed in C"""
+    return unicodedata.normalize("NFD", text).encode("ascii", "ignore").decode("ascii").lower()
+
+def loose_pattern(word: str) -> str:
+    """Regex matching a folded word with or without Czech diacritics"""
+    out = []
+    for ch in word:
+        variants = _LOOSE.get(ch.lower())
+        if variants is None:
+            out.append(re.escape(ch))
+        else:
+            if ch.isupper():
+                variants = variants.upper()
+            out.append(f"[{variants}]")
+    return "".join(out)
+
+def decline(word: str, feminine: bool) -> Dict[str, List[str]]:
+    """Singular case forms of a Czech name (folded), per case in CASE_PRONOUNS"""
+    if word.endswith("y"):
+        # Adjectival surname: Novy -> Noveho, Novemu, Novym
+        stem = word[:-1]
+        return {"nominative": [word], "genitive": [stem + "eho"], "dative": [stem + "emu"], "instrumental": [stem + "ym"]}
+    if word.endswith("a") and feminine:
+        stem = word[:-1]
+        # Adjectival -ova/-a surnames take -e in both cases, names like Jana take -y/-e
+        genitive = stem + ("e" if word.endswith("ova") else "y")
+        return {"nominative": [word], "genitive": [genitive, stem + "e"], "dative": [stem + "e"], "instrumental": [stem + "ou"]}
+    if word.endswith("a"):
+        stem = word[:-1]
+        return {"nominative": [word], "genitive": [stem + "y"], "dative": [stem + "ovi"], "instrumental": [stem + "ou"]}
+    if feminine or word[-1:] in "eiou":
+        return {case: [word] for case in CASE_PRONOUNS}
+    # Fleeting e: Marek -> Marka
+    stem = word[:-2] + word[-1] if word.endswith("ek") and len(word) > 3 else word
+    return {"nominative": [word], "genitive": [stem + "a"], "dative": [stem + "ovi", stem + "u"], "instrumental": [stem + "em"]}
+
+def word_pattern(word: str) -> str:
+    """Regex matching a word with or without diacritics, capitalized or not"""
+    return f"[{word[0]}{word[0].upper()}]" + loose_pattern(fold(word[1:]))
+
+def name_patterns(name: str) -> Dict[str, str]:
+    """Pattern matching every case form of the full name, per case in CASE_PRONOUNS"""
+    words = fold(name).split()
+    if not words:
+        return {}
+    feminine = words[0].endswith("a")
+    forms = [decline(word, feminine) for word in words]
+    patterns = {}
+    for case in CASE_PRONOUNS:
+        # Any declined form of each word, e.g. "Janu Novakovi" and "Janovi Novakovi"
+        parts = ["(?:" + "|".join(loose_pattern(f) for f in word_forms[case]) + ")" for word_forms in forms]
+        patterns[case] = r"\s+".join(parts)
+    return patterns
+
+def name_trigger(name: str) -> str:
+    """Folded, lowercase prefix shared by every case form of the name's first word"""
+    words = fold(name).split()
+    if not words:
+        return ""
+    forms = decline(words[0], words[0].endswith("a"))
+    return os.path.commonprefix([ascii_fold(form) for case_forms in forms.values() for form in case_forms])
+
+def first_person(verb: str) -> Optional[str]:
+    """First-person singular of a third-person verb following the name, or None when unknown.
+    
+    Past participles take the auxiliary: "pracoval" -> "jsem pracoval".
+    """
+    lower = verb.lower()
+    if lower in IRREGULAR_VERBS:
+        return IRREGULAR_VERBS[lower]
+    if lower.endswith("uje"):
+        return verb[:-1] + "i"
+    if lower.endswith(("á", "í")):
+        return verb + "m"
+    if _PARTICIPLE.search(lower):
+        return "jsem " + verb
+    return None
+
+def masculine(predicate: str) -> str:
+    """Predicate of a neuter subject agreed with a masculine one ("bylo skvělé" -> "byl skvělý")"""
+    words = predicate.split()
+    verb = words[0][:-1] if words[0].endswith("bylo") else words[0]
+    return predicate[:predicate.index(words[0])] + f"{verb} {words[-1][:-1]}ý"
+
+class RewriteRules:
+    """Persona rewrite rules compiled into a single regex.
+
+    One scan handles everything: protected spans (code, URLs, e-mails,
+    hosts and paths) are matched first and copied through, name forms
+    become the pronoun of their case (capitalized at a sentence start),
+    a noun owned by the name takes a possessive ("Portfolio Jana Nováka"
+    -> "Můj profil"), and bot words are swapped or removed, with their
+    preposition, on whole-word boundaries only. The name as a subject is
+    only rewritten together with its verb ("Jan Novák má" -> "Já mám",
+    "Jan Novák se věnuje" -> "Já se věnuji"); with no verb it can agree,
+    or none at all, it is kept. Replies that contain no trigger word are
+    returned without a scan.
+    """
+
+    def __init__(self, name: str):
+        self.name = " ".join(name.split())
+        self._name_words = len(self.name.split())
+        alternatives = [f"(?P<protected>{PROTECTED})", f"(?P<unclosed>{UNCLOSED})"]
+        # Rule group -> (kind, replacement): "pronoun", "subject", "owner", "possessive" or "word"
+        self._rules: Dict[str, Tuple[str, Optional[str]]] = {}
+        patterns = name_patterns(name)
+        rules: List[Tuple[str, str, Optional[str]]] = []
+        if patterns:
+            rules += [("owner", f"(?:{words})\\s+(?:{patterns['genitive']})", new) for words, new in OWNER_WORDS]
+            # One alternative for all nouns (the replacement is looked up by noun) keeps the scan fast
+            nouns = "|".join(word_pattern(noun) for noun, _ in OWNED_NOUNS)
+            rules.append(("possessive", f"(?:{nouns})\\s+(?:{patterns['genitive']})(?:{PREDICATE})?", None))
+            # The vocalized prepositions go with the pronouns: "s Janem" -> "se mnou", "k Janovi" -> "ke mně"
+            rules += [("pronoun", r"[sS]\s+(?:" + patterns["instrumental"] + ")", "se mnou"),
+                      ("pronoun", r"[kK]\s+(?:" + patterns["dative"] + ")", "ke mně"),
+                      ("subject", patterns["nominative"] + r"\s+(?:s[ei]\s+)?[^\W\d_]+", CASE_PRONOUNS["nominative"])]
+            rules += [("pronoun", patterns[case], pronoun) for case, pronoun in CASE_PRONOUNS.items() if case != "nominative"]
+        rules += [("word", word_pattern(old) + (f"(?:{PREDICATE})?" if old in GENDER_SWAPS else ""), new)
+                  for old, new in WORD_REPLACEMENTS]
+        self._owned = {ascii_fold(noun): (noun, new) for noun, new in OWNED_NOUNS}
+        for i, (kind, pattern, replacement) in enumerate(rules):
+            self._rules[f"r{i}"] = (kind, replacement)
+            alternatives.append(f"(?P<r{i}>{BEFORE}(?:{pattern}){AFTER})")
+        self._triggers = (name_trigger(name),) + WORD_TRIGGERS
+        # A removed word takes the space and the preposition before it along
+        # (unless it starts an owner phrase); the lookahead rejects a position
+        # quickly unless a removed word follows, after at most a preposition
+        owned = f"(?!\\s+(?:{patterns['genitive']}))" if patterns else ""
+        removal_words = "|".join(sorted({pattern.split("(")[0].split()[0] for pattern in WORD_REMOVALS}))
+        alternatives.append(f"(?P<removed>(?: |{BEFORE})(?=(?:[^\\W\\d_]{{1,5}}\\s+)?(?:{removal_words}))"
+                            "(?:" + "|".join(GOVERNED_REMOVALS + WORD_REMOVALS) + f"){AFTER}{owned})")
+        # A leading lookahead on the possible first characters lets the scan
+        # skip most positions without trying every alternative. Only a
+        # backtick may start inside a token; a space qualifies in front of a
+        # removed word or its preposition, which with no space before it
+        # starts a sentence and is capitalized
+        prepositions = "bdjknopsuvz"
+        removal_starts = {pattern[0] for pattern in WORD_REMOVALS} | set(prepositions + prepositions.upper())
+        starts = set(STATIC_STARTS) | {pattern[0] for pattern in WORD_REMOVALS} | set(prepositions.upper() + "sk")
+        for word in [name] + [old for old, _ in WORD_REPLACEMENTS + OWNED_NOUNS]:
+            first = fold(word).strip()[:1].lower()
+            if first:
+                starts.update(_LOOSE.get(first, first) + _LOOSE.get(first, first).upper())
+        charset = "".join(re.escape(ch) for ch in sorted(starts))
+        spaced = "".join(re.escape(ch) for ch in sorted(removal_starts))
+        gate = f"(?=[{charset}]){BEFORE}|(?=`| [{spaced}])"
+        self.pattern = re.compile(f"(?:{gate})(?:" + "|".join(alternatives) + ")", re.DOTALL)
+
+    def replacement(self, match: "re.Match", before: str) -> str:
+        """Text that replaces a rule match, given the text preceding it"""
+        group = match.lastgroup
+        if group in ("protected", "unclosed"):
+            return match.group(0)
+        if group == "removed":
+            return ""
+        kind, new = self._rules[group]
+        text = match.group(0)
+        predicate = ""
+        if kind == "subject":
+            words = text.split()
+            verb = first_person(words[-1])
+            if verb is None:
+                return text
+            # A reflexive pronoun goes after the auxiliary: "jsem se věnoval", "se věnuji"
+            if len(words) > self._name_words + 1:
+                verb = verb.replace("jsem ", f"jsem {words[-2]} ") if verb.startswith("jsem ") else f"{words[-2]} {verb}"
+            new = f"{new} {verb}"
+        elif kind == "owner" and new is None:
+            return self.name
+        elif kind in ("possessive", "word"):
+            noun = text.split(None, 1)[0]
+            if kind == "possessive":
+                noun, new = self._owned[ascii_fold(noun)]
+                possessive, owned = new.split(" ", 1)
+                preceding = before.split()[-1:]
+                if preceding and preceding[0].lower() in LOCATIVE_PREPOSITIONS:
+                    new = f"{LOCATIVE_POSSESSIVES.get(possessive, possessive)} {owned}"
+            agreed = _AGREEMENT.search(text)
+            if agreed:
+                predicate = masculine(agreed.group(0)) if ascii_fold(noun) in GENDER_SWAPS else agreed.group(0)
+        if kind == "word":
+            upper = text[0].isupper()
+        else:
+            stripped = before.rstrip(" \t")
+            upper = not stripped or stripped[-1] in _SENTENCE_END
+        return (new[:1].upper() + new[1:] if upper else new) + predicate
+
+    def needed(self, text: str) -> bool:
+        """Whether text contains anything a rule could rewrite (a C-speed substring check)"""
+        folded = ascii_fold(text)
+        return any(trigger in folded for trigger in self._triggers)
+
+    def rewrite(self, text: str) -> str:
+        """Rewrite a complete reply"""
+        if not self.needed(text):
+            return text
+        out = []
+        pos = 0
+        for match in self.pattern.finditer(text):
+            out.append(text[pos:match.start()])
+            out.append(self.replacement(match, text[max(0, match.start() - 4):match.start()]))
+            pos = match.end()
+        out.append(text[pos:])
+        return "".join(out)
+
+    def stream(self) -> "PersonaRewriter":
+        """New incremental rewriter for one streamed reply"""
+        return PersonaRewriter(self)
+
+class PersonaRewriter:
+    """Apply RewriteRules to text that arrives in chunks.
+
+    Output is the same as rewriting the whole text at once. Text is held
+    back only while it could still change: a match touching the end of the
+    buffer (the next chunk may extend it, or break its word boundary), an
+    unclosed code span, or the last HOLDBACK characters that could start a
+    name form. HOLDBACK must exceed the longest bounded rule match
+    ("portfolio Jana Nováka nebude" and an agreed adjective); URLs, code
+    spans and the verb after the name are unbounded but are deferred whole
+    while they touch the end of the buffer. Output is never cut inside a
+    whitespace-free token, whose start decides whether it is a host or
+    path. Text with no trigger word and no code span is emitted without a
+    scan.
+    """
+
+    HOLDBACK = 56
+
+    def __init__(self, rules: RewriteRules):
+        self.rules = rules
+        self._buffer = ""
+        self._tail = ""
+
+    def _emit(self, final: bool) -> str:
+        # The emitted tail stays in front of the buffer so lookbehinds and
+        # sentence starts see the same context as in a one-shot rewrite
+        text = self._tail + self._buffer
+        start = len(self._tail)
+        limit = len(text) if final else max(len(text) - self.HOLDBACK, start)
+        if not final and not text[limit].isspace():
+            while limit > start and not text[limit - 1].isspace():
+                limit -= 1
+        if not any(guard in text for guard in _STREAM_GUARDS) and not self.rules.needed(text):
+            self._tail = text[max(0, limit - 4):limit]
+            self._buffer = text[limit:]
+            return text[start:limit]
+        out = []
+        pos = start
+        for match in self.rules.pattern.finditer(text, start):
+            if not final and (match.start() >= limit or match.end() == len(text) or self._may_close(match)):
+                limit = min(limit, match.start())
+                break
+            out.append(text[pos:match.start()])
+            out.append(self.rules.replacement(match, text[max(0, match.start() - 4):match.start()]))
+            pos = match.end()
+        if pos < limit:
+            out.append(text[pos:limit])
+            pos = limit
+        self._tail = text[max(0, pos - 4):pos]
+        self._buffer = text[pos:]
+        return "".join(out)
+
+    def _may_close(self, match: "re.Match") -> bool:
+        # Inline code cannot span lines, so a backtick with a newline after it stays literal
+        if match.lastgroup != "unclosed":
+            return False
+        return match.group(0) == "```" or "\n" not in match.string[match.end():]
+
+    def feed(self, chunk: str) -> str:
+        """Add a chunk and return the text that is safe to emit"""
+        self._buffer += chunk
+        if len(self._buffer) <= self.HOLDBACK:
+            return ""
+        return self._emit(final=False)
+
+    def flush(self) -> str:
+        """Return whatever is still held back at the end of the stream"""
+        return self._emit(final=True)
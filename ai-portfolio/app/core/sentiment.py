@@ -0,0 +1,204 @@
+﻿import math
+import string
+import unicodedata
+from itertools import repeat
+from typing import Dict, Iterable, List, NamedTuple
+
+try:
+    import numpy as np
+except ImportError:
+    # Without NumPy score_batch() falls back to scoring one text at a time
+    np = None
+
+# Valence of Czech and English words, diacritics folded. Czech forms are
+# listed per common inflection since the scorer does no stemming.
+LEXICON: Dict[str, float] = {
+    # Positive
+    "rad": 1.5, "rada": 1.5, "rado": 1.5, "radi": 1.5, "rady": 1.0, "radost": 2.0, "radosti": 2.0,
+    "skvely": 2.5, "skvela": 2.5, "skvele": 2.5, "vyborny": 2.5, "vyborna": 2.5, "vyborne": 2.5,
+    "super": 2.0, "paradni": 2.0, "uzasny": 2.5, "uzasna": 2.5, "uzasne": 2.5, "dobry": 1.5, "dobra": 1.5,
+    "dobre": 1.5, "dobrou": 1.5, "zajimavy": 1.5, "zajimava": 1.5, "zajimave": 1.5, "zajimavych": 1.5,
+    "zajimavou": 1.5, "bavi": 1.5, "bavilo": 1.5, "bavila": 1.5, "tesi": 2.0, "tesim": 2.0, "nadseny": 2.5,
+    "nadsena": 2.5, "pysny": 2.0, "pysna": 2.0, "diky": 1.5, "dekuji": 1.5, "dekuju": 1.5, "ahoj": 0.5,
+    "uspech": 2.0, "uspesny": 2.0, "uspesne": 2.0, "uspesnou": 2.0, "oblibeny": 1.5, "oblibene": 1.5,
+    "miluju": 2.5, "miluji": 2.5, "krasny": 2.0, "krasne": 2.0, "pomoct": 1.0, "pomohu": 1.0, "pomuzu": 1.0,
+    "ochotne": 1.0, "spolehlivy": 1.5, "kvalitni": 1.5, "zkuseny": 1.0, "prima": 1.5, "perfektni": 2.5,
+    "happy": 2.0, "glad": 2.0, "great": 2.5, "excellent": 2.5, "good": 1.5, "love": 2.5, "like": 1.0,
+    "enjoy": 2.0, "enjoyed": 2.0, "excited": 2.5, "proud": 2.0, "thanks": 1.5, "thank": 1.5,
+    "awesome": 2.5, "amazing": 2.5, "interesting": 1.5, "success": 2.0, "successful": 2.0, "best": 2.0,
+    "wonderful": 2.5, "fantastic": 2.5, "helpful": 1.5, "welcome": 1.0, "fun": 1.5, "passionate": 2.0,
+    # Negative
+    "bohuzel": -2.0, "omlouvam": -1.5, "promin": -1.5, "prominte": -1.5, "nemohu": -1.5, "nemuzu": -1.5,
+    "nevim": -1.0, "problem": -1.5, "problemy": -1.5, "problemu": -1.5, "chyba": -2.0, "chybu": -2.0,
+    "chyby": -2.0, "spatny": -2.0, "spatna": -2.0, "spatne": -2.0, "smutny": -2.0, "smutne": -2.0,
+    "tezky": -1.0, "tezke": -1.0, "slozity": -0.5, "slozite": -0.5, "selhani": -2.0, "nefunguje": -2.0,
+    "nepodarilo": -2.0, "nezvladl": -1.5, "nestastny": -2.0, "nestastne": -2.0, "zklamany": -2.0,
+    "zklamani": -2.0, "nanestesti": -2.0, "potiz": -1.5, "potize": -1.5, "nedokazu": -1.5,
+    "sorry": -1.5, "unfortunately": -2.0, "cannot": -1.5, "unable": -1.5, "problems": -1.5, "error": -2.0,
+    "bad": -2.0, "sad": -2.0, "wrong": -2.0, "fail": -2.0, "failed": -2.0, "failure": -2.0, "hate": -2.5,
+    "difficult": -1.0, "hard": -0.5, "disappointed": -2.0, "issue": -1.0, "issues": -1.0, "terrible": -3.0,
+    "awful": -3.0, "worse": -2.0, "worst": -3.0, "apologize": -1.5, "afraid": -1.5,
+}
+
+# Words that flip the valence of the next lexicon word, if it is at most
+# NEGATION_WINDOW words later in the same clause
+NEGATORS = frozenset({"ne", "nikdy", "neni", "nejsem", "nemam", "not", "no", "never", "dont", "doesnt",
+                      "didnt", "isnt", "wasnt", "cant", "wont", "nobody", "nothing"})
+NEGATION_WINDOW = 2
+# A negated word keeps half of its strength with the opposite sign
+NEGATION_FACTOR = -0.5
+
+# Words that strengthen the next word
+INTENSIFIERS: Dict[str, float] = {
+    "velmi": 1.5, "moc": 1.5, "hodne": 1.3, "opravdu": 1.5, "fakt": 1.3, "strasne": 1.5, "nejvic": 1.5,
+    "very": 1.5, "really": 1.5, "so": 1.3, "extremely": 1.8, "truly": 1.5, "super": 1.3,
+}
+
+# Normalization constant of score = total / sqrt(total^2 + ALPHA), as in VADER
+ALPHA = 15.0
+NEUTRAL_BAND = 0.05
+
+# Joins the texts of a batch; tokenized as a clause break that also ends a text
+# (not one of the control characters str.split() treats as whitespace)
+_TEXT_SEPARATOR = "\x00"
+# Punctuation ends the scope of a negator
+CLAUSE_BREAKS = frozenset(".,;:!?" + _TEXT_SEPARATOR)
+# Byte table keeping letters and clause breaks and turning everything else into spaces
+_TOKEN_BYTES = bytes(byte if chr(byte) in string.ascii_lowercase or chr(byte) in CLAUSE_BREAKS else 32
+                     for byte in range(256))
+
+class SentimentScore(NamedTuple):
+    """Graded sentiment in [-1, 1] and its label"""
+    score: float
+    label: str
+
+def label_for(score: float) -> str:
+    """positive / negative / neutral for a graded score"""
+    if score >= NEUTRAL_BAND:
+        return "positive"
+    if score <= -NEUTRAL_BAND:
+        return "negative"
+    return "neutral"
+
+def fold(text: str) -> str:
+    """Lowercase ASCII text with diacritics (and any other non-ASCII characters) removed"""
+    return unicodedata.normalize("NFD", text.lower()).encode("ascii", "ignore").decode("ascii")
+
+def _split(folded: str) -> List[str]:
+    # Only C-level string operations: a byte table, a few replaces and a split
+    spaced = folded.replace("n't", "nt").encode("ascii").translate(_TOKEN_BYTES).decode("ascii")
+    for mark in CLAUSE_BREAKS:
+        if mark in spaced:
+            spaced = spaced.replace(mark, f" {mark} ")
+    return spaced.split()
+
+def tokenize(text: str) -> List[str]:
+    """Folded words and clause punctuation; "don't" becomes "dont" """
+    return _split(fold(text.replace(_TEXT_SEPARATOR, " ")))
+
+def _normalize(total: float) -> float:
+    return total / math.sqrt(total * total + ALPHA) if total else 0.0
+
+class SentimentScorer:
+    """Lexicon scorer with negation and intensifiers.
+
+    A word counts negated (flipped at half strength) when it is the first
+    lexicon word after a negator, at most NEGATION_WINDOW words on and in
+    the same clause ("nemám rád chyby" negates only "rád"), and boosted
+    when the word right before it is an intensifier. Czech "ne-"
+    forms of lexicon words ("nezajimavy") count as negated. The summed
+    valence is squashed into [-1, 1].
+    """
+
+    def __init__(self, lexicon: Dict[str, float] = LEXICON):
+        # The "ne-" forms are expanded up front so scoring is one dict lookup per word
+        self.valences = {"ne" + word: NEGATION_FACTOR * valence for word, valence in lexicon.items() if len(word) > 2}
+        self.valences.update(lexicon)
+
+        # Feature table for score_batch: row 0 is any unknown word
+        known = list(dict.fromkeys([*self.valences, *NEGATORS, *CLAUSE_BREAKS, *INTENSIFIERS]))
+        self._feature_ids = {word: i + 1 for i, word in enumerate(known)}
+        if np is not None:
+            rows = [""] + known
+            self._valence_table = np.array([self.valences.get(word, 0.0) for word in rows])
+            self._scored_table = np.array([word in self.valences for word in rows])
+            self._negator_table = np.array([word in NEGATORS for word in rows])
+            self._break_table = np.array([word in CLAUSE_BREAKS for word in rows])
+            # Scored words and negators never act as intensifiers ("super" is both)
+            self._factor_table = np.array([1.0 if word in self.valences or word in NEGATORS else INTENSIFIERS.get(word, 1.0)
+                                           for word in rows])
+            self._separator_id = self._feature_ids[_TEXT_SEPARATOR]
+
+    def score(self, text: str) -> SentimentScore:
+        """Score one text in a single pass over its words"""
+        valences = self.valences
+        total = 0.0
+        last_negator = -NEGATION_WINDOW - 1
+        boost = 1.0
+        for i, word in enumerate(tokenize(text)):
+            valence = valences.get(word)
+            if valence is not None:
+                negated = i - last_negator <= NEGATION_WINDOW
+                total += valence * boost * (NEGATION_FACTOR if negated else 1.0)
+                # A negator only reaches the first lexicon word after it
+                last_negator = -NEGATION_WINDOW - 1
+                boost = 1.0
+            elif word in NEGATORS:
+                last_negator = i
+                boost = 1.0
+            elif word in CLAUSE_BREAKS:
+                last_negator = -NEGATION_WINDOW - 1
+                boost = 1.0
+            else:
+                boost = INTENSIFIERS.get(word, 1.0)
+        score = round(_normalize(total), 4)
+        return SentimentScore(score, label_for(score))
+
+    def score_batch(self, texts: Iterable[str]) -> List[SentimentScore]:
+        """Score many texts (e.g. re-scoring stored conversations).
+
+        All texts are joined and tokenized as one string, so the fold and
+        split run once, and every word is mapped to a row of a small
+        feature table. Negation, intensifiers and per-text sums are then
+        NumPy array operations over the whole token stream instead of a
+        Python loop per word. Folding, splitting and the per-word lookup
+        cost the same as in score() and dominate, so this is only ~15%
+        faster. Results equal score() for each text.
+        """
+        texts = list(texts)
+        if np is None or not texts:
+            return [self.score(text) for text in texts]
+
+        joined = _TEXT_SEPARATOR.join(texts)
+        if joined.count(_TEXT_SEPARATOR) != len(texts) - 1:
+            joined = _TEXT_SEPARATOR.join(text.replace(_TEXT_SEPARATOR, " ") for text in texts)
+        words = _split(fold(joined))
+        ids = np.fromiter(map(self._feature_ids.get, words, repeat(0)), dtype=np.int64, count=len(words))
+
+        valence = self._valence_table[ids]
+        is_negator = self._negator_table[ids]
+        is_scored = self._scored_table[ids]
+        is_break = self._break_table[ids]
+        factors = self._factor_table[ids]
+        doc_ids = np.cumsum(ids == self._separator_id)
+
+        # Position of the latest negator / clause break at or before each word, and
+        # of the latest scored word strictly before it (-1 when there is none)
+        positions = np.arange(len(ids))
+        last_negator = np.maximum.accumulate(np.where(is_negator, positions, -1))
+        last_break = np.maximum.accumulate(np.where(is_break, positions, -1))
+        last_scored = np.empty(len(ids), dtype=np.int64)
+        last_scored[:1] = -1
+        last_scored[1:] = np.maximum.accumulate(np.where(is_scored, positions, -1))[:-1]
+        negated = ((last_negator >= 0) & (positions - last_negator <= NEGATION_WINDOW)
+                   & (last_negator > last_break) & (last_negator > last_scored))
+
+        boost = np.ones(len(ids))
+        boost[1:] = np.where(is_break[1:], 1.0, factors[:-1])
+
+        contrib = valence * boost * np.where(negated, NEGATION_FACTOR, 1.0)
+        totals = np.bincount(doc_ids, weights=contrib, minlength=len(texts))
+        scores = np.round(totals / np.sqrt(totals * totals + ALPHA), 4)
+        return [SentimentScore(float(s), label_for(float(s))) for s in scores]
+
+sentiment_scorer = SentimentScorer()
@@ -0,0 +1,290 @@
+﻿import asyncio
+import logging
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from app.core.config import (CONVERSATION_TIMEOUT_MINUTES, SESSION_STORE_MAX_SESSIONS, SESSION_STORE_MAX_BYTES,
+                             SESSION_BACKEND, SESSION_LOAD_MESSAGES)
+from app.core.history import RollingHistory, StoredMessage
+from app.core.logs import get_logger, log_event
+from app.core.topics import TopicExtractor, topic_extractor
+
+logger = get_logger("sessions")
+
+# Approximate memory held by a message besides its content string: the
+# slotted record, its float timestamp and the list slot pointing at it
+MESSAGE_OVERHEAD = sys.getsizeof(StoredMessage("user", "", 0.0)) + sys.getsizeof(0.0) + 8
+
+class Session:
+    """One conversation held in memory"""
+    __slots__ = ("session_id", "messages", "window", "created_at", "updated_at", "message_bytes", "accounted_bytes",
+                 "persisted")
+
+    def __init__(self, session_id: str, now: float):
+        self.session_id = session_id
+        self.messages: list = []
+        self.window = RollingHistory()
+        self.created_at = now
+        self.updated_at = now
+        self.message_bytes = 0
+        self.accounted_bytes = 0
+        # Messages of this session known to be in the shared database
+        self.persisted = 0
+
+    def size(self) -> int:
+        """Approximate bytes held by this session"""
+        return SESSION_OVERHEAD + self.message_bytes + self.window.summary_bytes
+
+SESSION_OVERHEAD = sys.getsizeof(Session("", 0.0)) + sys.getsizeof(RollingHistory()) + 2 * sys.getsizeof([])
+
+def message_size(content: str) -> int:
+    return MESSAGE_OVERHEAD + sys.getsizeof(content)
+
+class SessionStore:
+    """Bounded in-memory conversation store.
+
+    Sessions are kept in updated_at order, so TTL eviction and capacity
+    eviction both pop from the front. The store enforces a hard session cap
+    and an approximate byte budget; the session being written to is never
+    evicted by its own write.
+
+    This is the per-process backend. Chat turns resolve their session with
+    load() and hand finished messages to persist(); a backend whose
+    persist() makes them durable sets durable, otherwise the caller queues
+    them for the write-behind MessageWriter.
+    """
+    backend = "memory"
+    durable = False
+
+    def __init__(self, max_sessions: int = SESSION_STORE_MAX_SESSIONS, max_bytes: int = SESSION_STORE_MAX_BYTES,
+                 ttl_seconds: float = CONVERSATION_TIMEOUT_MINUTES * 60, on_evict: Optional[Callable[[str], None]] = None):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # Lets per-session caches elsewhere drop their entry along with the session
+        self.on_evict = on_evict
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.evicted_ttl = 0
+        self.evicted_capacity = 0
+        self.evicted_bytes = 0
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """Return a live session, or None if it is unknown or has expired"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and time.time() - session.updated_at > self.ttl_seconds:
+                self._remove(session)
+                self.evicted_ttl += 1
+                return None
+            return session
+
+    async def load(self, session_id: str) -> Optional[Session]:
+        """Session to continue a turn in (get() for the in-process backend)"""
+        return self.get(session_id)
+
+    async def persist(self, session: Session, messages: List[StoredMessage]) -> None:
+        """Make messages of a finished turn durable (nothing to do for the in-process backend)"""
+
+    def adopt(self, session: Session) -> None:
+        """Insert a session built elsewhere, replacing the local copy of it"""
+        with self._lock:
+            current = self._sessions.get(session.session_id)
+            if current is not None:
+                self._remove(current)
+            self._sessions[session.session_id] = session
+            self._account(session)
+            self._evict(time.time(), session)
+
+    def create(self) -> Session:
+        """Start a new session with a fresh id"""
+        now = time.time()
+        session = Session(str(uuid.uuid4()), now)
+        with self._lock:
+            self._sessions[session.session_id] = session
+            self._account(session)
+            self._evict(now, session)
+        return session
+
+    def append(self, session: Session, role: str, content: str) -> StoredMessage:
+        """Add a message to a session and refresh its position in the store"""
+        now = time.time()
+        message = StoredMessage(role, content, now)
+        with self._lock:
+            session.messages.append(message)
+            session.message_bytes += message_size(content)
+            session.updated_at = now
+            if self._sessions.get(session.session_id) is session:
+                self._sessions.move_to_end(session.session_id)
+                self._account(session)
+                self._evict(now, session)
+        return message
+
+    def retract(self, session: Session, message: StoredMessage) -> bool:
+        """Remove a message that was never answered (e.g. its turn was rejected)"""
+        with self._lock:
+            # Only messages the history window has not counted yet can go
+            for index in range(len(session.messages) - 1, session.window.seen - 1, -1):
+                if session.messages[index] is message:
+                    del session.messages[index]
+                    session.message_bytes -= message_size(message.content)
+                    if self._sessions.get(session.session_id) is session:
+                        self._account(session)
+                    return True
+            return False
+
+    def release(self, session: Session, messages: Iterable[StoredMessage]) -> None:
+        """Account for messages a session no longer holds (e.g. folded into its summary)"""
+        with self._lock:
+            session.message_bytes -= sum(message_size(m.content) for m in messages)
+            if self._sessions.get(session.session_id) is session:
+                self._account(session)
+
+    def _account(self, session: Session) -> None:
+        size = session.size()
+        self.total_bytes += size - session.accounted_bytes
+        session.accounted_bytes = size
+
+    def _remove(self, session: Session) -> None:
+        del self._sessions[session.session_id]
+        self.total_bytes -= session.accounted_bytes
+        session.accounted_bytes = 0
+        if self.on_evict:
+            self.on_evict(session.session_id)
+
+    def _evict(self, now: float, keep: Session) -> None:
+        # Oldest updated_at first
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if oldest is keep or now - oldest.updated_at <= self.ttl_seconds:
+                break
+            self._remove(oldest)
+            self.evicted_ttl += 1
+
+        while len(self._sessions) > self.max_sessions:
+            oldest = next(iter(self._sessions.values()))
+            if oldest is keep:
+                break
+            self._remove(oldest)
+            self.evicted_capacity += 1
+
+        while self.total_bytes > self.max_bytes and len(self._sessions) > 1:
+            oldest = next(iter(self._sessions.values()))
+            if oldest is keep:
+                break
+            self._remove(oldest)
+            self.evicted_bytes += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Current size and eviction counters"""
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "evicted_ttl": self.evicted_ttl,
+                "evicted_capacity": self.evicted_capacity,
+                "evicted_bytes": self.evicted_bytes,
+                "backend": self.backend
+            }
+
+class SharedSessionStore(SessionStore):
+    """Sessions shared by all worker processes through the SQLite database.
+
+    Sessions are still cached in this process, but the conversations and
+    messages tables (WAL mode, see app.core.database) are the source of
+    truth. Every finished turn is written before its response is returned,
+    and every turn starts by comparing the session's message count in the
+    database with the local copy; a session that another worker has
+    continued since (or this one has never seen) is rebuilt from its last
+    load_limit messages. Follow-ups can therefore land on any worker.
+    Database work runs on a worker thread.
+    """
+    backend = "sqlite"
+    durable = True
+
+    def __init__(self, load_limit: int = SESSION_LOAD_MESSAGES, topics: Optional[TopicExtractor] = topic_extractor, **kwargs):
+        super().__init__(**kwargs)
+        self.load_limit = load_limit
+        self.topics = topics
+        self.reloaded = 0
+        self.persist_failed = 0
+
+    async def load(self, session_id: str) -> Optional[Session]:
+        return await asyncio.to_thread(self._load, session_id)
+
+    def _load(self, session_id: str) -> Optional[Session]:
+        # SQLAlchemy is loaded by the startup warm-up, not at import
+        from app.core import database
+        state = database.get_session_state(session_id)
+        if state is None:
+            # Not in the database (yet): only a local copy can continue it
+            return self.get(session_id)
+        last_updated, count = state
+        if (datetime.utcnow() - last_updated).total_seconds() > self.ttl_seconds:
+            return None
+
+        session = self.get(session_id)
+        if session is not None and session.persisted == count:
+            return session
+
+        session = Session(session_id, time.time())
+        for role, content, timestamp in database.get_session_messages(session_id, self.load_limit):
+            session.messages.append(StoredMessage(role, content, timestamp.replace(tzinfo=timezone.utc).timestamp()))
+            session.message_bytes += message_size(content)
+        session.persisted = count
+        self.adopt(session)
+        self.reloaded += 1
+        return session
+
+    async def persist(self, session: Session, messages: List[StoredMessage]) -> None:
+        await asyncio.to_thread(self._persist, session, messages)
+
+    def _persist(self, session: Session, messages: List[StoredMessage]) -> None:
+        from app.core.database import append_session_messages
+        topics = None
+        if self.topics:
+            names = set()
+            for message in messages:
+                if message.role == "user":
+                    names.update(self.topics.extract(message.content))
+            topics = {session.session_id: names} if names else None
+        try:
+            append_session_messages(
+                ((session.session_id, m.role, m.content, datetime.utcfromtimestamp(m.timestamp)) for m in messages),
+                topics
+            )
+        except Exception as e:
+            # The local copy still has the turn; other workers will not see it
+            self.persist_failed += 1
+            log_event(logger, "session_persist_failed", logging.WARNING, error=str(e))
+            return
+        with self._lock:
+            session.persisted += len(messages)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats["reloaded"] = self.reloaded
+        stats["persist_failed"] = self.persist_failed
+        return stats
+
+def create_session_store(backend: str = SESSION_BACKEND, **kwargs) -> SessionStore:
+    """Session store for a backend name: "memory" (per process) or "sqlite" (shared by all workers)"""
+    if backend == "sqlite":
+        return SharedSessionStore(**kwargs)
+    if backend == "memory":
+        return SessionStore(**kwargs)
+    raise ValueError(f"Unknown session backend: {backend!r}")
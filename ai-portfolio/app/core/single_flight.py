@@ -0,0 +1,44 @@
+﻿import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+class SingleFlight:
+    """Share one in-flight call between concurrent callers asking the same thing.
+
+    The first caller for a key starts the call as its own task; callers that
+    arrive while it runs await the same result instead of starting another.
+    The key is forgotten as soon as the call finishes, so nothing is cached
+    beyond the calls in flight. The shared task is shielded: a caller that
+    goes away does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, "asyncio.Future"] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def run(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Result of call(), shared with every concurrent run() for the same key"""
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(call())
+            self._calls[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(future)
+
+    def _forget(self, key: Hashable, future: "asyncio.Future") -> None:
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        if not future.cancelled():
+            # Mark a failure as retrieved even if every waiter has gone away
+            future.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        """In-flight keys and how many upstream calls coalescing saved"""
+        return {
+            "in_flight": len(self._calls),
+            "calls": self.calls,
+            "saved_calls": self.coalesced
+        }
@@ -0,0 +1,67 @@
+﻿import asyncio
+import time
+from typing import Any, Dict, Optional
+
+from app.core.config import SWEEP_INTERVAL_SECONDS
+
+class ConversationSweeper:
+    """Periodic background task that deletes expired conversations.
+
+    Each run executes sweep_expired_conversations() on a worker thread so
+    the event loop keeps serving requests while batches are deleted.
+    """
+
+    def __init__(self, interval: float = SWEEP_INTERVAL_SECONDS):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.total_conversations = 0
+        self.total_messages = 0
+        self.last_run: Dict[str, Any] = {}
+
+    def start(self) -> None:
+        """Schedule the sweep loop on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Cancel the sweep loop"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_once(self) -> Dict[str, Any]:
+        """Sweep now and record how much was deleted and how long it took"""
+        # Imported on first use: SQLAlchemy is loaded by the startup warm-up, not at import
+        from app.core.database import sweep_expired_conversations
+        start = time.perf_counter()
+        swept = await asyncio.get_running_loop().run_in_executor(None, sweep_expired_conversations)
+        elapsed = time.perf_counter() - start
+
+        self.runs += 1
+        self.total_conversations += swept["conversations"]
+        self.total_messages += swept["messages"]
+        self.last_run = dict(swept, seconds=round(elapsed, 4), finished_at=time.time())
+        print(f"Swept {swept['conversations']} expired conversations and {swept['messages']} messages in {elapsed * 1000:.1f} ms")
+        return self.last_run
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"Error sweeping expired conversations: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Totals and the result of the most recent run"""
+        return {
+            "runs": self.runs,
+            "conversations": self.total_conversations,
+            "messages": self.total_messages,
+            "last_run": self.last_run
+        }
@@ -0,0 +1,76 @@
+﻿import re
+from typing import Dict, Iterable, List, Tuple
+
+from app.core.answer_cache import normalize_question
+
+# Terms per topic, in folded form (lowercase, no diacritics). A trailing "*"
+# matches any ending, which is how Czech declension and conjugation are
+# covered: "prac*" finds práce, práci, pracoval, pracuješ... Topic names are
+# the English keywords stored on conversations so far.
+TOPIC_TERMS: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ("machine learning", ("machine learning", "strojov* uceni*", "ml", "deep learning", "neural network*",
+                          "neuronov* sit*", "tensorflow", "pytorch")),
+    ("ai", ("ai", "artificial intelligence", "umel* inteligenc*", "llm*", "gpt*", "chatbot*", "gemini")),
+    ("skills", ("skill*", "dovednost*", "schopnost*", "znalost*", "umis", "umite", "ovladas", "technolog*",
+                "tech stack")),
+    ("experience", ("experience*", "zkusenost*", "praxe", "praxi", "karier*", "career*")),
+    ("projects", ("project*", "projekt*")),
+    ("education", ("educat*", "vzdelan*", "studova*", "studium", "studi*", "univerzit*", "universit*", "degree*",
+                   "titul*", "skol*", "vysok* skol*")),
+    ("contact", ("contact*", "kontakt*", "email*", "e mail*", "mail", "telefon*", "phone*", "linkedin",
+                 "ozvat", "spojit")),
+    ("work", ("work*", "job*", "prac*", "zamestna*", "firm*", "freelanc*", "volne noze", "nabid*", "hire*",
+              "hiring", "najmout")),
+    ("background", ("background", "zazemi", "o tobe", "o sobe", "pribeh*", "zivotopis*", "cv", "resume",
+                    "about you", "yourself")),
+    ("portfolio", ("portfoli*", "ukazk*", "showcase")),
+    ("coding", ("coding", "code*", "coder*", "kod*", "program*", "naprogram*")),
+    ("development", ("develop*", "vyvoj*", "vyvij*", "frontend*", "backend*", "full stack", "fullstack",
+                     "web*")),
+    ("design", ("design*", "navrh*", "ux", "ui", "grafik*")),
+)
+
+def _term_pattern(term: str) -> str:
+    words = []
+    for word in term.split():
+        words.append(re.escape(word[:-1]) + r"\w*" if word.endswith("*") else re.escape(word))
+    return r"\s+".join(words)
+
+class TopicExtractor:
+    """All topic terms compiled into one regex, so a message is scored in a single scan.
+
+    Each topic is a named group; within a topic longer terms come first so
+    a phrase wins over its own prefix. Text is folded with the same
+    normalization as the answer cache, so Czech with or without diacritics
+    matches the same terms.
+    """
+
+    def __init__(self, topic_terms: Iterable[Tuple[str, Iterable[str]]] = TOPIC_TERMS):
+        self.topics: List[str] = []
+        alternatives = []
+        for topic, terms in topic_terms:
+            group = f"t{len(self.topics)}"
+            self.topics.append(topic)
+            ordered = sorted(terms, key=len, reverse=True)
+            alternatives.append(f"(?P<{group}>" + "|".join(_term_pattern(t) for t in ordered) + ")")
+        self._group_topics = {f"t{i}": topic for i, topic in enumerate(self.topics)}
+        self._pattern = re.compile(r"\b(?:" + "|".join(alternatives) + r")\b")
+
+    def score(self, text: str) -> Dict[str, int]:
+        """Number of term hits per topic"""
+        scores: Dict[str, int] = {}
+        for match in self._pattern.finditer(normalize_question(text)):
+            topic = self._group_topics[match.lastgroup]
+            scores[topic] = scores.get(topic, 0) + 1
+        return scores
+
+    def extract(self, text: str) -> List[str]:
+        """Topics mentioned in a message, most mentioned first"""
+        scores = self.score(text)
+        return sorted(scores, key=lambda topic: (-scores[topic], self.topics.index(topic)))
+
+    def extract_batch(self, texts: Iterable[str]) -> List[List[str]]:
+        """extract() for many messages"""
+        return [self.extract(text) for text in texts]
+
+topic_extractor = TopicExtractor()
@@ -0,0 +1,122 @@
+﻿import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.logs import get_logger, log_event
+
+logger = get_logger("startup")
+
+class WarmUp:
+    """Named startup steps run once, in order, after the server is up.
+
+    The app lifespan starts them in the background, so the server accepts
+    connections (pages, static files, /ready) right away instead of after
+    the slow imports and file loads. Each step runs on a worker thread and
+    is timed. Code that needs the steps done awaits wait(). A failed step
+    is retried with exponential backoff (retry_seconds doubling up to
+    max_retry_seconds) before the next one runs; while it keeps failing the
+    app is not ready and wait() returns False right away, and once a retry
+    succeeds the error is cleared and warm-up carries on.
+    """
+
+    def __init__(self, retry_seconds: float = 0.5, max_retry_seconds: float = 30.0):
+        self._steps: List[Tuple[str, Callable[[], Any]]] = []
+        self._task: Optional[asyncio.Task] = None
+        # Set when the steps are done or one has just failed; cleared while a retry runs
+        self._settled: Optional[asyncio.Event] = None
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self.timings: Dict[str, float] = {}
+        self.failures: Dict[str, int] = {}
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def step(self, name: str) -> Callable[[Callable[[], Any]], Callable[[], Any]]:
+        """Decorator registering a blocking function as the next step"""
+        def register(fn: Callable[[], Any]) -> Callable[[], Any]:
+            self._steps.append((name, fn))
+            return fn
+        return register
+
+    @property
+    def ready(self) -> bool:
+        return self.finished_at is not None and self.error is None
+
+    def start(self) -> None:
+        """Run the steps in the background on the running event loop"""
+        if self._task is None:
+            self._settled = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        self.started_at = time.perf_counter()
+        try:
+            for name, fn in self._steps:
+                await self._run_step(name, fn)
+            log_event(logger, "warm_up_done", seconds=round(time.perf_counter() - self.started_at, 4))
+        except asyncio.CancelledError:
+            self.error = "cancelled"
+            raise
+        finally:
+            self.finished_at = time.perf_counter()
+            self._settled.set()
+
+    async def _run_step(self, name: str, fn: Callable[[], Any]) -> None:
+        """Run one step on a worker thread until it succeeds, backing off between failures"""
+        delay = self.retry_seconds
+        while True:
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(fn)
+            except Exception as e:
+                self.timings[name] = round(time.perf_counter() - started, 4)
+                self.failures[name] = self.failures.get(name, 0) + 1
+                self.error = f"{name}: {e!r}"
+                log_event(logger, "warm_up_failed", logging.ERROR, step=name, error=repr(e),
+                          attempt=self.failures[name], retry_in=delay)
+                self._settled.set()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_seconds)
+                self._settled.clear()
+                continue
+            self.timings[name] = round(time.perf_counter() - started, 4)
+            if self.error is not None:
+                self.error = None
+                log_event(logger, "warm_up_recovered", step=name, attempts=self.failures[name] + 1)
+            log_event(logger, "warm_up_step", step=name, seconds=self.timings[name])
+            return
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait up to timeout seconds for the steps to finish; returns whether the app is ready
+
+        Returns False at once while a failed step waits for its retry.
+        """
+        if self._settled is None:
+            return False
+        try:
+            await asyncio.wait_for(self._settled.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return self.ready
+
+    async def stop(self) -> None:
+        """Cancel steps still waiting to run (one already on a thread finishes there)"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def status(self) -> Dict[str, Any]:
+        """Readiness, per-step timings and the failure if there was one"""
+        status = {"ready": self.ready, "steps": {name: self.timings.get(name) for name, _ in self._steps}}
+        if self.started_at is not None:
+            status["seconds"] = round((self.finished_at or time.perf_counter()) - self.started_at, 4)
+        if self.error:
+            status["error"] = self.error
+        if self.failures:
+            status["failures"] = dict(self.failures)
+        return status
@@ -1,7 +1,11 @@
 ﻿from fastapi import FastAPI, Request
-from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import FileResponse, Response
+from fastapi.responses import FileResponse, JSONResponse, Response
+from contextlib import asynccontextmanager
+from app.core.metrics import registry, CONTENT_TYPE
+from app.core.assets import AssetFiles, AssetManifest
+from app.core.config import ASSET_BUILD_DIR
+from app.core.pages import PageStore
 import os
 import pathlib
 
@@ -9,28 +13,59 @@ import pathlib
 BASE_DIR = pathlib.Path(__file__).parent.parent.resolve()
 
 # Import the chat router
-from app.api.chat import router as chat_router
+from app.api.chat import router as chat_router, gemini_api, message_writer, conversation_sweeper, warm_up
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Render pages, start background workers and warm up; release everything on shutdown.
+    
+    Only the page render is awaited (a broken template fails startup); the
+    slow warm-up steps run in the background while the server already
+    answers, and /ready reports when they are done.
+    """
+    pages.load()
+    message_writer.start()
+    conversation_sweeper.start()
+    warm_up.start()
+    yield
+    await warm_up.stop()
+    await conversation_sweeper.stop()
+    gemini_api.shutdown(wait=False)
+    # Flush messages still waiting to be written
+    message_writer.close()
 
 # Initialize FastAPI app
 app = FastAPI(
     title="AI Portfolio with Animated Avatar",
     description="A personal portfolio website with an animated AI assistant",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# Mount static files
-app.mount("/static", StaticFiles(directory=os.path.join(BASE_DIR, "app/static")), name="static")
+# Mount static files, fingerprinted and precompressed where built
+asset_manifest = AssetManifest(os.path.join(BASE_DIR, "app/static"), os.path.join(BASE_DIR, ASSET_BUILD_DIR))
+app.mount("/static", AssetFiles(directory=os.path.join(BASE_DIR, "app/static"), manifest=asset_manifest), name="static")
 
 # Set up templates
 templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "app/templates"))
 
+def asset_url_for(name: str, /, **path_params) -> str:
+    """Root-relative url_for that points static files at their fingerprinted build"""
+    if name == "static" and "path" in path_params:
+        path_params["path"] = asset_manifest.url_path(path_params["path"])
+    return str(app.url_path_for(name, **path_params))
+
+# Pages are rendered once, without a request, at startup; template errors fail startup
+pages = PageStore(templates.env, os.path.join(BASE_DIR, "app/templates"),
+                  ["index.html", "avatar_test_page.html", "avatar_test.html"], url_for=asset_url_for)
+
 # Include API routers
 app.include_router(chat_router, prefix="/api")
 
 @app.get("/")
 async def home(request: Request):
     """Render home page"""
-    return templates.TemplateResponse("index.html", {"request": request})
+    return pages.response("index.html", request)
 
 @app.get("/favicon.ico")
 async def favicon():
@@ -38,15 +73,26 @@ async def favicon():
     # Return 204 No Content to avoid error
     return Response(status_code=204)
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once startup warm-up has finished, 503 before or while a step is failing (it is retried)"""
+    status = warm_up.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/metrics")
+async def metrics():
+    """Chat turn latency per stage, session, message and fallback counters in the Prometheus text format"""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
 @app.get("/avatar-test")
 async def avatar_test_page(request: Request):
     """Dedicated avatar animation test page"""
-    return templates.TemplateResponse("avatar_test_page.html", {"request": request})
+    return pages.response("avatar_test_page.html", request)
 
 @app.get("/simple-test")
 async def simple_test(request: Request):
     """Simple avatar test page"""
-    return templates.TemplateResponse("simple_test.html", {"request": request})
+    return pages.response("avatar_test.html", request)
 
 if __name__ == "__main__":
     import uvicorn
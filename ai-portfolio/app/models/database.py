@@ -1,9 +1,8 @@
-﻿from sqlalchemy import Column, Integer, String, Text, DateTime, create_engine, ForeignKey
+﻿from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import json
-from app.core.config import DB_PATH
 
 Base = declarative_base()
 
@@ -13,7 +12,7 @@ class Conversation(Base):
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(String, unique=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
-    last_updated = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    last_updated = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     topics = Column(Text, default='[]')  # JSON string of topics discussed
     user_data = Column(Text, default='{}')  # JSON string of user data
     
@@ -47,7 +46,8 @@ class Message(Base):
     timestamp = Column(DateTime, default=datetime.utcnow)
     
     conversation = relationship("Conversation", back_populates="messages")
-
-# Initialize database
-engine = create_engine(f"sqlite:///{DB_PATH}")
-Base.metadata.create_all(bind=engine)
+    
+    # Serves "messages of a conversation in time order" and "last N" without a sort
+    __table_args__ = (
+        Index("ix_messages_conversation_timestamp", "conversation_id", "timestamp"),
+    )
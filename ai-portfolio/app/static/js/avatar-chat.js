@@ -195,7 +195,7 @@
                     // Set sentiment response
                     const controller = window.avatarController;
                     if (controller) {
-                        controller.respondToSentiment(data.sentiment || 'neutral');
+                        controller.respondToSentiment(data.sentiment || 'neutral', data.sentiment_score);
                     }
                 })
                 .catch(error => {
@@ -373,14 +373,19 @@ class AvatarController {
     }
     
     // Sentiment-based responses
-    respondToSentiment(sentiment) {
+    respondToSentiment(sentiment, score) {
         if (!this.avatar) return;
         
-        // Sentiment should be 'positive', 'negative', or 'neutral'
+        // Sentiment should be 'positive', 'negative', or 'neutral'; the
+        // optional score (-1..1) says how strongly
+        const strength = typeof score === 'number' ? Math.abs(score) : 1;
         switch(sentiment) {
             case 'positive':
                 this.setExpression('happy');
-                setTimeout(() => this.performGesture('excited'), 500);
+                // Only clearly happy replies get the excited gesture
+                if (strength >= 0.5) {
+                    setTimeout(() => this.performGesture('excited'), 500);
+                }
                 break;
             case 'negative':
                 // Look a bit sad
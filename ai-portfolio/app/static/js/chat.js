@@ -45,37 +45,42 @@
         // Show typing indicator
         addTypingIndicator();
         
-        fetch('/api/chat', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
+        let aiMessage = null;
+        let streamedText = '';
+        
+        streamChat(message, sessionId, {
+            onSession(id) {
+                // Save session ID
+                sessionId = id;
+                localStorage.setItem('chatSessionId', sessionId);
             },
-            body: JSON.stringify({
-                message: message,
-                session_id: sessionId
-            }),
-        })
-        .then(response => response.json())
-        .then(data => {
-            // Remove typing indicator
-            removeTypingIndicator();
-            
-            // Add AI response to chat
-            addMessageToChat('ai', data.response);
-            
-            // Save session ID
-            sessionId = data.session_id;
-            localStorage.setItem('chatSessionId', sessionId);
-            
-            // Speak response if voice is enabled
-            if (window.voiceEnabled) {
-                speakText(data.response);
+            onToken(text) {
+                // Render tokens as soon as they arrive
+                if (!aiMessage) {
+                    removeTypingIndicator();
+                    aiMessage = addMessageToChat('ai', '');
+                }
+                streamedText += text;
+                aiMessage.textContent = streamedText;
+                messagesContainer.scrollTop = messagesContainer.scrollHeight;
+            },
+            onDone(data) {
+                removeTypingIndicator();
+                if (!aiMessage) {
+                    aiMessage = addMessageToChat('ai', data.response);
+                }
+                
+                // Speak response if voice is enabled
+                if (window.voiceEnabled) {
+                    speakText(data.response);
+                }
             }
         })
         .catch(error => {
             console.error('Error:', error);
             removeTypingIndicator();
-            addMessageToChat('ai', 'Sorry, I encountered an error. Please try again.');
+            // A busy server says when to retry; the message was not kept
+            addMessageToChat('ai', error.busyMessage || 'Sorry, I encountered an error. Please try again.');
         })
         .finally(() => {
             isLoading = false;
@@ -95,6 +100,8 @@
         
         // Scroll to bottom
         messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        
+        return messagePara;
     }
     
     // Add typing indicator
@@ -125,6 +132,73 @@
     }
 });
 
+// Stream a chat reply from the server-sent events endpoint
+async function streamChat(message, sessionId, handlers) {
+    const response = await fetch('/api/chat/stream', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            message: message,
+            session_id: sessionId
+        }),
+    });
+    
+    if (response.status === 429 || response.status === 503) {
+        const body = await response.json().catch(() => ({}));
+        const detail = body.detail || {};
+        if (detail.session_id && handlers.onSession) handlers.onSession(detail.session_id);
+        const error = new Error(`Chat stream rejected with status ${response.status}`);
+        error.busyMessage = detail.message;
+        error.retryAfter = Number(response.headers.get('Retry-After')) || 0;
+        throw error;
+    }
+    
+    if (!response.ok || !response.body) {
+        throw new Error(`Chat stream failed with status ${response.status}`);
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let finished = false;
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let eventName = 'message';
+            let data = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) eventName = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            });
+            if (!data) continue;
+            
+            const payload = JSON.parse(data);
+            if (eventName === 'session' && handlers.onSession) handlers.onSession(payload.session_id);
+            else if (eventName === 'token' && handlers.onToken) handlers.onToken(payload.text);
+            else if (eventName === 'done') {
+                finished = true;
+                if (handlers.onDone) handlers.onDone(payload);
+            }
+        }
+    }
+    
+    // A stream cut off before its "done" event has no complete answer
+    if (!finished) {
+        throw new Error('Chat stream ended before the response was complete');
+    }
+}
+
 // Function to speak text (defined globally for access from voice.js)
 function speakText(text) {
     if (!window.speechSynthesis) return;
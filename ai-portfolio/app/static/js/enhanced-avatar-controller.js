@@ -245,17 +245,25 @@ class EnhancedAvatarController {
         console.log('Speaking stopped');
     }
     
-    respondToSentiment(sentiment) {
-        console.log('Responding to sentiment:', sentiment);
+    respondToSentiment(sentiment, score) {
+        console.log('Responding to sentiment:', sentiment, score);
         
+        // The optional score (-1..1) says how strongly
+        const strength = typeof score === 'number' ? Math.abs(score) : 1;
         switch(sentiment) {
             case 'positive':
                 this.setExpression('happy');
-                setTimeout(() => this.performGesture('excited'), 500);
+                // Only clearly happy replies get the excited gesture
+                if (strength >= 0.5) {
+                    setTimeout(() => this.performGesture('excited'), 500);
+                }
                 break;
                 
             case 'negative':
-                this.setExpression('sad');
+                // A mild apology only looks sad when it is more than a passing word
+                if (strength >= 0.3) {
+                    this.setExpression('sad');
+                }
                 break;
                 
             case 'neutral':
@@ -20,7 +20,7 @@ function sendMessage(message) {
         localStorage.setItem('chatSessionId', sessionId);
         
         // Respond with appropriate expression based on sentiment
-        avatarController.respondToSentiment(data.sentiment || 'neutral');
+        avatarController.respondToSentiment(data.sentiment || 'neutral', data.sentiment_score);
         
         // Speak the response with avatar animation
         speakResponse(data.response);
@@ -0,0 +1,80 @@
+﻿"""Bytes and requests needed to load the home page's assets, cold and warm.
+
+Fetches the home page and every /static URL it references (plus the avatar
+model the 3D controller loads), the way a browser with an HTTP cache would:
+a cold visit with an empty cache, then a warm visit that reuses fresh
+entries and revalidates the rest with If-None-Match. Run once against the
+plain static files and once against the build from build_assets.py.
+
+    python benchmarks/bench_assets.py
+"""
+import os
+import pathlib
+import re
+import shutil
+import sys
+import tempfile
+import warnings
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.resolve()))
+os.environ.setdefault("PERSIST_MESSAGES", "false")
+warnings.filterwarnings("ignore")
+
+from fastapi.testclient import TestClient
+
+from app.core.assets import AssetManifest, build_assets
+
+# Templates render absolute URLs (url_for), scripts use root-relative ones
+STATIC_URL = re.compile(r"""["'](?:https?://[^/"']+)?(/static/[^"'?#\s]+)["']""")
+
+def visit(client: TestClient, cache: dict) -> dict:
+    """Load the page and its assets through cache (url -> (etag, cache-control)); returns totals"""
+    totals = {"requests": 0, "not_modified": 0, "from_cache": 0, "bytes": 0}
+    page = client.get("/").text
+    urls = list(dict.fromkeys(STATIC_URL.findall(page)))
+    for url in urls:
+        if url.endswith(".js"):
+            # Follow references inside scripts (module imports and the model URL) one level deep
+            urls += [ref for ref in STATIC_URL.findall(client.get(url).text) if ref not in urls]
+    for url in urls:
+        etag, cache_control = cache.get(url, (None, ""))
+        if "immutable" in cache_control:
+            totals["from_cache"] += 1
+            continue
+        headers = {"accept-encoding": "gzip, br"}
+        if etag:
+            headers["if-none-match"] = etag
+        response = client.get(url, headers=headers)
+        totals["requests"] += 1
+        # Compressed bytes on the wire rather than httpx's decoded content
+        totals["bytes"] += int(response.headers.get("content-length", 0))
+        if response.status_code == 304:
+            totals["not_modified"] += 1
+        elif response.status_code == 200:
+            cache[url] = (response.headers.get("etag"), response.headers.get("cache-control", ""))
+    return totals
+
+def run(label: str, manifest: AssetManifest):
+    import app.main as main
+    main.asset_manifest.assets, main.asset_manifest.by_hashed = manifest.assets, manifest.by_hashed
+    main.asset_manifest.output_dir = manifest.output_dir
+    main.pages.reload(force=True)
+    client = TestClient(main.app)
+    cache = {}
+    for name in ("cold", "warm"):
+        totals = visit(client, cache)
+        print(f"{label:>8} {name}: {totals['requests']:3d} requests ({totals['not_modified']} x 304), "
+              f"{totals['from_cache']:3d} from cache, {totals['bytes'] / 1024:8.1f} KiB")
+
+def main():
+    static_dir = str(pathlib.Path(__file__).parent.parent / "app" / "static")
+    output_dir = tempfile.mkdtemp(prefix="bench-assets-")
+    try:
+        run("plain", AssetManifest(static_dir, os.path.join(output_dir, "missing")))
+        build_assets(static_dir, output_dir)
+        run("built", AssetManifest(static_dir, output_dir))
+    finally:
+        shutil.rmtree(output_dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+﻿"""Evaluation run over the chat API: one request per turn vs one batch.
+
+Sends the same --conversations x --turns turns to the app in-process
+(TestClient, so the startup warm-up runs) with GeminiAPI talking to
+FakeGenerativeModel: first as back-to-back /api/chat calls, the way an
+evaluation script would loop over its questions, then as a single
+/api/chat/batch request at --concurrency. Reports wall time, per-item
+latency percentiles and errors for each. Every conversation gets a
+distinct opening question so the answer cache doesn't hide the model
+latency.
+
+Per-session rate limits are lifted since each conversation asks back to
+back (set SESSION_RATE_PER_MINUTE to keep them).
+
+    python benchmarks/bench_batch.py --conversations 20 --turns 3 --concurrency 8
+"""
+import argparse
+import os
+import pathlib
+import sys
+import tempfile
+import time
+import warnings
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.resolve()))
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(prefix="bench-batch-"), "conversations.db"))
+os.environ.setdefault("SESSION_RATE_PER_MINUTE", "1000000")
+os.environ.setdefault("SESSION_BURST", "1000000")
+warnings.filterwarnings("ignore")
+
+from fastapi.testclient import TestClient
+
+import app.api.chat as chat
+from app.main import app
+from benchmarks.fake_llm import FakeGenerativeModel
+
+FOLLOW_UPS = ["Řekni mi o tom víc.", "Jaké technologie jsi tam používal?", "Co bylo nejtěžší?", "A co děláš teď?"]
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+def turns(run: str, conversations: int, per_conversation: int):
+    """(conversation label, message) pairs, grouped by conversation; openings are unique per run"""
+    for n in range(conversations):
+        yield f"{run}-{n}", f"Na jakých projektech jsi pracoval? ({run} #{n})"
+        for t in range(per_conversation - 1):
+            yield f"{run}-{n}", FOLLOW_UPS[t % len(FOLLOW_UPS)]
+
+def run_sequential(client: TestClient, items):
+    sessions, latencies, errors = {}, [], 0
+    start = time.perf_counter()
+    for label, message in items:
+        started = time.perf_counter()
+        response = client.post("/api/chat", json={"message": message, "session_id": sessions.get(label)})
+        latencies.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            errors += 1
+            continue
+        sessions[label] = response.json()["session_id"]
+    return time.perf_counter() - start, latencies, errors
+
+def run_batch(client: TestClient, items, concurrency: int):
+    start = time.perf_counter()
+    response = client.post("/api/chat/batch", json={
+        "items": [{"message": message, "session_id": label} for label, message in items],
+        "concurrency": concurrency,
+    })
+    elapsed = time.perf_counter() - start
+    response.raise_for_status()
+    results = response.json()["results"]
+    return elapsed, [r["latency_ms"] for r in results], sum(1 for r in results if r["error"])
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.1, help="fake model latency per call, seconds")
+    args = parser.parse_args()
+
+    chat.gemini_api._build_model = lambda prompt: FakeGenerativeModel(latency=args.latency, system_instruction=prompt)
+    with TestClient(app) as client:
+        while client.get("/ready").status_code != 200:
+            time.sleep(0.05)
+        print(f"{args.conversations * args.turns} turns in {args.conversations} conversations, "
+              f"model latency {args.latency * 1000:.0f} ms")
+        for name, run in (("sequential /chat", lambda items: run_sequential(client, items)),
+                          (f"batch x{args.concurrency}", lambda items: run_batch(client, items, args.concurrency))):
+            elapsed, latencies, errors = run(list(turns(name.split()[0], args.conversations, args.turns)))
+            print(f"{name:<18} wall {elapsed:7.2f} s  p50 {percentile(latencies, 0.5):7.1f} ms  "
+                  f"p95 {percentile(latencies, 0.95):7.1f} ms  errors {errors}")
+
+if __name__ == "__main__":
+    main()
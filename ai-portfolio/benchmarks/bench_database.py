@@ -0,0 +1,65 @@
+﻿"""Micro-benchmark of message writes and reads on a long conversation.
+
+Runs against a throwaway SQLite file and compares:
+  - per-message add_message() vs one add_messages() batch
+  - reading the last N messages by loading the whole conversation (the only
+    way to get the newest rows before) vs get_recent_messages() on the
+    (conversation_id, timestamp) index, with and without the index
+
+    python benchmarks/bench_database.py --messages 20000 --last 20
+"""
+import argparse
+import os
+import pathlib
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.resolve()))
+
+def timed(fn, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000, help="messages in the benchmark conversation")
+    parser.add_argument("--single", type=int, default=500, help="messages written one by one for the per-row rate")
+    parser.add_argument("--last", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    # The database modules read DB_PATH at import time
+    workdir = tempfile.mkdtemp()
+    os.environ["DB_PATH"] = os.path.join(workdir, "bench.db")
+    from sqlalchemy import text
+    from app.core import database
+    database.init_db()
+
+    conversation = database.create_conversation()
+    payload = "Pracoval jsem na několika zajímavých projektech s Pythonem a FastAPI. " * 2
+
+    single, _ = timed(lambda: [database.add_message(conversation.id, "user", payload) for _ in range(args.single)])
+    print(f"add_message x{args.single:<6}       {single * 1000:9.1f} ms  ({single / args.single * 1e6:7.1f} us/message)")
+
+    rows = [("user" if i % 2 else "assistant", payload) for i in range(args.messages)]
+    bulk, _ = timed(lambda: database.add_messages(conversation.id, rows))
+    print(f"add_messages x{args.messages:<6}     {bulk * 1000:9.1f} ms  ({bulk / args.messages * 1e6:7.1f} us/message)")
+
+    total = args.single + args.messages
+    full, messages = timed(lambda: database.get_messages(conversation.id)[-args.last:], args.repeat)
+    print(f"last {args.last} via full load ({total} rows) {full * 1000:7.2f} ms")
+
+    recent, latest = timed(lambda: database.get_recent_messages(conversation.id, args.last), args.repeat)
+    assert [m.id for m in latest] == [m.id for m in messages]
+    print(f"get_recent_messages({args.last}) indexed     {recent * 1000:7.2f} ms  ({full / recent:.0f}x)")
+
+    with database.engine.begin() as connection:
+        connection.execute(text("DROP INDEX ix_messages_conversation_timestamp"))
+    unindexed, _ = timed(lambda: database.get_recent_messages(conversation.id, args.last), args.repeat)
+    print(f"get_recent_messages({args.last}) no index    {unindexed * 1000:7.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+﻿"""Load test of the chat API against the fake model, at rising concurrency.
+
+The app is served by uvicorn on a loopback port from a thread of this
+process, with GeminiAPI talking to FaultyGenerativeModel instead of the
+network. Each virtual user opens a session with one of a few common
+opening questions, asks --turns follow-ups, then starts over, for
+--duration seconds per concurrency level. Per level it reports throughput,
+p50/p95/p99 latency (and time to first token with --stream), non-200
+responses, turns answered locally instead of by Gemini, the server's
+event-loop lag and RSS growth (of the whole process, client included).
+
+Per-session rate limits are lifted by default since every user asks back
+to back (set SESSION_RATE_PER_MINUTE to keep them).
+
+    python benchmarks/bench_load.py --levels 1,8,32,128 --duration 5
+    python benchmarks/bench_load.py --stream --error-rate 0.05
+    python benchmarks/bench_load.py --save benchmarks/results/load_baseline.json
+    python benchmarks/bench_load.py --compare benchmarks/results/load_baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import pathlib
+import random
+import resource
+import sys
+import socket
+import ssl
+import tempfile
+import threading
+import time
+import warnings
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.resolve()))
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(prefix="bench-load-"), "conversations.db"))
+os.environ.setdefault("SESSION_RATE_PER_MINUTE", "1000000")
+os.environ.setdefault("SESSION_BURST", "1000000")
+warnings.filterwarnings("ignore")
+
+import httpx
+import uvicorn
+
+import app.api.chat as chat
+from app.main import app
+from benchmarks.fake_llm import FaultyGenerativeModel
+
+FIRST_QUESTIONS = [
+    "Na jakých projektech jsi pracoval?",
+    "Jaké máš zkušenosti?",
+    "Kde jsi studoval?",
+    "Do you speak Czech?",
+]
+FOLLOW_UPS = [
+    "Řekni mi o tom víc.",
+    "Jaké technologie jsi tam používal?",
+    "Co bylo nejtěžší?",
+    "A co děláš teď?",
+    "Umíš React a Node.js?",
+]
+
+# Shared by all clients; building one per client costs ~40 ms of CPU each
+SSL_CONTEXT = ssl.create_default_context()
+
+# Metrics compared against a baseline, and whether lower is better
+METRICS = {
+    "rps": False, "p50_ms": True, "p95_ms": True, "p99_ms": True, "ttft_p50_ms": True, "errors": True,
+    "local": True, "loop_lag_p99_ms": True, "loop_lag_max_ms": True, "rss_growth_mb": True,
+}
+
+def rss_mb() -> float:
+    """Current resident set size (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+class LoopLagMonitor:
+    """Measures how late a loop wakes up a task that sleeps interval seconds"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, interval: float = 0.01):
+        self.loop = loop
+        self.interval = interval
+        self.lags = []
+        self._running = False
+
+    async def _run(self):
+        while self._running:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(time.perf_counter() - start - self.interval)
+
+    def start(self):
+        self.lags = []
+        self._running = True
+        asyncio.run_coroutine_threadsafe(self._run(), self.loop)
+
+    def stop(self):
+        self._running = False
+
+class BackgroundServer:
+    """uvicorn serving the app on a free loopback port, on its own thread and event loop"""
+
+    def __init__(self):
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            self.port = probe.getsockname()[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        config = uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning", lifespan="on")
+        self.server = uvicorn.Server(config)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_until_complete, args=(self.server.serve(),), daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+async def ask(client: httpx.AsyncClient, message: str, session_id, stream: bool):
+    """One chat turn; returns (status, session_id, latency, time to first token)"""
+    start = time.perf_counter()
+    payload = {"message": message, "session_id": session_id}
+    if not stream:
+        response = await client.post("/api/chat", json=payload)
+        elapsed = time.perf_counter() - start
+        if response.status_code != 200:
+            return response.status_code, session_id, elapsed, None
+        return 200, response.json()["session_id"], elapsed, None
+
+    first_token = None
+    async with client.stream("POST", "/api/chat/stream", json=payload) as response:
+        if response.status_code != 200:
+            await response.aread()
+            return response.status_code, session_id, time.perf_counter() - start, None
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: "):
+                if event == "session":
+                    session_id = json.loads(line[6:])["session_id"]
+                elif event == "token" and first_token is None:
+                    first_token = time.perf_counter() - start
+    return 200, session_id, time.perf_counter() - start, first_token
+
+async def user(base_url: str, deadline: float, args, rng: random.Random, samples):
+    # One client (connection) per user: a shared httpx pool is itself the
+    # bottleneck beyond a few dozen concurrent requests
+    async with httpx.AsyncClient(base_url=base_url, timeout=None, verify=SSL_CONTEXT) as client:
+        while time.perf_counter() < deadline:
+            session_id = None
+            for turn in range(args.turns + 1):
+                message = rng.choice(FIRST_QUESTIONS) if turn == 0 else rng.choice(FOLLOW_UPS)
+                status, session_id, latency, first_token = await ask(client, message, session_id, args.stream)
+                samples.append((status, latency, first_token))
+                if status != 200 or time.perf_counter() >= deadline:
+                    break
+
+async def local_answers(base_url: str) -> int:
+    async with httpx.AsyncClient(base_url=base_url, verify=SSL_CONTEXT) as client:
+        stats = (await client.get("/api/stats")).json()
+    return sum(stats["upstream"]["local_answers"].values())
+
+async def wait_ready(base_url: str, timeout: float = 60.0) -> None:
+    """Wait for startup warm-up, so the first level does not measure it"""
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=base_url, verify=SSL_CONTEXT) as client:
+        while (await client.get("/ready")).status_code != 200 and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+
+async def run_level(server: BackgroundServer, concurrency: int, args) -> dict:
+    samples = []
+    monitor = LoopLagMonitor(server.loop)
+    rss_before = rss_mb()
+    local_before = await local_answers(server.url)
+    monitor.start()
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(*(user(server.url, deadline, args, random.Random(args.seed + i), samples)
+                           for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    monitor.stop()
+
+    ok = [latency for status, latency, _ in samples if status == 200]
+    first_tokens = [first for status, _, first in samples if status == 200 and first is not None]
+    return {
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "rps": round(len(ok) / elapsed, 1),
+        "p50_ms": round(percentile(ok, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(ok, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(ok, 0.99) * 1000, 1),
+        "ttft_p50_ms": round(percentile(first_tokens, 0.50) * 1000, 1),
+        "errors": len(samples) - len(ok),
+        "local": await local_answers(server.url) - local_before,
+        "loop_lag_p99_ms": round(percentile(monitor.lags, 0.99) * 1000, 2),
+        "loop_lag_max_ms": round(max(monitor.lags, default=0.0) * 1000, 2),
+        "rss_mb": round(rss_mb(), 1),
+        "rss_growth_mb": round(rss_mb() - rss_before, 1),
+    }
+
+def print_table(rows):
+    columns = ["concurrency", "requests", "rps", "p50_ms", "p95_ms", "p99_ms", "ttft_p50_ms", "errors",
+               "local", "loop_lag_p99_ms", "loop_lag_max_ms", "rss_mb", "rss_growth_mb"]
+    print("  ".join(columns))
+    for row in rows:
+        print("  ".join(f"{row[c]:>{len(c)}}" for c in columns))
+
+def compare(rows, baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {row["concurrency"]: row for row in json.load(f)["levels"]}
+    print(f"\nchange vs {baseline_path} (+ is worse):")
+    for row in rows:
+        base = baseline.get(row["concurrency"])
+        if base is None:
+            continue
+        changes = []
+        for metric, lower_is_better in METRICS.items():
+            old, new = base.get(metric), row.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * (1 if lower_is_better else -1)
+            changes.append(f"{metric} {change:+.0%}")
+        print(f"  concurrency {row['concurrency']:>4}: " + ", ".join(changes))
+
+async def main_async(args):
+    model = FaultyGenerativeModel(mode="flaky" if args.error_rate else "ok", error_rate=args.error_rate,
+                                  latency=args.latency, per_token_latency=args.per_token_ms / 1000, seed=args.seed)
+    chat.gemini_api._build_model = lambda prompt: model
+
+    rows = []
+    with BackgroundServer() as server:
+        await wait_ready(server.url)
+        for level in args.levels:
+            rows.append(await run_level(server, level, args))
+            print(f"concurrency {level}: {rows[-1]['rps']} req/s, p95 {rows[-1]['p95_ms']} ms", file=sys.stderr)
+    return rows, model.calls
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=lambda s: [int(x) for x in s.split(",")], default=[1, 8, 32, 128],
+                        help="comma-separated concurrency levels (virtual users)")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per level")
+    parser.add_argument("--turns", type=int, default=3, help="follow-up questions per session")
+    parser.add_argument("--stream", action="store_true", help="use /api/chat/stream")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake upstream latency (s)")
+    parser.add_argument("--per-token-ms", type=float, default=0.0, help="fake prefill cost per input token (ms)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of upstream calls failing with 503")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="write the results as a baseline JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    args = parser.parse_args()
+
+    # The app logs every turn; keep the report readable
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w", encoding="utf-8")
+    try:
+        rows, calls = asyncio.run(main_async(args))
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    print_table(rows)
+    print(f"\n{sum(r['requests'] for r in rows)} requests, {calls} upstream calls")
+    if args.compare:
+        compare(rows, args.compare)
+    if args.save:
+        pathlib.Path(args.save).parent.mkdir(parents=True, exist_ok=True)
+        config = {k: v for k, v in vars(args).items() if k not in ("save", "compare")}
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"config": config, "python": sys.version.split()[0], "levels": rows}, f, indent=2)
+        print(f"saved baseline to {args.save}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+﻿"""Compare the old two-call chat turn with the single-call pre-configured model.
+
+The old flow started a chat on a bare model, set chat.system_instruction,
+sent a persona-priming message and only then the user's question. The new
+flow asks GeminiAPI for the persona's model (system instruction baked in)
+and sends the question once. Both run against FakeGenerativeModel.
+
+    python benchmarks/bench_priming.py --latency 0.05 --turns 50
+"""
+import argparse
+import pathlib
+import statistics
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.resolve()))
+
+from app.core.gemini_api import GeminiAPI
+from app.core.persona import PersonaStore
+from benchmarks.fake_llm import FakeGenerativeModel
+
+INIT_MESSAGE = "Od teď jsi Jan Novák a budeš mluvit v první osobě jako bys byl skutečně on, ne jako asistent."
+
+class FakeGeminiAPI(GeminiAPI):
+    def __init__(self, latency: float):
+        super().__init__(api_key="benchmark")
+        self.latency = latency
+
+    def _build_model(self, system_prompt: str):
+        return FakeGenerativeModel(latency=self.latency, system_instruction=system_prompt)
+
+def two_call_turn(model: FakeGenerativeModel, prompt: str, message: str) -> str:
+    chat = model.start_chat(history=None)
+    chat.system_instruction = prompt
+    chat.send_message(INIT_MESSAGE)
+    return chat.send_message(message).text
+
+def summarize(name: str, samples: list, calls: int) -> None:
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{name:<22} mean {statistics.mean(samples) * 1000:7.1f} ms   p95 {p95 * 1000:7.1f} ms   upstream calls/turn {calls / len(samples):.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake upstream latency per call (s)")
+    parser.add_argument("--turns", type=int, default=50)
+    args = parser.parse_args()
+
+    api = FakeGeminiAPI(args.latency)
+    persona = PersonaStore(compile_prompt=api.get_system_prompt).current()
+    message = "Na jakých projektech jsi pracoval?"
+
+    legacy_model = FakeGenerativeModel(latency=args.latency)
+    legacy = []
+    for _ in range(args.turns):
+        start = time.perf_counter()
+        two_call_turn(legacy_model, persona.prompt, message)
+        legacy.append(time.perf_counter() - start)
+
+    single = []
+    for _ in range(args.turns):
+        start = time.perf_counter()
+        api.generate_response(message, None, persona)
+        single.append(time.perf_counter() - start)
+
+    summarize("two-call (priming)", legacy, legacy_model.calls)
+    summarize("single-call (baked)", single, api.get_model(persona).calls)
+    print(f"speedup {statistics.mean(legacy) / statistics.mean(single):.2f}x")
+    api.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+﻿"""Retry, deadline and circuit-breaker behaviour against a fault-injecting fake model.
+
+Opening questions go through the real /api/chat route (in process, over
+ASGI) while FaultyGenerativeModel injects faults:
+
+  flaky    a share of calls fails with 503; answered by Gemini with and without retries
+  hang     upstream hangs and ignores its request timeout; time until the caller gets an answer
+  outage   upstream is down, then recovers; the breaker opens, answers locally, probes and closes
+
+Then it checks the policy step by step (fixed thresholds, no randomness)
+and exits non-zero if any check fails: a failed call is retried up to
+`attempts` times, the breaker opens after its failure threshold, answers
+locally without calling upstream while open, lets a single probe through
+after the reset timeout, and closes when the probe succeeds.
+
+    python benchmarks/bench_resilience.py --error-rate 0.3
+    python benchmarks/bench_resilience.py --checks-only
+"""
+import argparse
+import asyncio
+import os
+import pathlib
+import statistics
+import sys
+import time
+import warnings
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.resolve()))
+os.environ.setdefault("PERSIST_MESSAGES", "false")
+warnings.filterwarnings("ignore")
+
+import httpx
+
+import app.api.chat as chat
+from app.core.gemini_api import FALLBACK_RESPONSE
+from app.core.resilience import CircuitBreaker, RetryPolicy
+from benchmarks.fake_llm import FaultyGenerativeModel, DEFAULT_REPLY
+
+QUESTION = "Na jakých projektech jsi pracoval? ({i})"
+
+def install(model: FaultyGenerativeModel, policy: RetryPolicy) -> None:
+    chat.gemini_api._build_model = lambda prompt: model
+    chat.gemini_api._models = {}
+    chat.gemini_api.retry_policy = policy
+
+async def ask(client: httpx.AsyncClient, i: int):
+    start = time.perf_counter()
+    response = await client.post("/api/chat", json={"message": QUESTION.format(i=i)})
+    return time.perf_counter() - start, response.json()["response"]
+
+async def burst(count: int, concurrency: int, offset: int = 0):
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=chat_app()), base_url="http://bench") as client:
+        async def one(i):
+            async with semaphore:
+                return await ask(client, offset + i)
+        return await asyncio.gather(*(one(i) for i in range(count)))
+
+def chat_app():
+    from app.main import app
+    return app
+
+def upstream_reply() -> str:
+    return chat.gemini_api.get_rewrite_rules(chat.persona_store.current()).rewrite(DEFAULT_REPLY)
+
+def summary(results):
+    latencies = sorted(latency for latency, _ in results)
+    reply = upstream_reply()
+    upstream = sum(1 for _, text in results if text == reply)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    return f"{upstream / len(results):6.1%} from Gemini  p50 {statistics.median(latencies) * 1000:7.1f} ms  p95 {p95 * 1000:7.1f} ms"
+
+async def flaky(args):
+    print(f"flaky: {args.error_rate:.0%} of upstream calls fail, {args.requests} questions")
+    for attempts in (1, 3):
+        model = FaultyGenerativeModel(mode="flaky", error_rate=args.error_rate, latency=args.latency)
+        policy = RetryPolicy(CircuitBreaker(failure_threshold=args.threshold, reset_timeout=1.0), attempts=attempts,
+                             timeout=2.0, deadline=5.0, base_delay=0.02, max_delay=0.2)
+        install(model, policy)
+        results = await burst(args.requests, args.concurrency, offset=attempts * 10000)
+        print(f"  attempts={attempts}: {summary(results)}  upstream calls {model.calls}, breaker opened {policy.breaker.opened}x")
+
+async def hang(args):
+    print(f"hang: upstream never answers and ignores its timeout; deadline {args.timeout}s per attempt")
+    model = FaultyGenerativeModel(mode="hang", hang=args.timeout * 4, honour_timeout=False, latency=args.latency)
+    policy = RetryPolicy(CircuitBreaker(failure_threshold=args.threshold, reset_timeout=60.0), attempts=2,
+                         timeout=args.timeout, deadline=args.timeout * 2.5, base_delay=0.05, max_delay=0.1)
+    install(model, policy)
+    results = await burst(args.concurrency, args.concurrency, offset=60000)
+    print(f"  first wave ({len(results)} concurrent): {summary(results)}  breaker {policy.breaker.state}")
+    results = await burst(args.requests, args.concurrency, offset=70000)
+    print(f"  while open ({len(results)} questions): {summary(results)}  short-circuited {policy.breaker.short_circuited}, upstream calls {model.calls}")
+
+async def outage(args):
+    print("outage: upstream down, then back up")
+    model = FaultyGenerativeModel(mode="down", latency=args.latency)
+    policy = RetryPolicy(CircuitBreaker(failure_threshold=args.threshold, reset_timeout=0.5), attempts=2,
+                         timeout=2.0, deadline=5.0, base_delay=0.01, max_delay=0.05)
+    install(model, policy)
+    results = await burst(args.requests, 1, offset=40000)
+    print(f"  down: {summary(results)}  upstream calls {model.calls} for {args.requests} questions, breaker {policy.breaker.state}")
+    model.mode = "ok"
+    await asyncio.sleep(0.6)
+    results = await burst(args.requests, 1, offset=50000)
+    print(f"  recovered after reset timeout: {summary(results)}  breaker {policy.breaker.state}")
+    print(f"  stats: {policy.stats()}")
+
+async def checks() -> list:
+    """Deterministic checks of the retry and breaker policy; returns the failures"""
+    failures = []
+
+    def expect(condition: bool, message: str) -> None:
+        print(f"  {'ok  ' if condition else 'FAIL'} {message}")
+        if not condition:
+            failures.append(message)
+
+    def local(text: str) -> bool:
+        return text not in (upstream_reply(), FALLBACK_RESPONSE)
+
+    print("checks:")
+    threshold, reset = 3, 0.5
+    model = FaultyGenerativeModel(mode="down", latency=0.01)
+    install(model, RetryPolicy(CircuitBreaker(failure_threshold=100, reset_timeout=reset), attempts=3,
+                               timeout=2.0, deadline=5.0, base_delay=0.01, max_delay=0.02))
+    (_, text), = await burst(1, 1, offset=80000)
+    expect(model.calls == 3 and local(text), f"a failing call is tried 3 times, then answered locally (calls {model.calls})")
+
+    model = FaultyGenerativeModel(mode="down", latency=0.01)
+    policy = RetryPolicy(CircuitBreaker(failure_threshold=threshold, reset_timeout=reset), attempts=1,
+                         timeout=2.0, deadline=5.0, base_delay=0.01, max_delay=0.02)
+    breaker = policy.breaker
+    install(model, policy)
+    await burst(threshold - 1, 1, offset=81000)
+    expect(breaker.state == "closed", f"closed after {threshold - 1} failures (state {breaker.state})")
+    await burst(1, 1, offset=82000)
+    expect(breaker.state == "open" and breaker.opened == 1, f"open after {threshold} failures (state {breaker.state})")
+
+    calls = model.calls
+    results = await burst(5, 1, offset=83000)
+    expect(model.calls == calls, f"no upstream calls while open ({model.calls - calls} made)")
+    expect(all(local(text) for _, text in results), "questions asked while open get a local answer")
+    expect(breaker.short_circuited >= 5, f"open breaker short-circuits ({breaker.short_circuited} refused)")
+
+    # Upstream is back but slow, so the probe is still in flight while the others ask
+    model.mode, model.latency = "ok", 0.3
+    await asyncio.sleep(reset + 0.05)
+    expect(breaker.state == "half_open", f"half-open after the reset timeout (state {breaker.state})")
+    calls = model.calls
+    results = await burst(8, 8, offset=84000)
+    expect(model.calls == calls + 1, f"a single probe goes upstream after the reset timeout ({model.calls - calls} calls)")
+    expect(sum(1 for _, text in results if text == upstream_reply()) == 1
+           and sum(1 for _, text in results if local(text)) == 7, "the probe is answered by Gemini, the rest locally")
+    expect(breaker.state == "closed", f"a successful probe closes the breaker (state {breaker.state})")
+
+    calls = model.calls
+    results = await burst(3, 1, offset=85000)
+    expect(model.calls == calls + 3 and all(text == upstream_reply() for _, text in results),
+           "calls go upstream again once closed")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.02, help="fake upstream latency (s)")
+    parser.add_argument("--error-rate", type=float, default=0.3)
+    parser.add_argument("--timeout", type=float, default=0.3, help="per-attempt deadline in the hang scenario (s)")
+    parser.add_argument("--threshold", type=int, default=5, help="consecutive failures that open the breaker")
+    parser.add_argument("--checks-only", action="store_true", help="skip the timed scenarios")
+    args = parser.parse_args()
+
+    async def run():
+        # ASGITransport does not run the app lifespan, so warm up here
+        chat.warm_up.start()
+        await chat.warm_up.wait(60)
+        if not args.checks_only:
+            await flaky(args)
+            await hang(args)
+            await outage(args)
+        return await checks()
+    failures = asyncio.run(run())
+    if failures:
+        print(f"FAILED: {len(failures)} check(s)")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+﻿"""Prompt size and latency with retrieved sections vs the full persona dump.
+
+Each question is answered twice through GeminiAPI against the fake model:
+once with the whole persona in the system prompt, once with the basics-only
+prompt plus the top-k retrieved sections. The fake charges a per-token
+prefill cost, so input size shows up in latency. --scale repeats every
+persona section N times to model a bigger portfolio.
+
+    python benchmarks/bench_retrieval.py --scale 10 --per-token-ms 0.02
+"""
+import argparse
+import copy
+import json
+import pathlib
+import statistics
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.resolve()))
+
+from app.core.config import PERSONAL_DATA_PATH
+from app.core.gemini_api import GeminiAPI
+from app.core.history import estimate_tokens
+from app.core.persona import PersonaSnapshot
+from benchmarks.fake_llm import FakeGenerativeModel
+
+QUESTIONS = [
+    "Kde jsi studoval?",
+    "Na jakých projektech jsi pracoval?",
+    "Jaké máš zkušenosti?",
+    "Umíš React a Node.js?",
+    "Do you speak Czech?",
+    "Děláš na volné noze?",
+    "What are your core skills?",
+    "Co jsi dělal ve WebStudio Praha?",
+]
+
+class FakeGeminiAPI(GeminiAPI):
+    def __init__(self, retrieval: bool, latency: float, per_token_latency: float):
+        super().__init__(api_key="benchmark", retrieval=retrieval)
+        self.latency = latency
+        self.per_token_latency = per_token_latency
+
+    def _build_model(self, system_prompt: str):
+        return FakeGenerativeModel(latency=self.latency, system_instruction=system_prompt,
+                                   per_token_latency=self.per_token_latency)
+
+def scaled(data, scale):
+    data = copy.deepcopy(data)
+    for key in ("skills", "projects", "experience", "education", "faq"):
+        items = data.get(key, [])
+        data[key] = [dict(item, name=f"{item.get('name', '')} {i}") if i else item for i in range(scale) for item in items]
+    return data
+
+def run(api: GeminiAPI, data, repeat: int):
+    persona = PersonaSnapshot(version="bench", data=data, prompt=api.get_system_prompt(data), prompt_tokens=0,
+                              index=api.build_index(data))
+    tokens, latencies = [], []
+    for question in QUESTIONS:
+        tokens.append(estimate_tokens(persona.prompt) + estimate_tokens(api.compose_message(question, persona)))
+        for _ in range(repeat):
+            start = time.perf_counter()
+            api.generate_response(question, None, persona)
+            latencies.append(time.perf_counter() - start)
+    return tokens, latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=1, help="repeat each persona section N times")
+    parser.add_argument("--latency", type=float, default=0.05, help="fixed fake upstream latency (s)")
+    parser.add_argument("--per-token-ms", type=float, default=0.02, help="fake prefill cost per input token (ms)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with open(PERSONAL_DATA_PATH, encoding="utf-8") as f:
+        data = scaled(json.load(f), args.scale)
+
+    results = {}
+    for name, retrieval in (("full dump", False), ("retrieval", True)):
+        api = FakeGeminiAPI(retrieval, args.latency, args.per_token_ms / 1000)
+        results[name] = run(api, data, args.repeat)
+        api.shutdown()
+
+    for name, (tokens, latencies) in results.items():
+        print(f"{name:<10} input tokens mean {statistics.mean(tokens):7.0f} (max {max(tokens):6d})   "
+              f"latency mean {statistics.mean(latencies) * 1000:7.1f} ms")
+
+if __name__ == "__main__":
+    main()
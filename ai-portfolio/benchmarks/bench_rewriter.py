@@ -0,0 +1,136 @@
+﻿"""Throughput of the persona rewrite on long replies.
+
+Compares the old chain of str.replace calls with the compiled single-pass
+RewriteRules, one-shot and fed in streamed chunks, on two kinds of reply:
+one dense with third-person references (every sentence needs the full
+regex scan) and a typical first-person reply with none, which the
+substring prefilter passes through. The chain is fast C code but copies
+the reply once per rule and matches inside words and URLs; the report
+also counts how many spans each approach changed that it must not (URLs,
+code, words containing a rule as a substring). Then it checks the rewrite
+of fixed sentences (hosts and paths left alone, possessives, prepositions
+of removed words, the name as a subject), one-shot and streamed, and exits
+non-zero if one fails.
+
+    python benchmarks/bench_rewriter.py --kb 4 64
+    python benchmarks/bench_rewriter.py --checks-only
+"""
+import argparse
+import pathlib
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.resolve()))
+
+from app.core.rewriter import RewriteRules
+
+# The rules generate_response used to apply one after another
+CHAINED_REPLACEMENTS = [
+    ("Jan Novák", "Já"),
+    ("Jana Nováka", "mě"),
+    ("Janu Novákovi", "mně"),
+    ("Janem Novákem", "mnou"),
+    ("portfoliu", "profilu"),
+    ("portfolio", "profil"),
+    ("asistent", ""),
+    ("digitální reprezentace", ""),
+]
+
+PARAGRAPH = (
+    "Jan Novák je full stack vývojář z Prahy. S Janem Novákem se dobře spolupracuje a o Janu Novákovi "
+    "kolegové říkají, že je spolehlivý. Jeho portfolio najdeš na https://jannovak.com/portfolio a v portfoliu "
+    "jsou projekty jako `portfolio-app` nebo asistentka pro e-shop. Bez Jana Nováka by projekt nevznikl. "
+    "Jsem AI asistent a digitální reprezentace, ale ptej se klidně na cokoli.\n"
+)
+# What the model usually writes: already in the first person
+FIRST_PERSON = (
+    "Pracoval jsem na několika zajímavých projektech. Nejvíc jsem pyšný na webovou aplikaci, "
+    "kde jsem vytvořil animovaného avatara, který mluví a odpovídá na otázky. Kód najdeš na "
+    "https://github.com/example a rád ti o něm řeknu víc, jestli tě zajímá. Baví mě `FastAPI` i React.\n"
+)
+
+CHUNK = 16
+
+# Reply -> expected rewrite
+CHECKS = [
+    ("Kód je na github.com/jannovak/portfolio-app.", "Kód je na github.com/jannovak/portfolio-app."),
+    ("Zdroják: github.com/jan/asistent", "Zdroják: github.com/jan/asistent"),
+    ("Mrkni na portfolio.example.com a ai-portfolio.", "Mrkni na portfolio.example.com a ai-portfolio."),
+    ("Hledej example.com/?q=portfolio nebo napiš na novak@portfolio.cz.",
+     "Hledej example.com/?q=portfolio nebo napiš na novak@portfolio.cz."),
+    ("Portfolio Jana Nováka je skvělé.", "Můj profil je skvělý."),
+    ("Najdeš to v portfoliu Jana Nováka.", "Najdeš to v mém profilu."),
+    ("Projekty Jana Nováka jsou zajímavé.", "Moje projekty jsou zajímavé."),
+    ("Mluvil jsem s asistentem.", "Mluvil jsem."),
+    ("Zeptej se asistenta.", "Zeptej se."),
+    ("Jan Novák se věnuje AI.", "Já se věnuji AI."),
+    ("Jan Novák se věnoval AI.", "Já jsem se věnoval AI."),
+    ("Jsem AI asistent Jana Nováka.", "Jsem Jan Novák."),
+]
+
+def chained(text: str) -> str:
+    for old, new in CHAINED_REPLACEMENTS:
+        text = text.replace(old, new)
+    return text
+
+def streamed(rules: RewriteRules, text: str, chunk: int = CHUNK) -> str:
+    rewriter = rules.stream()
+    out = [rewriter.feed(text[i:i + chunk]) for i in range(0, len(text), chunk)]
+    out.append(rewriter.flush())
+    return "".join(out)
+
+def measure(fn, text: str, seconds: float = 0.5):
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        fn(text)
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return len(text) * runs / elapsed / 1e6
+
+def checks(rules: RewriteRules) -> list:
+    """Fixed sentences rewritten one-shot and streamed in every chunk size; returns the failures"""
+    failures = []
+    print("checks:")
+    for reply, expected in CHECKS:
+        rewritten = rules.rewrite(reply)
+        ok = rewritten == expected and all(streamed(rules, reply, size) == expected for size in range(1, len(reply) + 1))
+        print(f"  {'ok  ' if ok else 'FAIL'} {reply!r} -> {rewritten!r}")
+        if not ok:
+            failures.append(reply)
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kb", type=int, nargs="+", default=[4, 64], help="reply sizes in kilobytes")
+    parser.add_argument("--checks-only", action="store_true", help="skip the throughput runs")
+    args = parser.parse_args()
+
+    rules = RewriteRules("Jan Novák")
+    if not args.checks_only:
+        throughput(rules, args)
+    failures = checks(rules)
+    if failures:
+        print(f"FAILED: {len(failures)} check(s)")
+    sys.exit(1 if failures else 0)
+
+def throughput(rules: RewriteRules, args):
+    paragraph = rules.rewrite(PARAGRAPH)
+    print("one paragraph:")
+    print("  chained:", chained(PARAGRAPH).strip())
+    print("  compiled:", paragraph.strip())
+    damaged = sum(1 for probe in ("jannovak.com/portfolio", "`portfolio-app`", "asistentka") if probe not in chained(PARAGRAPH))
+    print(f"  protected spans damaged by the chain: {damaged} of 3, by the compiled rules: "
+          f"{sum(1 for probe in ('jannovak.com/portfolio', '`portfolio-app`', 'asistentka') if probe not in paragraph)} of 3")
+
+    for kind, unit in (("dense", PARAGRAPH), ("typical", FIRST_PERSON)):
+        for kb in args.kb:
+            text = unit * max(1, kb * 1024 // len(unit))
+            assert streamed(rules, text) == rules.rewrite(text)
+            print(f"{kind:>7} {kb:>4} KB   chained {measure(chained, text):6.1f} MB/s   "
+                  f"compiled {measure(rules.rewrite, text):6.1f} MB/s   "
+                  f"streamed ({CHUNK}-char chunks) {measure(lambda t: streamed(rules, t), text):6.1f} MB/s")
+
+if __name__ == "__main__":
+    main()
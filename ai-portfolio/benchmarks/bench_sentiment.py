@@ -0,0 +1,83 @@
+﻿"""Lexicon sentiment scorer vs the old substring test.
+
+Scores a synthetic corpus of Czech and English replies with the old
+detect_sentiment (any of a list of substrings anywhere -> negative), the
+new per-reply scorer and its batch mode, and reports throughput plus the
+accuracy of both on a small hand-labelled set.
+
+    python benchmarks/bench_sentiment.py --replies 20000
+"""
+import argparse
+import pathlib
+import random
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.resolve()))
+
+from app.core.sentiment import sentiment_scorer
+
+LABELLED = [
+    ("Rád ti o svých projektech řeknu víc, jsou opravdu zajímavé!", "positive"),
+    ("Ahoj! Jsem Jan. Rád tě poznávám!", "positive"),
+    ("Nejvíc mě baví práce s umělou inteligencí.", "positive"),
+    ("To není špatná otázka, jsem na ten projekt pyšný.", "positive"),
+    ("I really enjoyed building that app, it was a great success.", "positive"),
+    ("Promiň, ale narazil jsem na problém. Můžeš to zkusit znovu?", "negative"),
+    ("Bohužel na tohle ti odpovědět nemohu.", "negative"),
+    ("Sorry, I cannot share that, unfortunately.", "negative"),
+    ("Ten projekt nebyl úspěšný, bylo to těžké.", "negative"),
+    ("Pracuji jako full stack vývojář v Praze.", "neutral"),
+    ("Studoval jsem informatiku na ČVUT.", "neutral"),
+    ("Používám Python, React a Node.js.", "neutral"),
+    ("Nejdřív jsem dělal frontend, potom backend.", "neutral"),
+    ("Moje nejnovější aplikace je na GitHubu.", "neutral"),
+]
+
+FRAGMENTS = [text for text, _ in LABELLED] + [
+    "Nedávno jsem dokončil nový e-shop pro klienta.",
+    "Ve volném čase se věnuji open source projektům.",
+    "Projekt jsme nasadili na Google Cloud a používá Kubernetes.",
+    "My main stack is FastAPI with a React frontend.",
+]
+
+def old_detect_sentiment(response_text: str) -> str:
+    # The substring test generate_response used before the lexicon scorer
+    sentiment = "positive"
+    if any(word in response_text.lower() for word in ["sorry", "unfortunately", "can't", "cannot", "don't", "not", "omlouvám", "bohužel", "nemohu", "nemůžu", "ne"]):
+        sentiment = "negative"
+    return sentiment
+
+def corpus(size: int, seed: int = 1):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(2, 8))) for _ in range(size)]
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replies", type=int, default=20000)
+    args = parser.parse_args()
+
+    replies = corpus(args.replies)
+    chars = sum(len(reply) for reply in replies)
+    old, old_time = timed(lambda: [old_detect_sentiment(reply) for reply in replies])
+    single, single_time = timed(lambda: [sentiment_scorer.score(reply) for reply in replies])
+    batch, batch_time = timed(lambda: sentiment_scorer.score_batch(replies))
+    assert batch == single
+
+    print(f"{len(replies)} replies, {chars / 1e6:.1f} MB")
+    for name, elapsed in (("old substring test", old_time), ("lexicon score()", single_time), ("lexicon score_batch()", batch_time)):
+        print(f"  {name:<22} {elapsed * 1000:8.1f} ms   {len(replies) / elapsed:10.0f} replies/s")
+    print(f"  old labelled {sum(label == 'negative' for label in old) / len(old):.0%} of the corpus negative, "
+          f"the lexicon {sum(s.label == 'negative' for s in single) / len(single):.0%}")
+
+    old_hits = sum(old_detect_sentiment(text) == label for text, label in LABELLED)
+    new_hits = sum(sentiment_scorer.score(text).label == label for text, label in LABELLED)
+    print(f"hand-labelled accuracy: old {old_hits}/{len(LABELLED)}, lexicon {new_hits}/{len(LABELLED)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+﻿"""Import time and time to first request of the app.
+
+  import   `import app.main` in a fresh interpreter, --repeat times; the
+           slowest imports are listed from -X importtime
+  serve    uvicorn started as a subprocess: time until the first successful
+           GET / (the server is accepting and serving) and until /ready is 200
+           (startup warm-up done), with the warm-up step timings
+
+Both run against a throwaway database. Then it checks that a warm-up
+step which fails at first is retried and the app becomes ready once it
+succeeds, and exits non-zero if that check fails.
+
+    python benchmarks/bench_startup.py --repeat 5
+    python benchmarks/bench_startup.py --checks-only
+"""
+import argparse
+import asyncio
+import json
+import os
+import pathlib
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = pathlib.Path(__file__).parent.parent.resolve()
+sys.path.insert(0, str(ROOT))
+
+from app.core.warmup import WarmUp
+
+def environment(workdir: str) -> dict:
+    env = dict(os.environ, DB_PATH=os.path.join(workdir, "conversations.db"), PYTHONWARNINGS="ignore")
+    env.setdefault("GEMINI_API_KEY", "benchmark")
+    return env
+
+def import_times(env: dict, repeat: int):
+    """Wall time of `import app.main` per run, and the slowest imports of the last run"""
+    code = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+    times = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True)
+        times.append(float(result.stdout.strip().splitlines()[-1]))
+
+    # "import time: self | cumulative | name", nesting shown by indentation of name
+    modules = []
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line and "cumulative" not in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if len(name) - len(name.lstrip()) <= 3:
+                modules.append((int(cumulative) / 1e6, name.strip()))
+    return times, sorted(modules, reverse=True)
+
+def get(url: str):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+    except OSError:
+        return None, b""
+
+def serve_times(env: dict, timeout: float):
+    """Seconds from spawning uvicorn to the first 200 on / and on /ready"""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    first_page = ready = None
+    steps = {}
+    try:
+        while time.perf_counter() - start < timeout and ready is None:
+            if first_page is None and get(base + "/")[0] == 200:
+                first_page = time.perf_counter() - start
+            if first_page is not None:
+                status, body = get(base + "/ready")
+                # An app without /ready is ready once it serves pages
+                if status == 200 or status == 404:
+                    ready = time.perf_counter() - start
+                    steps = json.loads(body).get("steps", {}) if status == 200 else {}
+            time.sleep(0.005)
+    finally:
+        server.terminate()
+        server.wait()
+    return first_page, ready, steps
+
+async def checks() -> list:
+    """Deterministic checks of the warm-up retry; returns the failures"""
+    failures = []
+
+    def expect(condition: bool, message: str) -> None:
+        print(f"  {'ok  ' if condition else 'FAIL'} {message}")
+        if not condition:
+            failures.append(message)
+
+    print("checks:")
+    warm_up = WarmUp(retry_seconds=0.05, max_retry_seconds=0.1)
+    calls = {"database": 0, "persona": 0}
+
+    @warm_up.step("database")
+    def database():
+        calls["database"] += 1
+        if calls["database"] <= 2:
+            raise RuntimeError("table messages already exists")
+
+    @warm_up.step("persona")
+    def persona():
+        calls["persona"] += 1
+
+    warm_up.start()
+    expect(not await warm_up.wait(1.0), "wait() returns False while a step is failing")
+    status = warm_up.status()
+    expect(not status["ready"] and "database" in status.get("error", ""),
+           f"the failure is reported (ready {status['ready']}, error {status.get('error')!r})")
+    expect(calls["persona"] == 0, "later steps wait for the failing one")
+    await asyncio.sleep(0.3)
+    expect(await warm_up.wait(1.0), "ready once a retry succeeds")
+    status = warm_up.status()
+    expect("error" not in status and status.get("failures") == {"database": 2},
+           f"the error is cleared and the failures counted ({status})")
+    expect(calls == {"database": 3, "persona": 1}, f"each step succeeds exactly once ({calls})")
+    await warm_up.stop()
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8, help="slowest top-level imports to list")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--checks-only", action="store_true", help="skip the timings")
+    args = parser.parse_args()
+
+    if not args.checks_only:
+        timings(args)
+    failures = asyncio.run(checks())
+    if failures:
+        print(f"FAILED: {len(failures)} check(s)")
+    sys.exit(1 if failures else 0)
+
+def timings(args):
+    workdir = tempfile.mkdtemp(prefix="bench-startup-")
+    env = environment(workdir)
+
+    times, modules = import_times(env, args.repeat)
+    print(f"import app.main: median {statistics.median(times) * 1000:.0f} ms, min {min(times) * 1000:.0f} ms ({args.repeat} runs)")
+    for seconds, name in modules[:args.top]:
+        print(f"  {seconds * 1000:7.0f} ms  {name}")
+
+    first_pages, readies = [], []
+    for _ in range(args.repeat):
+        first_page, ready, steps = serve_times(env, args.timeout)
+        first_pages.append(first_page)
+        readies.append(ready)
+    print(f"uvicorn start -> first page: median {statistics.median(first_pages) * 1000:.0f} ms")
+    print(f"uvicorn start -> ready:      median {statistics.median(readies) * 1000:.0f} ms")
+    if steps:
+        print("  warm-up steps: " + ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in steps.items()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+﻿"""One conversation spread across uvicorn worker processes, per session backend.
+
+This is the check that a session keeps working when its turns land on
+different workers. For each backend in --backends (SESSION_BACKEND:
+"memory" is the per-process default, "sqlite" the shared store) it starts
+`uvicorn benchmarks.fake_app:app` with that SESSION_BACKEND in its
+environment, once with 1 worker and once with --workers, against a
+throwaway database. It then runs --sessions conversations of --turns
+turns each, with --concurrency of them at a time, opening a new
+connection for every request so consecutive turns land on whichever
+worker accepts them.
+
+A turn continues its conversation when it keeps the session_id and sees all
+earlier messages (usage.history_messages grows by two per turn). Per
+configuration it reports how many conversations stayed intact, how many
+were served by more than one worker, and throughput. Exits non-zero if the
+shared (sqlite) backend lost a conversation. The memory backend is
+expected to lose most conversations once there are several workers; a
+multi-worker deployment runs with the shared store, e.g.
+`SESSION_BACKEND=sqlite uvicorn app.main:app --workers 4`.
+
+    python benchmarks/bench_workers.py --workers 4
+    python benchmarks/bench_workers.py --backends sqlite --workers 8 --sessions 100
+"""
+import argparse
+import asyncio
+import os
+import pathlib
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = pathlib.Path(__file__).parent.parent.resolve()
+
+QUESTIONS = ["Na jakých projektech jsi pracoval?", "Řekni mi o tom víc.", "Jaké technologie jsi používal?",
+             "Co bylo nejtěžší?", "A co děláš teď?", "Umíš React?"]
+
+def start_server(backend: str, workers: int, latency: float):
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    env = dict(os.environ, SESSION_BACKEND=backend, FAKE_LATENCY=str(latency), PYTHONWARNINGS="ignore",
+               DB_PATH=os.path.join(tempfile.mkdtemp(prefix="bench-workers-"), "conversations.db"),
+               SESSION_RATE_PER_MINUTE="1000000", SESSION_BURST="1000000", LOG_LEVEL="WARNING")
+    env.setdefault("GEMINI_API_KEY", "benchmark")
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "benchmarks.fake_app:app", "--port", str(port),
+                               "--workers", str(workers), "--log-level", "warning"],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return server, f"http://127.0.0.1:{port}"
+
+async def wait_ready(base_url: str, workers: int, timeout: float = 60.0) -> None:
+    """Wait until /ready has answered 200 from every worker; raises if some never do"""
+    ready = set()
+    deadline = time.perf_counter() + timeout
+    while len(ready) < workers and time.perf_counter() < deadline:
+        try:
+            async with httpx.AsyncClient(base_url=base_url, verify=False) as client:
+                response = await client.get("/ready")
+            if response.status_code == 200:
+                ready.add(response.headers["x-worker-pid"])
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.02)
+    if len(ready) < workers:
+        raise RuntimeError(f"only {len(ready)}/{workers} workers became ready within {timeout:.0f}s")
+
+async def conversation(base_url: str, turns: int, index: int):
+    """Returns (intact, worker pids that served it, turns answered)"""
+    session_id = None
+    pids = set()
+    intact = True
+    for turn in range(turns):
+        # A fresh connection per turn, so the kernel picks the worker every time. The server is
+        # plain http; verify=False spares loading the CA bundle (~50 ms of CPU) per client
+        async with httpx.AsyncClient(base_url=base_url, timeout=30, verify=False) as client:
+            response = await client.post("/api/chat", json={
+                "message": f"{QUESTIONS[turn % len(QUESTIONS)]} ({index})", "session_id": session_id})
+        if response.status_code != 200:
+            return False, pids, turn
+        pids.add(response.headers["x-worker-pid"])
+        body = response.json()
+        # Welcome message plus two messages per earlier turn
+        if (session_id is not None and body["session_id"] != session_id) or \
+                body["usage"]["history_messages"] != 1 + 2 * turn:
+            intact = False
+        session_id = body["session_id"]
+    return intact, pids, turns
+
+async def run(backend: str, workers: int, args) -> dict:
+    server, base_url = start_server(backend, workers, args.latency)
+    try:
+        await wait_ready(base_url, workers)
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def one(i):
+            async with semaphore:
+                return await conversation(base_url, args.turns, i)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one(i) for i in range(args.sessions)))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+    return {
+        "intact": sum(1 for intact, _, _ in results if intact),
+        "spread": sum(1 for _, pids, _ in results if len(pids) > 1),
+        "workers_used": len(set().union(*(pids for _, pids, _ in results))),
+        "turns_per_s": round(sum(turns for _, _, turns in results) / elapsed, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--sessions", type=int, default=40)
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.02, help="fake upstream latency (s)")
+    parser.add_argument("--backends", default="memory,sqlite", help="comma-separated SESSION_BACKEND values to run")
+    args = parser.parse_args()
+
+    backends = args.backends.split(",")
+    failed = False
+    for backend, workers in [(backend, 1) for backend in backends] + [(backend, args.workers) for backend in backends]:
+        result = asyncio.run(run(backend, workers, args))
+        print(f"{backend:>6} x{workers}: {result['intact']:3d}/{args.sessions} conversations intact, "
+              f"{result['spread']:3d} served by several workers ({result['workers_used']} used), "
+              f"{result['turns_per_s']:7.1f} turns/s")
+        if backend == "sqlite" and result["intact"] < args.sessions:
+            failed = True
+    if failed:
+        print("FAILED: the shared backend lost conversations")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+﻿"""The app with GeminiAPI talking to FakeGenerativeModel, for serving from uvicorn workers.
+
+Every worker process imports this module, so each gets the fake model.
+Responses carry the serving process ID in an X-Worker-Pid header.
+FAKE_LATENCY sets the fake upstream latency (seconds).
+
+    uvicorn benchmarks.fake_app:app --workers 4
+"""
+import os
+
+import app.api.chat as chat
+from app.main import app
+from benchmarks.fake_llm import FakeGenerativeModel
+
+model = FakeGenerativeModel(latency=float(os.getenv("FAKE_LATENCY", 0.02)))
+chat.gemini_api._build_model = lambda prompt: model
+
+@app.middleware("http")
+async def worker_pid(request, call_next):
+    response = await call_next(request)
+    response.headers["X-Worker-Pid"] = str(os.getpid())
+    return response
@@ -0,0 +1,108 @@
+﻿"""In-process stand-in for the Gemini SDK used by the benchmarks.
+
+FakeGenerativeModel mimics the parts of google.generativeai.GenerativeModel
+that GeminiAPI touches (start_chat / send_message, optionally streamed),
+sleeping for a configurable latency instead of calling the network. With
+per_token_latency the delay also grows with the input size (system
+instruction + history + message), like prompt processing upstream.
+FaultyGenerativeModel adds injected errors and hangs for testing the retry
+and circuit-breaker policy.
+"""
+import random
+import time
+from google.api_core import exceptions as google_exceptions
+from app.core.history import estimate_tokens
+from typing import Any, Dict, List, Optional
+
+DEFAULT_REPLY = (
+    "Pracoval jsem na několika zajímavých projektech. Nejvíc jsem pyšný na AI Portfolio Assistant, "
+    "kde jsem vytvořil animovaného avatara, který mluví a odpovídá na otázky. "
+    "Rád ti o něm řeknu víc, jestli tě zajímá."
+)
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+class FakeChatSession:
+    def __init__(self, model: "FakeGenerativeModel", history: Optional[List[Dict[str, Any]]]):
+        self.model = model
+        self.history = list(history or [])
+
+    def send_message(self, content: str, stream: bool = False, **kwargs):
+        self.model.calls += 1
+        self.model.inject_fault(kwargs.get("request_options") or {})
+        self.history.append({"role": "user", "parts": [{"text": content}]})
+        input_tokens = estimate_tokens(self.model.system_instruction or "") + sum(
+            estimate_tokens(item["parts"][0]["text"]) for item in self.history)
+        self.model.input_tokens += input_tokens
+        prefill = input_tokens * self.model.per_token_latency
+        reply = self.model.reply
+        self.history.append({"role": "model", "parts": [{"text": reply}]})
+
+        if not stream:
+            time.sleep(self.model.latency + prefill)
+            return FakeResponse(reply)
+        return self._stream(reply, prefill)
+
+    def _stream(self, reply: str, prefill: float):
+        # Time to first chunk, then the rest of the latency spread over the chunks
+        size = self.model.chunk_size
+        chunks = [reply[i:i + size] for i in range(0, len(reply), size)]
+        time.sleep(self.model.first_chunk_latency + prefill)
+        per_chunk = max(self.model.latency - self.model.first_chunk_latency, 0) / max(len(chunks), 1)
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(per_chunk)
+            yield FakeResponse(chunk)
+
+class FakeGenerativeModel:
+    def __init__(self, latency: float = 0.05, reply: str = DEFAULT_REPLY, system_instruction: Optional[str] = None,
+                 first_chunk_latency: Optional[float] = None, chunk_size: int = 16, per_token_latency: float = 0.0):
+        self.latency = latency
+        self.reply = reply
+        self.system_instruction = system_instruction
+        self.first_chunk_latency = latency / 4 if first_chunk_latency is None else first_chunk_latency
+        self.chunk_size = chunk_size
+        self.per_token_latency = per_token_latency
+        self.calls = 0
+        self.input_tokens = 0
+
+    def start_chat(self, history: Optional[List[Dict[str, Any]]] = None) -> FakeChatSession:
+        return FakeChatSession(self, history)
+
+    def inject_fault(self, request_options: Dict[str, Any]) -> None:
+        pass
+
+class FaultyGenerativeModel(FakeGenerativeModel):
+    """FakeGenerativeModel with switchable faults, shared by all its chats.
+
+    mode is "ok", "down" (every call raises 503 ServiceUnavailable), "hang"
+    (the call blocks for hang seconds) or "flaky" (a call fails with 503
+    with probability error_rate). A hang honours the request timeout like
+    the real client and raises DeadlineExceeded, unless honour_timeout is
+    off, which models a stuck connection only the caller's deadline ends.
+    """
+
+    def __init__(self, mode: str = "ok", error_rate: float = 0.3, hang: float = 30.0, honour_timeout: bool = True,
+                 seed: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        self.mode = mode
+        self.error_rate = error_rate
+        self.hang = hang
+        self.honour_timeout = honour_timeout
+        self.random = random.Random(seed)
+        self.faults = 0
+
+    def inject_fault(self, request_options: Dict[str, Any]) -> None:
+        if self.mode == "down" or (self.mode == "flaky" and self.random.random() < self.error_rate):
+            self.faults += 1
+            time.sleep(self.latency / 10)
+            raise google_exceptions.ServiceUnavailable("injected outage")
+        if self.mode == "hang":
+            self.faults += 1
+            timeout = request_options.get("timeout") if self.honour_timeout else None
+            if timeout is not None and timeout < self.hang:
+                time.sleep(timeout)
+                raise google_exceptions.DeadlineExceeded("injected hang")
+            time.sleep(self.hang)
@@ -0,0 +1,23 @@
+﻿import os
+import sys
+import pathlib
+
+# Add the project root to the Python path
+project_root = pathlib.Path(__file__).parent.resolve()
+sys.path.insert(0, str(project_root))
+
+from app.core.assets import build_assets, brotli
+from app.core.config import ASSET_BUILD_DIR
+
+if __name__ == "__main__":
+    source_dir = os.path.join(project_root, "app/static")
+    output_dir = os.path.join(project_root, ASSET_BUILD_DIR)
+    manifest = build_assets(source_dir, output_dir)
+    assets = manifest["assets"]
+    size = sum(entry["encodings"]["identity"]["size"] for entry in assets.values())
+    for encoding in ("gzip", "br") if brotli is not None else ("gzip",):
+        packed = sum(entry["encodings"].get(encoding, entry["encodings"]["identity"])["size"] for entry in assets.values())
+        print(f"{encoding}: {size / 1024:.0f} KiB -> {packed / 1024:.0f} KiB")
+    if brotli is None:
+        print("brotli is not installed; built gzip variants only")
+    print(f"Built {len(assets)} assets into {output_dir}")